@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import SectionImage, MediaAsset, BlogSection, BlogPost
+from .models import SectionImage, MediaAsset, MediaAssetVariant, BlogSection, BlogPost
+from .search import search_post_ids
 
 @admin.register(SectionImage)
 class SectionImageAdmin(admin.ModelAdmin):
@@ -23,12 +24,19 @@ class SectionImageAdmin(admin.ModelAdmin):
     has_background.boolean = True
     has_background.short_description = 'Has Background'
 
+class MediaAssetVariantInline(admin.TabularInline):
+    model = MediaAssetVariant
+    extra = 0
+    fields = ['width', 'height', 'url', 'bytes']
+    readonly_fields = fields
+
 @admin.register(MediaAsset)
 class MediaAssetAdmin(admin.ModelAdmin):
     list_display = ['filename', 'folder', 'uploaded_at']
     list_filter = ['folder', 'uploaded_at']
     search_fields = ['filename', 'public_id', 'alt_text']
-    readonly_fields = ['url', 'secure_url', 'public_id', 'uploaded_at']
+    readonly_fields = ['url', 'secure_url', 'public_id', 'width', 'height', 'uploaded_at']
+    inlines = [MediaAssetVariantInline]
 
 @admin.register(BlogSection)
 class BlogSectionAdmin(admin.ModelAdmin):
@@ -52,3 +60,10 @@ class BlogPostAdmin(admin.ModelAdmin):
         }),
     )
     ordering = ['-published_date', 'order']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains scans over content
+        post_ids = search_post_ids(search_term)
+        if post_ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=post_ids), False
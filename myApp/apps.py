@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myApp'
+
+    def ready(self):
+        # Register content-change signal handlers (page cache invalidation)
+        from . import signals  # noqa: F401
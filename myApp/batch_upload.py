@@ -0,0 +1,177 @@
+"""
+Many gallery uploads compressed and uploaded together.
+
+The upload_images view only stores the files as UploadJobs (see
+upload_queue.py); a queue worker then runs upload_batch() on a whole group
+of them. The WebP encodes (the full image and its width variants, see
+compress_with_variants) run in a pool of UPLOAD_BATCH_PROCESSES processes
+(two by default, never more than the CPUs: the encoder holds the GIL for
+most of its work, and every process holds a decoded image of up to
+MAX_PIXELS), and each encoded image goes straight to a pool of threads for
+its Iceberg round trips, so the network steps of one file overlap the
+encoding of the next. The MediaAsset rows are created together at the end.
+
+The process pool uses the spawn start method: forking a web process that
+already runs threads (the upload queue, the Iceberg sessions) can leave
+locks held in the child. A worker that dies (e.g. killed for memory)
+breaks the pool: the files it was encoding fail, and the pool is replaced
+for the next batch.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .media_dedup import find_by_content, hash_bytes, hash_file, variant_rows
+from .models import MediaAsset, MediaAssetVariant
+from .utils.iceberg_utils import upload_with_variants
+from .utils.image_compression import compress_with_variants
+
+logger = logging.getLogger(__name__)
+
+_encoders = None
+_uploaders = None
+_pools_lock = threading.Lock()
+
+
+def _pools():
+    global _encoders, _uploaders
+    with _pools_lock:
+        if _encoders is None:
+            _encoders = ProcessPoolExecutor(
+                max_workers=max(1, min(settings.UPLOAD_BATCH_PROCESSES, os.cpu_count() or 1)),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        if _uploaders is None:
+            _uploaders = ThreadPoolExecutor(max_workers=settings.UPLOAD_BATCH_CONCURRENCY,
+                                            thread_name_prefix='upload-batch')
+    return _encoders, _uploaders
+
+
+def _discard_encoders(broken):
+    """Drop a broken process pool, so the next _pools() call starts a new one."""
+    global _encoders
+    with _pools_lock:
+        if _encoders is broken:
+            _encoders = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _source(image_file):
+    """
+    What to hand an encoder: the path of a file on disk (a large upload
+    Django spooled to disk, a queued job's file), the bytes of anything else.
+    """
+    if hasattr(image_file, 'temporary_file_path'):
+        return image_file.temporary_file_path()
+    path = getattr(getattr(image_file, 'file', None), 'name', None)
+    if isinstance(path, str) and os.path.isfile(path):
+        return path
+    image_file.seek(0)
+    return image_file.read()
+
+
+def _error(e):
+    return f'{type(e).__name__}: {e}'
+
+
+def upload_batch(files, folder='garden_gate', alt_text=''):
+    """
+    Compress and upload files, creating a MediaAsset for each one that
+    succeeds. Files already uploaded to folder (see media_dedup), or
+    repeated in the batch, reuse their asset instead. Returns one result per file, in order:
+    {'asset': the MediaAsset or None, 'duplicate': whether it existed before
+    or came earlier in the batch, 'error': why there is no asset}.
+    """
+    encoders, uploaders = _pools()
+    original_hashes = [hash_file(image_file) for image_file in files]
+
+    # By original hash: the asset for the file, or why it failed
+    assets, errors = {}, {}
+    # Oldest asset last, so it wins
+    for asset in MediaAsset.objects.filter(original_hash__in=set(original_hashes), folder=folder).order_by('-pk'):
+        assets[asset.original_hash] = asset
+
+    encodes = {}
+    for index, original_hash in enumerate(original_hashes):
+        if original_hash not in assets and original_hash not in encodes.values():
+            source = _source(files[index])
+            try:
+                encode = encoders.submit(compress_with_variants, source)
+            except BrokenProcessPool:
+                # Broken by an earlier batch: start over with a new pool
+                _discard_encoders(encoders)
+                encoders = _pools()[0]
+                encode = encoders.submit(compress_with_variants, source)
+            encodes[encode] = original_hash
+    first_index = {original_hash: original_hashes.index(original_hash) for original_hash in encodes.values()}
+
+    # By content hash: the original hashes waiting for that upload
+    uploading, uploads, sizes = {}, {}, {}
+    for encode in as_completed(encodes):
+        # Dropping the future frees the encoded image once it's uploaded
+        original_hash = encodes.pop(encode)
+        image_file = files[first_index[original_hash]]
+        try:
+            body, size, variants = encode.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                _discard_encoders(encoders)
+            logger.warning('Could not compress %s', image_file.name, exc_info=True)
+            errors[original_hash] = _error(e)
+            continue
+        content_hash = hash_bytes(body.getbuffer())
+        if content_hash in uploading:
+            uploading[content_hash].append(original_hash)
+            continue
+        asset = find_by_content(content_hash, folder, original_hash)
+        if asset is not None:
+            assets[original_hash] = asset
+            continue
+        uploading[content_hash] = [original_hash]
+        sizes[content_hash] = size
+        uploads[uploaders.submit(upload_with_variants, body, variants, image_file.name, folder)] = content_hash
+
+    created, created_variants = [], []
+    for upload in as_completed(uploads):
+        content_hash = uploads[upload]
+        # Encodes finish in any order: the asset is the batch's first copy
+        original_hash = min(uploading[content_hash], key=first_index.__getitem__)
+        image_file = files[first_index[original_hash]]
+        try:
+            result, uploaded_variants = upload.result()
+        except Exception as e:
+            logger.warning('Could not upload %s', image_file.name, exc_info=True)
+            errors.update(dict.fromkeys(uploading[content_hash], _error(e)))
+            continue
+        asset = MediaAsset(
+            url=result['url'],
+            secure_url=result['secure_url'],
+            public_id=result['public_id'],
+            folder=folder,
+            filename=image_file.name[:200],
+            alt_text=(alt_text or image_file.name)[:200],
+            original_hash=original_hash,
+            content_hash=content_hash,
+            width=sizes[content_hash][0],
+            height=sizes[content_hash][1],
+        )
+        created.append(asset)
+        created_variants += variant_rows(asset, uploaded_variants)
+        assets.update(dict.fromkeys(uploading[content_hash], asset))
+    MediaAsset.objects.bulk_create(created)
+    MediaAssetVariant.objects.bulk_create(created_variants)
+
+    results = []
+    for index, original_hash in enumerate(original_hashes):
+        asset = assets.get(original_hash)
+        if asset is None:
+            results.append({'asset': None, 'duplicate': False, 'error': errors[original_hash]})
+            continue
+        duplicate = asset not in created or asset.original_hash != original_hash or first_index[original_hash] != index
+        results.append({'asset': asset, 'duplicate': duplicate, 'error': ''})
+    return results
@@ -0,0 +1,223 @@
+"""
+Save-time compilation of blog post bodies.
+
+BlogPost.save() runs compile_post() once and stores the result, so pages
+render stored values instead of processing the content on every request:
+
+  - content_html: the body as sanitized HTML. Legacy plain-text posts get
+    their paragraphs (what the template's |linebreaks used to do), h2/h3
+    headings get ids for the table of contents, images load lazily,
+  - excerpt_text / meta_description_text: plain-text fallbacks for posts
+    without an excerpt or meta description,
+  - word_count, reading_minutes and toc.
+
+The sanitizer is allowlist based: unknown tags are dropped (their text is
+kept), script/style-like elements are dropped with their content, event
+handler attributes and javascript: URLs never survive. Embedded videos
+are kept: an iframe whose src is an https URL on one of EMBED_HOSTS
+(YouTube, Vimeo) stays, any other iframe is dropped.
+"""
+import html
+import math
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.utils.html import escape, linebreaks
+from django.utils.text import slugify
+
+EXCERPT_LENGTH = 200
+META_DESCRIPTION_LENGTH = 160
+WORDS_PER_MINUTE = 225
+
+ALLOWED_TAGS = frozenset('''
+    a abbr b blockquote br caption code col colgroup dd del div dl dt em figcaption figure h1 h2 h3 h4
+    h5 h6 hr i img ins li mark ol p pre s small span strong sub sup table tbody td tfoot th thead tr u ul
+'''.split())
+VOID_TAGS = frozenset({'br', 'col', 'hr', 'img'})
+# Dropped together with everything inside them
+DROPPED_TAGS = frozenset({'script', 'style', 'iframe', 'object', 'embed', 'noscript', 'template', 'svg', 'math',
+                          'form', 'select', 'textarea', 'button', 'head', 'title'})
+ALLOWED_ATTRIBUTES = {
+    '*': frozenset({'class', 'style', 'title', 'dir', 'lang'}),
+    'a': frozenset({'href', 'target', 'rel'}),
+    'img': frozenset({'src', 'alt', 'width', 'height', 'loading', 'decoding'}),
+    'td': frozenset({'colspan', 'rowspan'}),
+    'th': frozenset({'colspan', 'rowspan', 'scope'}),
+    'col': frozenset({'span'}),
+    'colgroup': frozenset({'span'}),
+    'ol': frozenset({'start', 'type'}),
+    'iframe': frozenset({'src', 'width', 'height', 'allow', 'allowfullscreen', 'frameborder', 'loading',
+                         'referrerpolicy'}),
+}
+# Video players posts may embed in an iframe
+EMBED_HOSTS = frozenset({'www.youtube.com', 'youtube.com', 'www.youtube-nocookie.com', 'player.vimeo.com'})
+URL_ATTRIBUTES = frozenset({'href', 'src'})
+SAFE_URL_RE = re.compile(r'^(https?:|mailto:|tel:|/|#|\.|[^:/?#]*([/?#]|$))', re.IGNORECASE)
+BLOCK_TAGS = frozenset({'p', 'br', 'div', 'li', 'tr', 'td', 'th', 'blockquote', 'pre', 'hr',
+                        'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'figcaption', 'caption', 'dd', 'dt'})
+TOC_TAGS = frozenset({'h2', 'h3'})
+# Tags of sanitized HTML: attribute values are escaped, so they never hold ">"
+SANITIZED_TAG_RE = re.compile(r'<[^>]*>')
+
+
+class _Compiler(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.text = []
+        self.toc = []
+        self.heading_ids = set()
+        self.open_tags = []
+        # (dropped tag, nesting depth) while inside a dropped element
+        self.dropping = None
+        self.heading = None
+
+    def _attributes(self, tag, attrs):
+        allowed = ALLOWED_ATTRIBUTES['*'] | ALLOWED_ATTRIBUTES.get(tag, frozenset())
+        kept = {}
+        for name, value in attrs:
+            name = name.lower()
+            if name not in allowed or value is None and name in URL_ATTRIBUTES:
+                continue
+            if name in URL_ATTRIBUTES and not SAFE_URL_RE.match(re.sub(r'[\s\x00-\x1f]', '', value)):
+                continue
+            kept[name] = value
+        if tag == 'img':
+            kept.setdefault('loading', 'lazy')
+            kept.setdefault('decoding', 'async')
+        if tag == 'a' and kept.get('target') == '_blank':
+            kept['rel'] = 'noopener noreferrer'
+        if tag == 'iframe':
+            kept.setdefault('loading', 'lazy')
+        return kept
+
+    @staticmethod
+    def _is_embed(attrs):
+        src = next((value for name, value in attrs if name.lower() == 'src' and value), '')
+        url = urlsplit(src.strip())
+        return url.scheme == 'https' and url.hostname in EMBED_HOSTS
+
+    @staticmethod
+    def _start_tag(tag, attrs):
+        rendered = ''.join(
+            f' {name}' if value is None else f' {name}="{escape(value)}"' for name, value in attrs.items()
+        )
+        return f'<{tag}{rendered}>'
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropping:
+            dropped, depth = self.dropping
+            if tag == dropped:
+                self.dropping = (dropped, depth + 1)
+            return
+        if tag == 'iframe' and self._is_embed(attrs):
+            # The player only; its fallback content is dropped
+            self.out.append(self._start_tag(tag, self._attributes(tag, attrs)) + '</iframe>')
+            self.dropping = (tag, 1)
+            return
+        if tag in DROPPED_TAGS:
+            self.dropping = (tag, 1)
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in ALLOWED_TAGS:
+            return
+        attrs = self._attributes(tag, attrs)
+        if tag in TOC_TAGS and self.heading is None:
+            # The id is filled in once the heading text is known
+            self.heading = (tag, len(self.out), attrs, len(self.text))
+        self.out.append(self._start_tag(tag, attrs))
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.dropping:
+            dropped, depth = self.dropping
+            if tag == dropped:
+                self.dropping = (dropped, depth - 1) if depth > 1 else None
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in self.open_tags:
+            return
+        # Close anything left open inside this element
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.out.append(f'</{open_tag}>')
+            if self.heading and open_tag == self.heading[0]:
+                self._finish_heading()
+            if open_tag == tag:
+                break
+
+    def _finish_heading(self):
+        tag, position, attrs, text_start = self.heading
+        self.heading = None
+        title = ' '.join(''.join(self.text[text_start:]).split())
+        if not title:
+            return
+        base = slugify(title)[:60] or 'section'
+        anchor, counter = base, 2
+        while anchor in self.heading_ids:
+            anchor, counter = f'{base}-{counter}', counter + 1
+        self.heading_ids.add(anchor)
+        self.out[position] = self._start_tag(tag, {'id': anchor, **attrs})
+        self.toc.append({'level': int(tag[1]), 'id': anchor, 'title': title})
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.out.append(escape(data))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        # An unclosed dropped element runs to the end; its content is gone
+        self.dropping = None
+        while self.open_tags:
+            self.handle_endtag(self.open_tags[-1])
+
+
+def sanitize_html(content):
+    """Return (sanitized HTML, plain text, table of contents) of an HTML fragment."""
+    compiler = _Compiler()
+    compiler.feed(content)
+    compiler.close()
+    return ''.join(compiler.out), ' '.join(''.join(compiler.text).split()), compiler.toc
+
+
+def html_text(content_html):
+    """
+    Plain text of stored (sanitized) content_html: a regex is enough here,
+    much faster than parsing the raw content again.
+    """
+    return ' '.join(html.unescape(SANITIZED_TAG_RE.sub(' ', content_html)).split())
+
+
+def _truncate(text, length):
+    return text[:length] + "..." if len(text) > length else text
+
+
+def compile_post(content, excerpt='', meta_description=''):
+    """Return the derived BlogPost fields for the given source fields."""
+    content = content or ''
+    if not content.lstrip().startswith('<'):
+        # Legacy plain-text posts: blank lines are paragraphs, newlines <br>
+        content = linebreaks(content, autoescape=False)
+    content_html, text, toc = sanitize_html(content)
+    excerpt_text = _truncate(text, EXCERPT_LENGTH)
+    word_count = len(text.split())
+    return {
+        'content_html': content_html,
+        'excerpt_text': excerpt_text,
+        'meta_description_text': (meta_description.strip() or (excerpt or '').strip()
+                                  or _truncate(text, META_DESCRIPTION_LENGTH)),
+        'word_count': word_count,
+        'reading_minutes': max(1, math.ceil(word_count / WORDS_PER_MINUTE)) if word_count else 0,
+        'toc': toc,
+    }
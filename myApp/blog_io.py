@@ -0,0 +1,217 @@
+"""
+Blog post import/export records.
+
+A record is a dict of EXPORT_FIELDS. Two formats, both read and written one
+record at a time:
+
+  - JSON Lines: one JSON object per line,
+  - Markdown: one <slug>.md file per post in a directory, the fields as
+    front matter between "---" lines and the content as the body. Front
+    matter values are written as JSON, which is also valid YAML; plain
+    unquoted values are read as strings.
+"""
+import datetime
+import json
+import os
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import BlogPost
+from .slugs import RESERVED_SLUGS, allocate_slugs, clean_slug
+
+EXPORT_FIELDS = (
+    'slug', 'title', 'excerpt', 'content', 'featured_image_url', 'featured_image_alt', 'author_name',
+    'published_date', 'is_featured', 'is_published', 'order', 'meta_title', 'meta_description',
+)
+BOOLEAN_FIELDS = frozenset({'is_featured', 'is_published'})
+NULLABLE_FIELDS = frozenset({'featured_image_url'})
+FRONT_MATTER_FIELDS = tuple(field for field in EXPORT_FIELDS if field != 'content')
+
+
+class RecordError(ValueError):
+    pass
+
+
+def _json_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def to_record(values):
+    """Record for a dict of BlogPost field values (e.g. from .values())."""
+    return {field: _json_value(values[field]) for field in EXPORT_FIELDS}
+
+
+def clean_record(record):
+    """
+    Validate and normalise an imported record into BlogPost field values.
+    Missing fields are left out (the model defaults apply to new posts).
+    """
+    if not isinstance(record, dict):
+        raise RecordError('record is not an object')
+    values = {
+        field: record[field] for field in EXPORT_FIELDS
+        if field in record and (record[field] is not None or field in NULLABLE_FIELDS)
+    }
+    if not str(values.get('title', '')).strip():
+        raise RecordError('record has no title')
+    for field in BOOLEAN_FIELDS & values.keys():
+        value = values[field]
+        values[field] = value if isinstance(value, bool) else str(value).lower() in ('1', 'true', 'yes', 'on')
+    if 'order' in values:
+        try:
+            values['order'] = int(values['order'])
+        except (TypeError, ValueError):
+            raise RecordError(f'invalid order {values["order"]!r}') from None
+    if 'published_date' in values:
+        date = values['published_date']
+        if not isinstance(date, datetime.datetime):
+            date = parse_datetime(str(date)) or parse_datetime(f'{date}T00:00:00')
+            if date is None:
+                raise RecordError(f'invalid published_date {values["published_date"]!r}')
+        values['published_date'] = timezone.make_aware(date) if timezone.is_naive(date) else date
+    for field in values.keys() - BOOLEAN_FIELDS - {'order', 'published_date'}:
+        if values[field] is not None:
+            values[field] = str(values[field])
+    # Records without a usable slug get one from their title on import
+    slug = clean_slug(values.pop('slug', ''), fallback='')
+    if slug and slug not in RESERVED_SLUGS:
+        values['slug'] = slug
+    return values
+
+
+def import_batch(batch):
+    """
+    Create or update the posts of a batch of cleaned records, matched by
+    slug, in one transaction and a handful of queries. Records without a
+    slug are matched by the slug of their title, or become new posts under
+    a free slug when another post already has it. Posts whose fields
+    already match their record are left alone, so importing twice is a no-op.
+
+    Return (created posts, updated posts, unchanged count).
+    """
+    # A later record for the same slug (or title) wins
+    by_slug, by_title = {}, {}
+    for values in batch:
+        if 'slug' in values:
+            by_slug[values['slug']] = values
+        else:
+            by_title[clean_slug(values['title'])] = values
+
+    now = timezone.now()
+    created, updated, unchanged = [], [], 0
+    with transaction.atomic():
+        existing = BlogPost.objects.in_bulk([*by_slug, *by_title], field_name='slug')
+        clashing = []
+        for slug, values in by_title.items():
+            post = existing.get(slug)
+            if slug in by_slug or slug in RESERVED_SLUGS or post is not None and post.title != values['title']:
+                clashing.append(values)
+            else:
+                by_slug[slug] = {**values, 'slug': slug}
+        for slug, values in zip(allocate_slugs([values['title'] for values in clashing], reserved=by_slug), clashing):
+            by_slug[slug] = {**values, 'slug': slug}
+
+        for slug, values in by_slug.items():
+            post = existing.get(slug)
+            if post is None:
+                post = BlogPost(**values)
+                created.append(post)
+            elif all(getattr(post, field) == value for field, value in values.items()):
+                unchanged += 1
+                continue
+            else:
+                for field, value in values.items():
+                    setattr(post, field, value)
+                post.updated_date = now
+                updated.append(post)
+            post.compile()
+
+        if updated:
+            fields = {field for values in by_slug.values() for field in values} - {'slug'}
+            BlogPost.objects.bulk_update(updated, [*fields, 'updated_date', *BlogPost.DERIVED_FIELDS])
+        if created:
+            BlogPost.objects.bulk_create(created)
+            # published_date is auto_now_add, so bulk_create overwrote the imported dates
+            dated = [post for post in created if 'published_date' in by_slug[post.slug]]
+            for post in dated:
+                post.published_date = by_slug[post.slug]['published_date']
+            if dated:
+                BlogPost.objects.bulk_update(dated, ['published_date'])
+    return created, updated, unchanged
+
+
+# JSON Lines
+
+def write_jsonl(records, stream):
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False))
+        stream.write('\n')
+
+
+def read_jsonl(stream):
+    """Yield (line number, record or RecordError) for each non-blank line."""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as error:
+            yield number, RecordError(f'invalid JSON: {error}')
+
+
+# Markdown with front matter
+
+def to_markdown(record):
+    lines = ['---']
+    lines += [f'{field}: {json.dumps(record[field], ensure_ascii=False)}' for field in FRONT_MATTER_FIELDS]
+    lines += ['---', '']
+    return '\n'.join(lines) + (record['content'] or '') + '\n'
+
+
+def from_markdown(text):
+    lines = text.split('\n')
+    if lines[0].strip() != '---':
+        raise RecordError('missing front matter')
+    try:
+        end = next(number for number, line in enumerate(lines[1:], 1) if line.strip() == '---')
+    except StopIteration:
+        raise RecordError('unterminated front matter') from None
+    record = {}
+    for line in lines[1:end]:
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        key, _, value = line.partition(':')
+        value = value.strip()
+        try:
+            record[key.strip()] = json.loads(value) if value else ''
+        except json.JSONDecodeError:
+            record[key.strip()] = value
+    # to_markdown() puts a blank line before the body and a newline after it
+    body = lines[end + 1:]
+    if body and not body[0].strip():
+        body = body[1:]
+    record['content'] = '\n'.join(body).removesuffix('\n')
+    return record
+
+
+def write_markdown_dir(records, directory):
+    os.makedirs(directory, exist_ok=True)
+    for record in records:
+        with open(os.path.join(directory, f'{record["slug"]}.md'), 'w', encoding='utf-8') as f:
+            f.write(to_markdown(record))
+
+
+def read_markdown_dir(directory):
+    """Yield (file name, record or RecordError) for each .md file, in name order."""
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.md'):
+            continue
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            try:
+                yield name, from_markdown(f.read())
+            except RecordError as error:
+                yield name, error
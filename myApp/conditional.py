@@ -0,0 +1,88 @@
+"""
+Conditional GET support (ETag / Last-Modified / 304) for public pages.
+
+Validators come from the content fingerprint of the tables a page renders
+(one small aggregate query, see site_content.Fingerprint), so answering a
+revalidation never renders a template.
+"""
+import datetime
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import BlogPost, BlogPostRelation, SectionImage
+from .site_content import Fingerprint, content_fingerprint, deletions
+
+
+# What a blog post page shows besides the post itself
+blog_page_fingerprint = Fingerprint(lambda: [
+    ('published_posts', BlogPost.objects.filter(is_published=True), 'updated_date'),
+    ('section_images', SectionImage.objects.all(), 'updated_at'),
+    # Rewritten relations get new ids
+    ('related_posts', BlogPostRelation.objects.all(), 'id'),
+    deletions(BlogPost, SectionImage),
+])
+
+
+def make_validators(fingerprint_rows, *extra):
+    """
+    Build (ETag, Last-Modified timestamp) from fingerprint rows plus any extra
+    values the page output depends on (e.g. the request host).
+    """
+    digest = hashlib.md5(repr((settings.DEPLOY_ID, fingerprint_rows, extra)).encode()).hexdigest()
+    # Sources without a timestamp column fingerprint by id; only dates count
+    # here. Deletes count through the deletions() source.
+    stamps = [stamp for _, stamp, _ in fingerprint_rows if isinstance(stamp, datetime.datetime)]
+    last_modified = int(max(stamps).timestamp()) if stamps else None
+    return quote_etag(digest), last_modified
+
+
+def not_modified_response(request, etag, last_modified):
+    """Return a 304/412 response when the client's copy is current, else None."""
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(request, response, etag, last_modified):
+    if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+        if last_modified and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+        response.headers.setdefault('ETag', etag)
+    return response
+
+
+def conditional_page(validators_func):
+    """
+    Like django.views.decorators.http.condition, but computes the ETag and
+    Last-Modified together with one validators_func(request, *args, **kwargs)
+    call returning (etag, last_modified). The ETag is left on request.etag
+    for cache_public_page.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            etag, last_modified = validators_func(request, *args, **kwargs)
+            request.etag = etag
+            response = not_modified_response(request, etag, last_modified)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+            return set_validators(request, response, etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def home_validators(request, *args, **kwargs):
+    # Also used for the /sections/<name>/ fragments of the home page
+    return make_validators(content_fingerprint())
+
+
+def blog_post_validators(request, post):
+    """
+    The detail page shows the post, the latest published posts (related posts)
+    and the header/footer images, and embeds the absolute page URL.
+    The view counter is deliberately not part of the validator.
+    """
+    rows = blog_page_fingerprint() + (('post', post.updated_date, post.pk),)
+    return make_validators(rows, request.get_host())
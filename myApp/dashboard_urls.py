@@ -9,6 +9,8 @@ urlpatterns = [
     path('', dashboard_views.dashboard_index, name='index'),
     path('gallery/', dashboard_views.gallery, name='gallery'),
     path('upload-image/', dashboard_views.upload_image, name='upload_image'),
+    path('upload-images/', dashboard_views.upload_images, name='upload_images'),
+    path('upload-jobs/', dashboard_views.upload_job_status, name='upload_job_status'),
     path('methodology-icons/', dashboard_views.methodology_icons_edit, name='methodology_icons_edit'),
     path('services/', dashboard_views.services_edit, name='services_edit'),
     path('section/<int:section_id>/edit/', dashboard_views.section_image_edit, name='section_edit'),
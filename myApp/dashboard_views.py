@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.http import JsonResponse
+from django.utils.http import urlencode
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.db import models
@@ -11,12 +12,19 @@ from .models import (
     TestimonialsSection, Testimonial, StatisticsSection,
     PainPointsSection, MethodologySection, MethodologyStep,
     AboutSection, MissionVisionSection, LeadMagnetSection, FinalCTASection,
-    BlogSection, BlogPost
+    BlogSection, BlogPost, UploadJob
 )
-from .utils.iceberg_utils import upload_to_iceberg, is_configured as iceberg_configured
+from .pagination import keyset_paginate
+from .slugs import save_with_unique_slug
+from .media_dedup import find_by_original, hash_file
+from .upload_queue import asset_result, enqueue_upload, enqueue_uploads, job_status
+from .utils.iceberg_utils import is_configured as iceberg_configured
 import json
 import os
 
+# Files per upload_images request (Django refuses more than DATA_UPLOAD_MAX_NUMBER_FILES)
+MAX_BATCH_FILES = 100
+
 # Login view
 def dashboard_login(request):
     if request.method == 'POST':
@@ -89,27 +97,17 @@ def upload_image(request):
                 'error': 'Image uploads are not configured. Please set ICEBERG_API_TOKEN in your .env file (mint an API token in the Katalyst dashboard).'
             }, status=500)
 
-        # Upload to Iceberg CDN
-        result = upload_to_iceberg(image_file, folder=folder)
-
-        # Save to database
-        media_asset = MediaAsset.objects.create(
-            url=result['url'],
-            secure_url=result['secure_url'],
-            public_id=result['public_id'],
-            folder=folder,
-            filename=image_file.name,
-            alt_text=request.POST.get('alt_text', '')
-        )
-        
-        return JsonResponse({
-            'success': True,
-            'url': result['secure_url'],
-            'web_url': result['web_url'],
-            'thumb_url': result['thumb_url'],
-            'public_id': result['public_id'],
-            'id': media_asset.id
-        })
+        # Uploaded to this folder before: hand back the existing asset
+        asset = find_by_original(hash_file(image_file), folder)
+        if asset is not None:
+            return JsonResponse({'status': UploadJob.DONE, 'success': True, 'duplicate': True,
+                                 'filename': image_file.name, **asset_result(asset)})
+
+        # Compression and the Iceberg upload run in the background;
+        # the page polls upload_job_status for the result
+        job = enqueue_upload(image_file, folder=folder, alt_text=request.POST.get('alt_text', ''))
+        job.refresh_from_db()
+        return JsonResponse(job_status(job), status=202 if job.status in (UploadJob.QUEUED, UploadJob.RUNNING) else 200)
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -120,6 +118,54 @@ def upload_image(request):
             'error_type': type(e).__name__
         }, status=500)
 
+# Upload many images at once: queued as one batch (compressed in parallel
+# by the queue worker), one result or job per file
+@login_required
+@csrf_exempt
+@require_http_methods(["POST"])
+def upload_images(request):
+    files = request.FILES.getlist('images')
+    if not files:
+        return JsonResponse({'error': 'No image files provided'}, status=400)
+    if len(files) > MAX_BATCH_FILES:
+        return JsonResponse({'error': f'Upload at most {MAX_BATCH_FILES} images at a time'}, status=400)
+    if not iceberg_configured():
+        return JsonResponse({
+            'error': 'Image uploads are not configured. Please set ICEBERG_API_TOKEN in your .env file (mint an API token in the Katalyst dashboard).'
+        }, status=500)
+
+    # Uploaded to this folder before: hand back the existing assets right away
+    folder = request.POST.get('folder', 'garden_gate')
+    original_hashes = [hash_file(image_file) for image_file in files]
+    existing = {}
+    # Oldest asset last, so it wins
+    for asset in MediaAsset.objects.filter(original_hash__in=set(original_hashes), folder=folder).prefetch_related('variants').order_by('-pk'):
+        existing[asset.original_hash] = asset
+    new_files = [image_file for image_file, original_hash in zip(files, original_hashes) if original_hash not in existing]
+    jobs = iter(enqueue_uploads(new_files, folder=folder,
+                                alt_text=request.POST.get('alt_text', '')))
+
+    results = []
+    for image_file, original_hash in zip(files, original_hashes):
+        asset = existing.get(original_hash)
+        if asset is None:
+            results.append(job_status(next(jobs)))
+        else:
+            results.append({'status': UploadJob.DONE, 'success': True, 'duplicate': True,
+                            'filename': image_file.name, **asset_result(asset)})
+    return JsonResponse({'results': results, 'queued': len(new_files)}, status=202 if new_files else 200)
+
+# Status of queued uploads (?ids=1,2,3)
+@login_required
+@require_http_methods(["GET"])
+def upload_job_status(request):
+    try:
+        ids = [int(job_id) for job_id in request.GET.get('ids', '').split(',') if job_id]
+    except ValueError:
+        return JsonResponse({'error': 'ids must be comma-separated job ids'}, status=400)
+    jobs = UploadJob.objects.filter(pk__in=ids[:100]).select_related('media_asset').prefetch_related('media_asset__variants')
+    return JsonResponse({'jobs': [job_status(job) for job in jobs]})
+
 # Edit all methodology icons at once
 @login_required
 def methodology_icons_edit(request):
@@ -156,7 +202,8 @@ def methodology_icons_edit(request):
 # Gallery view
 @login_required
 def gallery(request):
-    assets = MediaAsset.objects.all()
+    # Thumbnails and srcsets come from the variants
+    assets = MediaAsset.objects.prefetch_related('variants')
     
     # If AJAX request, return JSON
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -164,6 +211,7 @@ def gallery(request):
             'id': asset.id,
             'url': asset.secure_url,
             'thumb_url': asset.thumb_url,
+            'srcset': asset.srcset,
             'filename': asset.filename or asset.public_id,
             'alt_text': asset.alt_text
         } for asset in assets]
@@ -177,7 +225,7 @@ def gallery(request):
 @login_required
 def services_edit(request):
     # Get or create services section header
-    services_section = ServicesSection.get_instance()
+    services_section = ServicesSection.get_instance(cached=False)
     
     # Get or create service cards
     cards = {}
@@ -226,7 +274,7 @@ def services_edit(request):
 # Edit Hero section
 @login_required
 def hero_edit(request):
-    hero = HeroSection.get_instance()
+    hero = HeroSection.get_instance(cached=False)
     
     if request.method == 'POST':
         hero.title = request.POST.get('title', '')
@@ -244,7 +292,7 @@ def hero_edit(request):
 # Edit Credibility section
 @login_required
 def credibility_edit(request):
-    credibility = CredibilitySection.get_instance()
+    credibility = CredibilitySection.get_instance(cached=False)
     
     # Get or create credibility cards
     cards = {}
@@ -282,7 +330,7 @@ def credibility_edit(request):
 # Edit Testimonials section
 @login_required
 def testimonials_edit(request):
-    testimonials_section = TestimonialsSection.get_instance()
+    testimonials_section = TestimonialsSection.get_instance(cached=False)
     testimonials = Testimonial.objects.all().order_by('testimonial_number')
     
     if request.method == 'POST':
@@ -324,7 +372,7 @@ def testimonial_edit(request, testimonial_id=None):
 # Edit Statistics section
 @login_required
 def statistics_edit(request):
-    statistics = StatisticsSection.get_instance()
+    statistics = StatisticsSection.get_instance(cached=False)
     
     if request.method == 'POST':
         statistics.title = request.POST.get('title', '')
@@ -342,7 +390,7 @@ def statistics_edit(request):
 # Edit Pain Points section
 @login_required
 def pain_points_edit(request):
-    pain_points = PainPointsSection.get_instance()
+    pain_points = PainPointsSection.get_instance(cached=False)
     
     if request.method == 'POST':
         pain_points.title = request.POST.get('title', '')
@@ -369,7 +417,7 @@ def pain_points_edit(request):
 # Edit Methodology section
 @login_required
 def methodology_edit(request):
-    methodology = MethodologySection.get_instance()
+    methodology = MethodologySection.get_instance(cached=False)
     steps = MethodologyStep.objects.all().order_by('step_number')
     
     if request.method == 'POST':
@@ -419,7 +467,7 @@ def methodology_step_edit(request, step_id=None):
 # Edit About section
 @login_required
 def about_edit(request):
-    about = AboutSection.get_instance()
+    about = AboutSection.get_instance(cached=False)
     
     if request.method == 'POST':
         about.title = request.POST.get('title', '')
@@ -438,7 +486,7 @@ def about_edit(request):
 # Edit Mission/Vision section
 @login_required
 def mission_vision_edit(request):
-    mission_vision = MissionVisionSection.get_instance()
+    mission_vision = MissionVisionSection.get_instance(cached=False)
     
     if request.method == 'POST':
         mission_vision.mission_title = request.POST.get('mission_title', '')
@@ -459,7 +507,7 @@ def mission_vision_edit(request):
 # Edit Lead Magnet section
 @login_required
 def lead_magnet_edit(request):
-    lead_magnet = LeadMagnetSection.get_instance()
+    lead_magnet = LeadMagnetSection.get_instance(cached=False)
     
     if request.method == 'POST':
         lead_magnet.title = request.POST.get('title', '')
@@ -480,7 +528,7 @@ def lead_magnet_edit(request):
 # Edit Final CTA section
 @login_required
 def final_cta_edit(request):
-    final_cta = FinalCTASection.get_instance()
+    final_cta = FinalCTASection.get_instance(cached=False)
     
     if request.method == 'POST':
         final_cta.title = request.POST.get('title', '')
@@ -494,11 +542,28 @@ def final_cta_edit(request):
         'final_cta': final_cta
     })
 
+DASHBOARD_POSTS_PER_PAGE = 24
+DASHBOARD_POST_STATUSES = {'published': True, 'draft': False}
+
 # Edit Blog section
 @login_required
 def blog_edit(request):
-    blog_section = BlogSection.get_instance()
-    blog_posts = BlogPost.objects.all().order_by('-published_date')
+    blog_section = BlogSection.get_instance(cached=False)
+    # Search and status filter run in the query, so they cover every page
+    query = request.GET.get('q', '').strip()[:200]
+    status = request.GET.get('status', '')
+    posts = BlogPost.cards('is_published', 'is_featured', 'view_count')
+    if query:
+        posts = posts.filter(models.Q(title__icontains=query) | models.Q(author_name__icontains=query))
+    if status in DASHBOARD_POST_STATUSES:
+        posts = posts.filter(is_published=DASHBOARD_POST_STATUSES[status])
+    else:
+        status = ''
+    # Card columns only, one page at a time (drafts included)
+    page = keyset_paginate(
+        posts, DASHBOARD_POSTS_PER_PAGE,
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
     
     if request.method == 'POST':
         blog_section.title = request.POST.get('title', '')
@@ -510,36 +575,30 @@ def blog_edit(request):
     
     return render(request, 'myApp/dashboard/blog_edit.html', {
         'blog_section': blog_section,
-        'blog_posts': blog_posts
+        'blog_posts': page.items,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        'query': query,
+        'status': status,
+        'status_filters': (('', 'All'), ('published', 'Published'), ('draft', 'Drafts')),
+        # Kept on the pagination links
+        'filter_params': urlencode({name: value for name, value in (('q', query), ('status', status)) if value}),
     })
 
 # Edit individual blog post
 @login_required
 def blog_post_edit(request, post_id=None):
-    from django.utils.text import slugify
     from django.urls import reverse
 
     post = get_object_or_404(BlogPost, id=post_id) if post_id else None
 
     if request.method == 'POST':
         title = request.POST.get('title', '').strip() or 'Untitled Post'
-        slug = request.POST.get('slug', '').strip() or slugify(title) or 'post'
-        slug = slugify(slug) or 'post'
-
-        # Make sure the slug is unique (append -2, -3, ... if taken)
-        existing = BlogPost.objects.all()
-        if post:
-            existing = existing.exclude(pk=post.pk)
-        base_slug = slug
-        counter = 2
-        while existing.filter(slug=slug).exists():
-            slug = f"{base_slug}-{counter}"
-            counter += 1
+        slug_source = request.POST.get('slug', '').strip() or title
 
         if post is None:
-            post = BlogPost(title=title, slug=slug)
+            post = BlogPost()
         post.title = title
-        post.slug = slug
         post.excerpt = request.POST.get('excerpt', '').strip()
         post.content = request.POST.get('content', '')
         post.featured_image_url = request.POST.get('featured_image_url', '').strip()
@@ -553,7 +612,8 @@ def blog_post_edit(request, post_id=None):
             post.order = int(request.POST.get('order', '0'))
         except ValueError:
             post.order = 0
-        post.save()
+        # Unique slug (append -2, -3, ... if taken), safe against concurrent saves
+        save_with_unique_slug(post, slug_source)
         return redirect(reverse('dashboard:blog_edit') + '?saved=1')
 
     return render(request, 'myApp/dashboard/blog_post_edit.html', {
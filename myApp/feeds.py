@@ -0,0 +1,159 @@
+"""
+sitemap.xml and the blog's RSS/Atom feeds.
+
+Each document is built once per content change and cached (shared cache) as
+ready-to-send bytes plus a gzipped copy, keyed by its ETag. The ETag comes
+from the content fingerprint (see site_content.Fingerprint), so a request
+costs one small aggregate query: a 304, or the cached bytes. Only after a
+post or section changes does the next request rebuild the document.
+
+Archives with more than SITEMAP_PAGE_SIZE posts get a sitemap index at
+/sitemap.xml pointing at /sitemap-<n>.xml pages.
+"""
+import gzip
+from collections import namedtuple
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+
+from .conditional import make_validators
+from .models import BlogPost
+from .site_content import Fingerprint, content_fingerprint, deletions
+
+FEED_POST_LIMIT = 50
+SITEMAP_PAGE_SIZE = 10000
+
+FEED_TITLE = 'Garden Gate Property Management Blog'
+FEED_DESCRIPTION = 'Property management insights and landlord advice from Garden Gate Property Management.'
+
+CachedDocument = namedtuple('CachedDocument', ['body', 'gzipped', 'etag', 'last_modified', 'content_type'])
+
+published_posts_fingerprint = Fingerprint(lambda: [
+    ('published_posts', BlogPost.objects.filter(is_published=True), 'updated_date'),
+    deletions(BlogPost),
+])
+
+
+def _published_posts():
+    return BlogPost.objects.filter(is_published=True)
+
+
+def _absolute(path):
+    return settings.SITE_URL + path
+
+
+def cached_document(name, fingerprint_rows, build, content_type):
+    """
+    Return the CachedDocument `name` for the given fingerprint, calling
+    build() for its bytes only when it isn't cached yet.
+    """
+    etag, last_modified = make_validators(fingerprint_rows, name)
+    # The same ETag covers the plain and the gzipped bytes
+    etag = 'W/' + etag
+    key = f'document:{name}:{etag}'
+    document = cache.get(key)
+    if document is None:
+        body = build()
+        document = CachedDocument(body, gzip.compress(body, mtime=0), etag, last_modified, content_type)
+        cache.set(key, document, settings.PAGE_CACHE_TIMEOUT)
+    return document
+
+
+def _build_feed(feed_class):
+    feed = feed_class(
+        title=FEED_TITLE,
+        link=_absolute(reverse('blog_archive')),
+        description=FEED_DESCRIPTION,
+        language='en',
+        feed_url=_absolute(reverse('blog_feed_atom' if feed_class is Atom1Feed else 'blog_feed_rss')),
+    )
+    posts = _published_posts().only(
+        'slug', 'title', 'excerpt', 'excerpt_text', 'author_name', 'published_date', 'updated_date'
+    ).order_by('-published_date', '-id')[:FEED_POST_LIMIT]
+    for post in posts:
+        link = _absolute(reverse('blog_post_detail', args=[post.slug]))
+        feed.add_item(
+            title=post.title,
+            link=link,
+            description=post.get_excerpt(),
+            unique_id=link,
+            author_name=post.author_name,
+            pubdate=post.published_date,
+            updateddate=post.updated_date,
+        )
+    return feed.writeString('utf-8').encode()
+
+
+def rss_feed():
+    return cached_document('rss', published_posts_fingerprint(), lambda: _build_feed(Rss201rev2Feed),
+                           'application/rss+xml; charset=utf-8')
+
+
+def atom_feed():
+    return cached_document('atom', published_posts_fingerprint(), lambda: _build_feed(Atom1Feed),
+                           'application/atom+xml; charset=utf-8')
+
+
+def _url(location, lastmod=None):
+    lastmod = f'<lastmod>{lastmod.date().isoformat()}</lastmod>' if lastmod else ''
+    return f'<url><loc>{escape(location)}</loc>{lastmod}</url>'
+
+
+def _urlset(entries):
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            + ''.join(entries) + '</urlset>\n').encode()
+
+
+def _site_entries(fingerprint_rows):
+    stamps = [stamp for _, stamp, _ in fingerprint_rows if stamp is not None]
+    latest = max(stamps) if stamps else None
+    return [_url(_absolute(reverse('home')), latest), _url(_absolute(reverse('blog_archive')), latest)]
+
+
+def _post_entries(start=0, stop=None):
+    posts = _published_posts().order_by('pk').values_list('slug', 'updated_date')[start:stop]
+    return [_url(_absolute(reverse('blog_post_detail', args=[slug])), updated) for slug, updated in posts]
+
+
+def sitemap_page_count():
+    return max(1, -(-_published_posts().count() // SITEMAP_PAGE_SIZE))
+
+
+def sitemap():
+    """The sitemap, or a sitemap index once the posts span several pages."""
+    rows = content_fingerprint()
+
+    def build():
+        pages = sitemap_page_count()
+        if pages == 1:
+            return _urlset(_site_entries(rows) + _post_entries())
+        last_modified = max(stamp for _, stamp, _ in rows if stamp is not None)
+        entries = ''.join(
+            f'<sitemap><loc>{escape(_absolute(reverse("sitemap_page", args=[page])))}</loc>'
+            f'<lastmod>{last_modified.date().isoformat()}</lastmod></sitemap>'
+            for page in range(1, pages + 1)
+        )
+        return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                + entries + '</sitemapindex>\n').encode()
+
+    return cached_document('sitemap', rows, build, 'application/xml; charset=utf-8')
+
+
+def sitemap_page(page):
+    """Page `page` (1-based) of a split sitemap."""
+    rows = content_fingerprint()
+
+    def build():
+        if not 1 <= page <= sitemap_page_count():
+            raise Http404('No such sitemap page')
+        start = (page - 1) * SITEMAP_PAGE_SIZE
+        entries = _site_entries(rows) if page == 1 else []
+        return _urlset(entries + _post_entries(start, start + SITEMAP_PAGE_SIZE))
+
+    return cached_document(f'sitemap-{page}', rows, build, 'application/xml; charset=utf-8')
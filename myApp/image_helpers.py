@@ -1,43 +1,90 @@
 from .models import SectionImage
 
-def get_section_image(section_name):
-    """Get image URLs for a specific section"""
-    try:
-        section = SectionImage.objects.get(section_name=section_name)
-        return {
-            'image_url': section.image_url or '',
-            'image_alt': section.image_alt or '',
-            'icon_url': section.icon_url or '',
-            'background_image_url': section.background_image_url or '',
-        }
-    except SectionImage.DoesNotExist:
+# Sections templates expect to exist (even if empty) to prevent template errors
+EXPECTED_SECTIONS = ['hero_background', 'hero_image', 'about_background', 'about_image', 'statistics_background']
+
+def _image_urls(section=None):
+    """URL dict for a SectionImage row (all blank when there is no row)"""
+    if section is None:
         return {
             'image_url': '',
             'image_alt': '',
             'icon_url': '',
             'background_image_url': '',
         }
-
-def get_all_section_images():
-    """Get all section images as a dictionary"""
-    sections = SectionImage.objects.all()
-    result = {section.section_name: {
+    return {
         'image_url': section.image_url or '',
         'image_alt': section.image_alt or '',
         'icon_url': section.icon_url or '',
         'background_image_url': section.background_image_url or '',
-    } for section in sections}
-    
-    # Ensure expected sections exist (even if empty) to prevent template errors
-    expected_sections = ['hero_background', 'hero_image', 'about_background', 'about_image', 'statistics_background']
-    for section_name in expected_sections:
+    }
+
+def get_section_image(section_name):
+    """Get image URLs for a specific section"""
+    return _image_urls(SectionImage.objects.filter(section_name=section_name).first())
+
+def section_images_from_rows(sections):
+    """Build the section_images dictionary from SectionImage rows"""
+    result = {section.section_name: _image_urls(section) for section in sections}
+    for section_name in EXPECTED_SECTIONS:
         if section_name not in result:
-            result[section_name] = {
-                'image_url': '',
-                'image_alt': '',
-                'icon_url': '',
-                'background_image_url': '',
-            }
-    
+            result[section_name] = _image_urls()
     return result
 
+def get_all_section_images():
+    """Get all section images as a dictionary (see LazySectionImages to load on demand)"""
+    return section_images_from_rows(SectionImage.objects.all())
+
+class LazySectionImages:
+    """
+    Drop-in for get_all_section_images() in template contexts: rows are
+    loaded on first access and kept for the rest of the request, so a page
+    only pays for the images it actually renders (a missing row is
+    remembered too, so it costs one query however often it is looked up).
+    Names that share a group prefix (the methodology icons) are loaded
+    together in one query.
+    """
+    GROUP_PREFIXES = ('methodology_icon_',)
+
+    def __init__(self):
+        self._images = {}
+        self._loaded_groups = set()
+        self._missing = set()
+
+    def __getitem__(self, section_name):
+        if section_name not in self._images and section_name not in self._missing:
+            self._load(section_name)
+            if section_name not in self._images:
+                self._missing.add(section_name)
+        if section_name in self._images:
+            return self._images[section_name]
+        # Same contract as get_all_section_images(): expected sections are
+        # always present, any other missing section is a missing key
+        if section_name in EXPECTED_SECTIONS:
+            return _image_urls()
+        raise KeyError(section_name)
+
+    def __contains__(self, section_name):
+        try:
+            self[section_name]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, section_name, default=None):
+        try:
+            return self[section_name]
+        except KeyError:
+            return default
+
+    def _load(self, section_name):
+        prefix = next((p for p in self.GROUP_PREFIXES if section_name.startswith(p)), None)
+        if prefix is None:
+            sections = SectionImage.objects.filter(section_name=section_name)
+        elif prefix in self._loaded_groups:
+            return
+        else:
+            self._loaded_groups.add(prefix)
+            sections = SectionImage.objects.filter(section_name__startswith=prefix)
+        for section in sections:
+            self._images[section.section_name] = _image_urls(section)
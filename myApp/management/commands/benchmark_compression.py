@@ -0,0 +1,116 @@
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageFilter
+
+from myApp.utils.image_compression import (
+    MAX_PIXELS, MAX_QUALITY, MIN_QUALITY, compress_image, encode_webp, open_image,
+)
+
+MB = 1024 * 1024
+
+
+def baseline_compress(img, max_bytes=10 * MB, target_bytes=None):
+    """The previous quality search, for comparison: full size method=6 encodes only."""
+    if target_bytes is None:
+        target_bytes = int(max_bytes * 0.93)
+    output = encode_webp(img, MAX_QUALITY)
+    current_size = output.tell()
+    if current_size <= target_bytes:
+        return output
+    low, high, best = MIN_QUALITY, MAX_QUALITY, None
+    while low <= high:
+        quality = (low + high) // 2
+        output = encode_webp(img, quality)
+        if output.tell() <= target_bytes:
+            best, low = output, quality + 1
+        else:
+            high = quality - 1
+    if best:
+        return best
+    scale = (target_bytes / current_size) ** 0.5
+    return encode_webp(img.resize((int(img.width * scale), int(img.height * scale)), Image.Resampling.LANCZOS), 85)
+
+
+def synthetic_photo(megapixels):
+    """A JPEG with photo-like detail: smooth colour regions plus sensor noise."""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    coarse = Image.merge('RGB', [Image.effect_noise((width // 24, height // 24), 80) for _ in range(3)])
+    img = coarse.resize((width, height), Image.Resampling.BICUBIC).filter(ImageFilter.GaussianBlur(3))
+    noise = Image.merge('RGB', [Image.effect_noise((width, height), 20) for _ in range(3)])
+    img = Image.blend(img, noise, 0.2)
+    output = BytesIO()
+    img.save(output, format='JPEG', quality=92)
+    output.name = f'synthetic-{megapixels}mp.jpg'
+    return output
+
+
+class Command(BaseCommand):
+    help = ('Compare the quality search of compress_image with the previous one (full size '
+            'encodes only): encoder time, output size and whether the output fits the budget. '
+            'Both search the same decoded image, capped at --max-pixels like uploads are.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('images', nargs='*', help='Images to compress (default: generated photos)')
+        parser.add_argument('--megapixels', type=float, nargs='+', default=[8, 12],
+                            help='Sizes of the generated photos (default: 8 12)')
+        parser.add_argument('--max-bytes', type=float, nargs='+', default=[10, 2, 0.5],
+                            help='Budgets in MB, as passed to compress_image (default: 10 2 0.5)')
+        parser.add_argument('--max-pixels', type=int, default=MAX_PIXELS,
+                            help=f'Decode cap, as for uploads (default: {MAX_PIXELS})')
+        parser.add_argument('--skip-baseline', action='store_true', help='Only time the current search')
+
+    def handle(self, *args, **options):
+        images = []
+        for path in options['images']:
+            try:
+                with open(path, 'rb') as f:
+                    data = BytesIO(f.read())
+            except OSError as error:
+                raise CommandError(error)
+            data.name = path
+            images.append(data)
+        if not images:
+            self.stdout.write('Generating photos...')
+            images = [synthetic_photo(megapixels) for megapixels in options['megapixels']]
+
+        header = f'{"image":<28} {"decoded":>11} {"budget":>8} {"baseline":>10} {"current":>10} {"speedup":>8} {"size (baseline / current)":>28}'
+        self.stdout.write(header)
+        total_baseline = total_current = 0
+        for image in images:
+            # Decoded once: both searches get the same pixels, only the search is timed
+            image.seek(0)
+            img = open_image(image, options['max_pixels'])
+            img.load()
+            for max_mb in options['max_bytes']:
+                max_bytes = int(max_mb * MB)
+                target = int(max_bytes * 0.93)
+                current_s, current = self.timed(compress_image, img, max_bytes)
+                if current.getbuffer().nbytes > target:
+                    self.stderr.write(self.style.ERROR(f'{image.name}: output exceeds the {max_mb} MB budget'))
+                total_current += current_s
+                if options['skip_baseline']:
+                    baseline_s, baseline_size = None, None
+                else:
+                    baseline_s, baseline = self.timed(baseline_compress, img, max_bytes)
+                    baseline_size = baseline.getbuffer().nbytes
+                    total_baseline += baseline_s
+                self.stdout.write(
+                    f'{image.name[-28:]:<28} {img.width:>5}x{img.height:<5} {max_mb:>6g}MB '
+                    + (f'{baseline_s:>9.2f}s {current_s:>9.2f}s {baseline_s / current_s:>7.1f}x '
+                       f'{baseline_size / MB:>12.2f} / {current.getbuffer().nbytes / MB:.2f} MB'
+                       if baseline_s is not None else
+                       f'{"-":>10} {current_s:>9.2f}s {"-":>8} {current.getbuffer().nbytes / MB:>20.2f} MB')
+                )
+        if total_baseline:
+            self.stdout.write(self.style.SUCCESS(
+                f'Encoder time: {total_baseline:.2f}s -> {total_current:.2f}s '
+                f'({total_baseline - total_current:.2f}s saved, {total_baseline / total_current:.1f}x faster)'
+            ))
+
+    def timed(self, compress, img, max_bytes):
+        start = time.perf_counter()
+        output = compress(img, max_bytes=max_bytes)
+        return time.perf_counter() - start, output
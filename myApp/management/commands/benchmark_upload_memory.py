@@ -0,0 +1,116 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp.management.commands.benchmark_compression import synthetic_photo
+from myApp.utils.memory import memory_status, peak_rss, reset_peak_rss
+
+MB = 1024 * 1024
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    """Stands in for Iceberg and R2: answers the three steps and throws the bytes away."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        base = f'http://{self.server.server_address[0]}:{self.server.server_address[1]}'
+        self.respond({'upload_url': f'{base}/r2/{request["key"]}', 'public_url': f'{base}/cdn/{request["key"]}'})
+
+    def do_PUT(self):
+        remaining = int(self.headers['Content-Length'])
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, MB)))
+        self.respond({})
+
+    def respond(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def measure(mode, path, api_base):
+    """
+    Run one upload in this (fresh) process. Returns (peak RSS, RSS before
+    the upload, seconds, bytes uploaded, decoded size), RSS in bytes.
+    """
+    from PIL import Image
+
+    from myApp.utils.iceberg_utils import IcebergClient
+    from myApp.utils.image_compression import compress_image, compress_with_variants, normalize_mode
+
+    client = IcebergClient('benchmark', api_base=api_base)
+    reset_peak_rss()
+    before = memory_status('VmRSS') or peak_rss()
+    start = time.perf_counter()
+    if mode == 'baseline':
+        # The previous pipeline: full resolution decode, the body copied out of its BytesIO
+        img = normalize_mode(Image.open(path))
+        size = img.size
+        body = compress_image(img).read()
+        uploaded = client.upload(body, 'benchmark/full.webp', 'image/webp')['bytes']
+    else:
+        with open(path, 'rb') as image_file:
+            body, size, variants = compress_with_variants(image_file)
+        uploaded = client.upload(body, 'benchmark/full.webp', 'image/webp')['bytes']
+        for width, _, data in variants:
+            uploaded += client.upload(data, f'benchmark/{width}w.webp', 'image/webp')['bytes']
+    seconds = time.perf_counter() - start
+    return peak_rss(), before, seconds, uploaded, size
+
+
+class Command(BaseCommand):
+    help = ('Report the peak memory (RSS) of one upload, compression and Iceberg round trips against a '
+            'local stand-in server, for the current low-memory pipeline and the previous one. '
+            'Each upload runs in a fresh process.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('images', nargs='*', help='Images to upload (default: generated photos)')
+        parser.add_argument('--megapixels', type=float, nargs='+', default=[24, 50],
+                            help='Sizes of the generated photos (default: 24 50)')
+        parser.add_argument('--skip-baseline', action='store_true', help='Only measure the current pipeline')
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), SinkHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        api_base = f'http://127.0.0.1:{server.server_address[1]}'
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = list(options['images'])
+            for path in paths:
+                if not os.path.isfile(path):
+                    raise CommandError(f'{path} does not exist')
+            if not paths:
+                self.stdout.write('Generating photos...')
+                for megapixels in options['megapixels']:
+                    path = os.path.join(directory, f'synthetic-{megapixels:g}mp.jpg')
+                    with open(path, 'wb') as f:
+                        f.write(synthetic_photo(megapixels).getvalue())
+                    paths.append(path)
+
+            modes = ['current'] if options['skip_baseline'] else ['baseline', 'current']
+            self.stdout.write(f'{"image":<28} {"pipeline":<9} {"decoded":>11} {"peak RSS":>10} '
+                              f'{"upload":>9} {"time":>8} {"sent":>9}')
+            for path in paths:
+                for mode in modes:
+                    # A new process per upload, so its peak RSS is this upload's alone
+                    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                        peak, before, seconds, uploaded, size = pool.submit(measure, mode, path, api_base).result()
+                    self.stdout.write(
+                        f'{os.path.basename(path)[-28:]:<28} {mode:<9} {size[0]:>5}x{size[1]:<5} '
+                        f'{peak / MB:>8.0f}MB {(peak - before) / MB:>7.0f}MB {seconds:>7.1f}s {uploaded / MB:>7.2f}MB'
+                    )
+        server.shutdown()
@@ -0,0 +1,238 @@
+import json
+import statistics
+import time
+from contextlib import contextmanager
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template.backends.django import Template as DjangoTemplate
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+from myApp.models import BlogPost, MediaAsset
+from myApp.view_counter import flush_view_counts
+
+# Metrics compared against a baseline. Query counts must not grow at all;
+# the rest may grow by --tolerance (and timings also by --min-delta-ms,
+# so sub-millisecond noise never fails a run)
+COMPARED_METRICS = ('queries', 'query_ms', 'render_ms', 'p50_ms', 'p90_ms', 'bytes')
+EXACT_METRICS = ('queries',)
+
+PARAGRAPH = ('A property manager handles market-based rent pricing, professional marketing and '
+             'showings, thorough tenant screening and lease preparation that complies with local '
+             'laws. One bad tenant can erase months of profit. ')
+
+
+@contextmanager
+def time_template_rendering(timings):
+    """Add the wall time of every top-level template render to timings[0]."""
+    original_render = DjangoTemplate.render
+
+    def timed_render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original_render(self, *args, **kwargs)
+        finally:
+            timings[0] += time.perf_counter() - start
+
+    DjangoTemplate.render = timed_render
+    try:
+        yield
+    finally:
+        DjangoTemplate.render = original_render
+
+
+@contextmanager
+def time_queries(timings):
+    """
+    Count the queries run on the default connection in timings[0] and add
+    their wall time to timings[1]. connection.queries only keeps times
+    rounded to the millisecond, too coarse for SQLite queries.
+    """
+    def timed_execute(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            timings[0] += 1
+            timings[1] += time.perf_counter() - start
+
+    with connection.execute_wrapper(timed_execute):
+        yield
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the public and dashboard views against a throwaway database seeded '
+            'with the site_content fixture plus generated blog posts and media assets. '
+            'Writes a JSON report and fails when it regresses against --baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50, help='Extra blog posts to generate (default: 50)')
+        parser.add_argument('--assets', type=int, default=200, help='Media assets to generate (default: 200)')
+        parser.add_argument('--requests', type=int, default=20, help='Requests per view (default: 20)')
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear the cache before every request (measures uncached rendering)')
+        parser.add_argument('--output', default='benchmark_report.json', help='Report path (default: benchmark_report.json)')
+        parser.add_argument('--baseline', help='Earlier report to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative growth vs the baseline (default: 0.25)')
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help='Timing changes smaller than this never count as regressions (default: 1.0)')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # No background related-posts thread competing with the timed requests
+            with override_settings(RELATED_POSTS_IN_BACKGROUND=False):
+                self.stdout.write('Seeding benchmark database...')
+                user = self.seed(options['posts'], options['assets'])
+                report = self.run_benchmarks(user, options)
+        finally:
+            # Into the throwaway database: left pending, the views would be
+            # flushed at exit into the real one
+            flush_view_counts()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        self.print_report(report)
+        self.stdout.write(f'Report written to {options["output"]}')
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = self.compare(report, baseline, options['tolerance'], options['min_delta_ms'])
+            if regressions:
+                raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def seed(self, posts, assets):
+        call_command('loaddata', 'site_content', verbosity=0)
+        call_command('ensure_singletons', stdout=StringIO())
+        content = '\n\n'.join([PARAGRAPH * 4] * 12)
+        BlogPost.objects.bulk_create([
+            BlogPost(
+                title=f'Benchmark post {i}: what landlords should know',
+                slug=f'benchmark-post-{i}',
+                excerpt=PARAGRAPH,
+                content=content,
+                featured_image_url=f'https://cdn.example.com/bench/post-{i}.webp',
+                is_published=i % 10 != 0,
+            )
+            for i in range(posts)
+        ], batch_size=500)
+        call_command('compile_blog_posts', stdout=StringIO())
+        # bulk_create and loaddata send no save signals: index what the
+        # views are measured on
+        call_command('rebuild_search_index', stdout=StringIO())
+        call_command('rebuild_related_posts', stdout=StringIO())
+        MediaAsset.objects.bulk_create([
+            MediaAsset(
+                url=f'https://cdn.example.com/bench/asset-{i}.webp',
+                secure_url=f'https://cdn.example.com/bench/asset-{i}.webp',
+                public_id=f'bench/asset-{i}.webp',
+                folder='bench',
+                filename=f'asset-{i}.jpg',
+            )
+            for i in range(assets)
+        ], batch_size=1000)
+        return get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+
+    def run_benchmarks(self, user, options):
+        post = BlogPost.objects.filter(is_published=True).first()
+        views = [
+            ('home', reverse('home'), False),
+            ('blog_post_detail', reverse('blog_post_detail', args=[post.slug]), False),
+            ('blog_search', reverse('blog_search') + '?q=tenant+screening', False),
+            ('dashboard:index', reverse('dashboard:index'), True),
+            ('dashboard:gallery', reverse('dashboard:gallery'), True),
+            ('dashboard:blog_edit', reverse('dashboard:blog_edit'), True),
+        ]
+        report = {
+            'dataset': {
+                'blog_posts': BlogPost.objects.count(),
+                'media_assets': MediaAsset.objects.count(),
+            },
+            'requests': options['requests'],
+            'cold': options['cold'],
+            'views': {},
+        }
+        for name, url, login in views:
+            client = Client()
+            if login:
+                client.force_login(user)
+            report['views'][name] = self.measure(client, url, options['requests'], options['cold'])
+        return report
+
+    def measure(self, client, url, requests, cold):
+        latencies, queries, query_times, render_times, sizes = [], [], [], [], []
+        # One untimed request so lazy imports and template loading don't count
+        client.get(url)
+        for _ in range(requests):
+            if cold:
+                cache.clear()
+            render_time, query_time = [0.0], [0, 0.0]
+            with time_queries(query_time), time_template_rendering(render_time):
+                start = time.perf_counter()
+                response = client.get(url)
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}')
+            queries.append(query_time[0])
+            query_times.append(query_time[1] * 1000)
+            render_times.append(render_time[0] * 1000)
+            sizes.append(len(body))
+
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+        return {
+            'url': url,
+            'queries': max(queries),
+            'query_ms': round(statistics.mean(query_times), 3),
+            'render_ms': round(statistics.mean(render_times), 3),
+            'p50_ms': round(cuts[49], 3),
+            'p90_ms': round(cuts[89], 3),
+            'p99_ms': round(cuts[98], 3),
+            'bytes': max(sizes),
+        }
+
+    def print_report(self, report):
+        self.stdout.write(f"\nDataset: {report['dataset']['blog_posts']} blog posts, "
+                          f"{report['dataset']['media_assets']} media assets, "
+                          f"{report['requests']} requests per view{' (cold cache)' if report['cold'] else ''}")
+        header = f"{'view':<22}{'queries':>8}{'query ms':>10}{'render ms':>11}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'bytes':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, m in report['views'].items():
+            self.stdout.write(f"{name:<22}{m['queries']:>8}{m['query_ms']:>10.2f}{m['render_ms']:>11.2f}"
+                              f"{m['p50_ms']:>9.2f}{m['p90_ms']:>9.2f}{m['p99_ms']:>9.2f}{m['bytes']:>10}")
+
+    def compare(self, report, baseline, tolerance, min_delta_ms):
+        if report['dataset'] != baseline.get('dataset') or report['cold'] != baseline.get('cold'):
+            self.stdout.write(self.style.WARNING('Baseline was recorded with a different dataset or cache mode.'))
+        regressions = []
+        for name, metrics in report['views'].items():
+            old = baseline.get('views', {}).get(name)
+            if old is None:
+                continue
+            for metric in COMPARED_METRICS:
+                if metric not in old:
+                    continue
+                if metric in EXACT_METRICS:
+                    allowed = old[metric]
+                else:
+                    allowed = old[metric] * (1 + tolerance)
+                    if metric.endswith('_ms'):
+                        allowed = max(allowed, old[metric] + min_delta_ms)
+                if metrics[metric] > allowed:
+                    regressions.append(f'{name} {metric}: {old[metric]} -> {metrics[metric]}')
+        return regressions
@@ -6,12 +6,23 @@ from myApp.models import BlogPost, SectionImage
 
 class Command(BaseCommand):
     help = ('Load the site_content fixture, but only when the database is empty. '
-            'Safe to run on every deploy: it never overwrites existing content.')
+            'Safe to run on every deploy: it never overwrites existing content. '
+            'Also creates any missing section rows (see ensure_singletons) and compiles '
+            'blog posts that were loaded without their derived fields (see compile_blog_posts). '
+            'Fixture rows send no save signals, so a fresh load also builds the search and '
+            'related-posts indexes.')
 
     def handle(self, *args, **options):
+        loaded = False
         if SectionImage.objects.exists() or BlogPost.objects.exists():
             self.stdout.write('Database already has content - nothing to do.')
-            return
-        self.stdout.write('Empty database detected - loading site_content fixture...')
-        call_command('loaddata', 'site_content')
-        self.stdout.write(self.style.SUCCESS('Site content loaded.'))
+        else:
+            self.stdout.write('Empty database detected - loading site_content fixture...')
+            call_command('loaddata', 'site_content')
+            self.stdout.write(self.style.SUCCESS('Site content loaded.'))
+            loaded = True
+        call_command('ensure_singletons')
+        call_command('compile_blog_posts')
+        if loaded:
+            call_command('rebuild_search_index')
+            call_command('rebuild_related_posts')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from myApp.models import SingletonModel
+
+
+class Command(BaseCommand):
+    help = ('Create the row for every one-row section model (HeroSection, PricingSection, ...) '
+            'that does not exist yet. Runs at deploy time so page views never have to write.')
+
+    def handle(self, *args, **options):
+        created_count = 0
+        for model in SingletonModel.__subclasses__():
+            if model.objects.filter(pk=1).exists():
+                continue
+            model(pk=1).save()
+            created_count += 1
+            self.stdout.write(self.style.SUCCESS(f'Created: {model._meta.verbose_name}'))
+        self.stdout.write(f'{created_count} section row(s) created.')
@@ -0,0 +1,155 @@
+import gzip
+import json
+import os
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from myApp.conditional import home_validators, make_validators
+from myApp.models import BlogPost, BlogPostRelation, SectionImage
+from myApp.related_posts import RELATED_POSTS_COUNT
+from myApp.site_content import get_site_content
+from myApp.views import blog_post_context
+
+try:
+    import brotli
+except ImportError:  # optional: only needed for the .br siblings
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+
+# The section images a blog post page renders (the header logo)
+BLOG_POST_SECTION_IMAGES = ('header_logo',)
+
+
+class Command(BaseCommand):
+    help = ('Render the home page and every published blog post to static HTML '
+            '(with .gz/.br siblings). Only pages whose content changed since the '
+            'last export are re-rendered.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.BASE_DIR / 'static_site'),
+                            help='Directory to write the site to (default: ./static_site)')
+        parser.add_argument('--base-url', default=settings.SITE_URL,
+                            help='Public site URL the pages are rendered for (default: SITE_URL)')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render every page, even if unchanged')
+
+    def handle(self, *args, **options):
+        self.output = options['output']
+        os.makedirs(self.output, exist_ok=True)
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('brotli is not installed - skipping .br files.'))
+
+        base = urlsplit(options['base_url'])
+        self.factory = RequestFactory(
+            HTTP_HOST=base.netloc,
+            SERVER_PORT='443' if base.scheme == 'https' else '80',
+            **{'wsgi.url_scheme': base.scheme},
+        )
+
+        manifest_path = os.path.join(self.output, MANIFEST_NAME)
+        old_manifest = {}
+        if os.path.exists(manifest_path) and not options['force']:
+            with open(manifest_path) as f:
+                old_manifest = json.load(f).get('pages', {})
+
+        pages = {}
+        rendered = 0
+
+        # Home page
+        request = self.factory.get('/')
+        etag, last_modified = home_validators(request)
+        pages['index.html'] = {'url': '/', 'etag': etag, 'last_modified': last_modified}
+        if self._is_stale('index.html', etag, old_manifest):
+            html = render_to_string('myApp/home.html', get_site_content().as_context(), request)
+            self._write_page('index.html', html)
+            rendered += 1
+
+        # Blog posts
+        posts = list(BlogPost.objects.filter(is_published=True).order_by('-published_date'))
+        stamps = {post.pk: post.updated_date for post in posts}
+        relations = {}
+        for post_id, related_id in BlogPostRelation.objects.order_by('post', 'rank').values_list('post', 'related'):
+            relations.setdefault(post_id, []).append(related_id)
+        images = list(SectionImage.objects.filter(section_name__in=BLOG_POST_SECTION_IMAGES)
+                      .order_by('section_name').values_list('section_name', 'updated_at'))
+        for post in posts:
+            path = f'blog/{post.slug}/index.html'
+            request = self.factory.get(f'/blog/{post.slug}/')
+            # The related posts get_related_posts() shows: the stored ones
+            # still published, else the latest posts
+            related = [pk for pk in relations.get(post.pk, []) if pk in stamps][:RELATED_POSTS_COUNT]
+            if not related:
+                related = [other.pk for other in posts if other.pk != post.pk][:RELATED_POSTS_COUNT]
+            etag, last_modified = self._post_validators(request, post, [(pk, stamps[pk]) for pk in related], images)
+            pages[path] = {'url': request.path, 'etag': etag, 'last_modified': last_modified}
+            if self._is_stale(path, etag, old_manifest):
+                html = render_to_string('myApp/blog_post_detail.html', blog_post_context(post), request)
+                self._write_page(path, html)
+                rendered += 1
+
+        # Drop pages that are no longer published
+        removed = 0
+        for path in set(old_manifest) - set(pages):
+            for suffix in ('', '.gz', '.br'):
+                try:
+                    os.remove(os.path.join(self.output, path + suffix))
+                except FileNotFoundError:
+                    continue
+            try:
+                os.rmdir(os.path.dirname(os.path.join(self.output, path)))
+            except OSError:
+                pass
+            removed += 1
+
+        self._write_bytes(MANIFEST_NAME, json.dumps({
+            'deploy_id': settings.DEPLOY_ID,
+            'base_url': options['base_url'],
+            'pages': pages,
+        }, indent=2, sort_keys=True).encode())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {len(pages)} pages to {self.output}: '
+            f'{rendered} rendered, {len(pages) - rendered} unchanged, {removed} removed.'
+        ))
+
+    def _post_validators(self, request, post, related, images):
+        """
+        Validators of one post page from its own inputs only: the post, the
+        related posts it lists and its section images. Unlike the live
+        page's (blog_post_validators, one query for the whole archive), an
+        edit to another post leaves them alone.
+        """
+        rows = (
+            [('post', post.updated_date, post.pk)]
+            + [('related_post', stamp, pk) for pk, stamp in related]
+            + [('section_image', stamp, name) for name, stamp in images]
+        )
+        return make_validators(rows, request.get_host())
+
+    def _is_stale(self, path, etag, old_manifest):
+        if old_manifest.get(path, {}).get('etag') != etag:
+            return True
+        return not os.path.exists(os.path.join(self.output, path))
+
+    def _write_page(self, path, html):
+        body = html.encode('utf-8')
+        self._write_bytes(path, body)
+        # mtime=0 keeps the .gz output identical for identical pages
+        self._write_bytes(path + '.gz', gzip.compress(body, compresslevel=9, mtime=0))
+        if brotli is not None:
+            self._write_bytes(path + '.br', brotli.compress(body, mode=brotli.MODE_TEXT))
+        self.stdout.write(f'Rendered: {path}')
+
+    def _write_bytes(self, path, data):
+        # Write to a temp file and rename, so a page is never served half-written
+        full_path = os.path.join(self.output, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        tmp_path = full_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, full_path)
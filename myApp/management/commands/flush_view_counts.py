@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from myApp.view_counter import flush_view_counts
+
+
+class Command(BaseCommand):
+    help = ('Write the blog post view counts buffered in the cache to the database. '
+            'Run it from cron when traffic is too low to trigger the regular flushes.')
+
+    def handle(self, *args, **options):
+        flushed = flush_view_counts()
+        if flushed is None:
+            self.stdout.write(self.style.WARNING('Another process is flushing view counts right now.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{flushed} view(s) written.'))
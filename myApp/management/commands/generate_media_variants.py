@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from PIL import Image
+
+from myApp.media_dedup import variant_rows
+from myApp.models import MediaAsset, MediaAssetVariant
+from myApp.utils.iceberg_utils import get_client, is_configured, variant_key
+from myApp.utils.image_compression import VARIANT_WIDTHS, encode_variants, open_image
+
+
+def add_variants(asset):
+    """Download an asset, upload its width variants and record them. Returns how many."""
+    response = requests.get(asset.secure_url, timeout=(5, 60))
+    response.raise_for_status()
+    # The stored image's size, not the (possibly capped) decoded one
+    width, height = Image.open(BytesIO(response.content)).size
+    img = open_image(BytesIO(response.content))
+    client = get_client()
+    uploaded = [
+        (variant_width, variant_height, client.upload(data, variant_key(asset.public_id, variant_width), 'image/webp'))
+        for variant_width, variant_height, data in encode_variants(img)
+    ]
+    asset.width, asset.height = width, height
+    asset.save(update_fields=['width', 'height'])
+    MediaAssetVariant.objects.bulk_create(variant_rows(asset, uploaded))
+    return len(uploaded)
+
+
+class Command(BaseCommand):
+    help = ('Create the responsive width variants of Iceberg media assets uploaded before variants '
+            'were made (Cloudinary assets are resized by Cloudinary and are skipped).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Assets processed at a time (default: 2)')
+
+    def handle(self, *args, **options):
+        if not is_configured():
+            raise CommandError('ICEBERG_API_TOKEN is not set.')
+        # Assets no wider than the smallest variant get none: once their
+        # width is recorded they are done
+        assets = [
+            asset for asset in MediaAsset.objects.filter(variants__isnull=True)
+            .filter(Q(width__isnull=True) | Q(width__gt=min(VARIANT_WIDTHS))).order_by('pk')
+            if not asset.is_cloudinary
+        ]
+        done = variants = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for asset, future in zip(assets, [pool.submit(add_variants, asset) for asset in assets]):
+                try:
+                    variants += future.result()
+                    done += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(self.style.WARNING(f'Asset {asset.pk} ({asset.secure_url}): {error}'))
+        self.stdout.write(self.style.SUCCESS(f'{variants} variant(s) created for {done} asset(s), {failed} failed.'))
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp import search
+from myApp.blog_io import RecordError, clean_record, import_batch, read_jsonl, read_markdown_dir
+from myApp.page_cache import bump_content_version
+from myApp.related_posts import update_related_posts
+
+
+class Command(BaseCommand):
+    help = ('Import blog posts exported by export_blog (JSON Lines or a directory of Markdown files). '
+            'Records are matched to posts by slug and written in batches with bulk queries, one '
+            'transaction per batch; posts that already match are skipped, so re-running an import '
+            'changes nothing.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', nargs='?', default='-',
+                            help='JSON Lines file or Markdown directory (default: JSON Lines on stdin)')
+        parser.add_argument('--format', choices=['jsonl', 'markdown'],
+                            help='Input format (default: markdown for a directory, else jsonl)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Records written per transaction (default: 500)')
+
+    def handle(self, *args, **options):
+        source = options['source']
+        format = options['format'] or ('markdown' if os.path.isdir(source) else 'jsonl')
+        if format == 'markdown':
+            if not os.path.isdir(source):
+                raise CommandError(f'{source} is not a directory')
+            self.import_records(read_markdown_dir(source), options['batch_size'])
+        elif source == '-':
+            self.import_records(read_jsonl(sys.stdin), options['batch_size'])
+        else:
+            try:
+                f = open(source, encoding='utf-8')
+            except OSError as error:
+                raise CommandError(error)
+            with f:
+                self.import_records(read_jsonl(f), options['batch_size'])
+
+    def import_records(self, records, batch_size):
+        start = time.perf_counter()
+        batch = []
+        totals = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+
+        def flush():
+            created, updated, unchanged = import_batch(batch)
+            totals['created'] += len(created)
+            totals['updated'] += len(updated)
+            totals['unchanged'] += unchanged
+            # Bulk queries send no signals: index here, the rest once at the end
+            search.index_posts(created + updated)
+            batch.clear()
+            done = sum(totals.values())
+            self.stdout.write(f'  {done} record(s) processed ({time.perf_counter() - start:.1f}s)')
+
+        for where, record in records:
+            try:
+                if isinstance(record, RecordError):
+                    raise record
+                batch.append(clean_record(record))
+            except RecordError as error:
+                totals['skipped'] += 1
+                self.stderr.write(self.style.WARNING(f'Skipping record {where}: {error}'))
+                continue
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        if totals['created'] or totals['updated']:
+            update_related_posts()
+            bump_content_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            '{created} created, {updated} updated, {unchanged} unchanged, {skipped} skipped'.format(**totals)
+            + f' in {time.perf_counter() - start:.1f}s.'
+        ))
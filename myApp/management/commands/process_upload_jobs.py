@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myApp.upload_queue import STALE_AFTER, process_batch, queued_job_ids, requeue_stale_jobs, retry_failed_jobs
+
+
+class Command(BaseCommand):
+    help = ('Process queued gallery uploads. This is the worker for UPLOAD_QUEUE_BACKEND=database; '
+            'with the other backends it picks up jobs whose web process died before finishing them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--retry-failed', action='store_true', help='Requeue failed jobs first')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds between polls of an empty queue (default: 2)')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write(f'{retry_failed_jobs()} failed job(s) requeued.')
+        processed = 0
+        while True:
+            requeued = requeue_stale_jobs(STALE_AFTER)
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'{requeued} interrupted job(s) requeued.'))
+            job_ids = queued_job_ids(limit=20)
+            # Processed together: their encodes run in parallel
+            for job in process_batch(job_ids):
+                processed += 1
+                if job.error:
+                    self.stderr.write(self.style.ERROR(f'Job {job.pk} ({job.filename}) failed: {job.error}'))
+                else:
+                    self.stdout.write(f'Job {job.pk} ({job.filename}) done.')
+            if not job_ids:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'{processed} upload job(s) processed.'))
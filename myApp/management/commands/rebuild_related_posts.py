@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from myApp.models import BlogPostRelation
+from myApp.related_posts import RELATED_POSTS_COUNT, update_related_posts
+
+
+class Command(BaseCommand):
+    help = ('Rescore the related-posts index of the whole blog. Saves update it incrementally; '
+            'run this after bulk imports, or with --full to rewrite every entry.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Drop the index and rebuild it from scratch')
+        parser.add_argument('--count', type=int, default=RELATED_POSTS_COUNT,
+                            help=f'Related posts stored per post (default: {RELATED_POSTS_COUNT})')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            BlogPostRelation.objects.all().delete()
+        updated = update_related_posts(count=options['count'])
+        self.stdout.write(self.style.SUCCESS(f'Related posts updated for {updated} post(s).'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from myApp.search import rebuild_index, search_backend
+
+
+class Command(BaseCommand):
+    help = ('Re-index every blog post for full-text search. Saves keep the index current; '
+            'run this after bulk imports or direct database edits.')
+
+    def handle(self, *args, **options):
+        if search_backend() is None:
+            self.stdout.write(self.style.WARNING('This database has no full-text index; search uses icontains.'))
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'{count} blog post(s) indexed.'))
@@ -0,0 +1,103 @@
+"""
+Reuse MediaAssets when the same image is uploaded again.
+
+Every asset records two SHA-256 digests: original_hash of the file as
+uploaded and content_hash of the WebP we encoded from it. An upload is
+checked against both before paying for the next step:
+
+  - original_hash matches: the file was seen before, nothing to compress,
+  - content_hash matches: a different file of the same pixels (e.g. a copy
+    with its metadata stripped) compressed to bytes we already store, so
+    there is nothing to upload. The asset then learns its original_hash,
+    so the next upload stops at the first check.
+
+content_hash only matches encodes made with the same encoder settings;
+assets uploaded before hashes were recorded have neither hash and are
+never reused.
+
+Only assets in the upload's folder are reused, and a reused asset keeps
+its own alt text (the upload endpoints return it). The oldest matching
+asset wins, so gallery URLs already in use stay the ones handed out.
+"""
+import hashlib
+
+from .models import MediaAsset, MediaAssetVariant
+from .utils.iceberg_utils import upload_with_variants
+from .utils.image_compression import compress_with_variants
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(f):
+    """SHA-256 of a file object's contents, read in chunks; leaves it at the start."""
+    f.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def find_by_original(original_hash, folder):
+    return (
+        MediaAsset.objects.filter(original_hash=original_hash, folder=folder)
+        .prefetch_related('variants').order_by('pk').first()
+    )
+
+
+def find_by_content(content_hash, folder, original_hash=''):
+    asset = (
+        MediaAsset.objects.filter(content_hash=content_hash, folder=folder)
+        .prefetch_related('variants').order_by('pk').first()
+    )
+    if asset is not None and original_hash and not asset.original_hash:
+        asset.original_hash = original_hash
+        MediaAsset.objects.filter(pk=asset.pk).update(original_hash=original_hash)
+    return asset
+
+
+def variant_rows(asset, uploaded_variants):
+    """MediaAssetVariant rows for upload_with_variants() results."""
+    return [
+        MediaAssetVariant(asset=asset, width=width, height=height, url=result['secure_url'],
+                          public_id=result['public_id'], bytes=result['bytes'])
+        for width, height, result in uploaded_variants
+    ]
+
+
+def upload_unless_duplicate(image_file, folder='garden_gate', alt_text=''):
+    """
+    Compress and upload image_file and its width variants as a new
+    MediaAsset, unless an asset in folder with the same original or
+    compressed bytes exists. Returns (asset, created).
+    """
+    original_hash = hash_file(image_file)
+    asset = find_by_original(original_hash, folder)
+    if asset is not None:
+        return asset, False
+
+    body, (width, height), variants = compress_with_variants(image_file)
+    content_hash = hash_bytes(body.getbuffer())
+    asset = find_by_content(content_hash, folder, original_hash)
+    if asset is not None:
+        return asset, False
+
+    result, uploaded_variants = upload_with_variants(body, variants, image_file.name, folder)
+    asset = MediaAsset.objects.create(
+        url=result['url'],
+        secure_url=result['secure_url'],
+        public_id=result['public_id'],
+        folder=folder,
+        filename=image_file.name[:200],
+        alt_text=alt_text,
+        original_hash=original_hash,
+        content_hash=content_hash,
+        width=width,
+        height=height,
+    )
+    MediaAssetVariant.objects.bulk_create(variant_rows(asset, uploaded_variants))
+    return asset, True
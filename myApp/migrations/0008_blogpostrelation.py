@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0007_blogpost_meta_description_blogpost_meta_title'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogPostRelation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(help_text="Position in the post's related list (0 first)")),
+                ('score', models.FloatField(default=0, help_text='Content similarity (0 when padded with recent posts)')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relations', to='myApp.blogpost')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='myApp.blogpost')),
+            ],
+            options={
+                'verbose_name': 'Related Blog Post',
+                'verbose_name_plural': 'Related Blog Posts',
+                'ordering': ['post', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('post', 'rank'), name='blogpostrelation_post_rank_unique')],
+            },
+        ),
+    ]
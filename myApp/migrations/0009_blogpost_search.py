@@ -0,0 +1,61 @@
+import html
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+SEARCH_TABLE = 'myApp_blogpost_search'
+
+
+def plain_text(text):
+    return ' '.join(html.unescape(strip_tags(text or '')).split())
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text index for the database in use (see myApp/search.py)."""
+    vendor = schema_editor.connection.vendor
+    BlogPost = apps.get_model('myApp', 'BlogPost')
+    posts = [
+        (post.pk, plain_text(post.title), plain_text(post.excerpt), plain_text(post.content))
+        for post in BlogPost.objects.only('title', 'excerpt', 'content')
+    ]
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE "{SEARCH_TABLE}" USING fts5('
+            "title, excerpt, body, tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+        for pk, title, excerpt, body in posts:
+            schema_editor.execute(
+                f'INSERT INTO "{SEARCH_TABLE}" (rowid, title, excerpt, body) VALUES (%s, %s, %s, %s)',
+                [pk, title, excerpt, body],
+            )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE "{SEARCH_TABLE}" ('
+            'post_id bigint PRIMARY KEY REFERENCES "myApp_blogpost" (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'body text NOT NULL, document tsvector NOT NULL)'
+        )
+        schema_editor.execute(f'CREATE INDEX "{SEARCH_TABLE}_document" ON "{SEARCH_TABLE}" USING GIN (document)')
+        for pk, title, excerpt, body in posts:
+            schema_editor.execute(
+                f'''INSERT INTO "{SEARCH_TABLE}" (post_id, body, document)
+                    VALUES (%s, %s, setweight(to_tsvector('english', %s), 'A')
+                                 || setweight(to_tsvector('english', %s), 'B')
+                                 || setweight(to_tsvector('english', %s), 'C'))''',
+                [pk, body, title, excerpt, body],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{SEARCH_TABLE}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0008_blogpostrelation'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
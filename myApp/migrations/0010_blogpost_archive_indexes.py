@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0009_blogpost_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['is_published', '-published_date', '-id'], name='blogpost_published_archive'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['-published_date', '-id'], name='blogpost_archive'),
+        ),
+    ]
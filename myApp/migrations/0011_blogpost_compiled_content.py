@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0010_blogpost_archive_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False, help_text='Sanitized HTML of the content'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='excerpt_text',
+            field=models.TextField(blank=True, editable=False, help_text='Plain-text excerpt of the content'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='meta_description_text',
+            field=models.TextField(blank=True, editable=False, help_text='Resolved meta description'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='reading_minutes',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='toc',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='Table of contents (h2/h3 headings)'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:33
+
+import django.db.models.deletion
+import myApp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0011_blogpost_compiled_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(blank=True, help_text='Raw upload, removed once processed', max_length=300, storage=myApp.models.upload_queue_storage, upload_to='%Y/%m/')),
+                ('filename', models.CharField(blank=True, help_text='Original filename', max_length=200)),
+                ('folder', models.CharField(default='garden_gate', help_text='Iceberg folder', max_length=200)),
+                ('alt_text', models.CharField(blank=True, help_text='Alt text', max_length=200)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('media_asset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='myApp.mediaasset')),
+            ],
+            options={
+                'verbose_name': 'Upload Job',
+                'verbose_name_plural': 'Upload Jobs',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='uploadjob_status')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0012_uploadjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaasset',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='Hash of the stored WebP', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='mediaasset',
+            name='original_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='Hash of the uploaded file', max_length=64),
+        ),
+    ]
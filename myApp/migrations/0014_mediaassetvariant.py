@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0013_mediaasset_hashes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaasset',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mediaasset',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='MediaAssetVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('url', models.URLField(max_length=500)),
+                ('public_id', models.CharField(max_length=500)),
+                ('bytes', models.PositiveIntegerField(default=0)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='myApp.mediaasset')),
+            ],
+            options={
+                'ordering': ['width'],
+                'constraints': [models.UniqueConstraint(fields=('asset', 'width'), name='mediaassetvariant_asset_width_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0014_mediaassetvariant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='related_terms',
+            field=models.JSONField(blank=True, editable=False, help_text='Term counts the related posts are scored on (see related_posts.py)', null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0015_blogpost_related_terms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(help_text='Model label, e.g. myapp.blogpost', max_length=100, unique=True)),
+                ('deleted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,5 +1,59 @@
+import copy
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 
+from .page_cache import content_version
+
+
+# Base for the one-row section models (HeroSection, PricingSection, ...)
+class SingletonModel(models.Model):
+    """
+    A model with exactly one row (pk=1).
+
+    get_instance() is a pure read: it never writes, and it is memoized per
+    process until the content version changes (any content save bumps it,
+    see signals.py). A row that doesn't exist yet reads as an unsaved
+    instance with the field defaults; the rows themselves are created at
+    deploy time by the ensure_singletons command.
+    """
+    _memo = {}
+    _memo_lock = threading.Lock()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # Ensure only one instance exists
+        self.pk = 1
+        super().save(*args, **kwargs)
+        type(self)._memo.pop(type(self), None)
+
+    @classmethod
+    def get_instance(cls, cached=True):
+        """
+        Return the single instance. Pass cached=False to bypass the memo
+        (e.g. in edit forms, which must never start from a stale copy).
+        Callers always get their own copy, so they may modify and save it.
+        """
+        if not cached:
+            return cls.objects.filter(pk=1).first() or cls(pk=1)
+
+        version = content_version()
+        entry = cls._memo.get(cls)
+        if entry is None or entry[0] != version or entry[1] < time.monotonic():
+            with cls._memo_lock:
+                obj = cls.objects.filter(pk=1).first() or cls(pk=1)
+                # Also expire on a timer: without a shared cache other worker
+                # processes can't see this process' version bumps
+                entry = (version, time.monotonic() + settings.PAGE_CACHE_TIMEOUT, obj)
+                cls._memo[cls] = entry
+        return copy.copy(entry[2])
+
 # Model to store image URLs for different sections
 class SectionImage(models.Model):
     section_name = models.CharField(max_length=100, unique=True, help_text="Internal name for the section (e.g., 'hero_background', 'about_image')")
@@ -26,23 +80,135 @@ class MediaAsset(models.Model):
     folder = models.CharField(max_length=200, blank=True, help_text="Cloudinary folder")
     filename = models.CharField(max_length=200, blank=True, help_text="Original filename")
     alt_text = models.CharField(max_length=200, blank=True, help_text="Alt text")
+    # SHA-256 hex digests, used to reuse the asset when the same image is uploaded again
+    original_hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="Hash of the uploaded file")
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="Hash of the stored WebP")
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
+    # Gallery grids show images about this wide (CSS pixels)
+    THUMB_WIDTH = 400
+    # Widths offered to browsers for legacy Cloudinary assets (resized by Cloudinary)
+    CLOUDINARY_WIDTHS = (320, 640, 1280, 1920)
+    
     class Meta:
         ordering = ['-uploaded_at']
         verbose_name = "Media Asset"
         verbose_name_plural = "Media Assets"
     
     @property
-    def thumb_url(self):
-        """Generate thumbnail URL (Cloudinary transform only applies to legacy Cloudinary assets)"""
-        if 'res.cloudinary.com' in self.secure_url:
-            return self.secure_url.replace('/upload/', '/upload/f_webp,q_80,w_400/')
+    def is_cloudinary(self):
+        return 'res.cloudinary.com' in self.secure_url
+    
+    def cloudinary_url(self, width):
+        return self.secure_url.replace('/upload/', f'/upload/f_webp,q_80,w_{width}/')
+    
+    def variant_url(self, width):
+        """
+        URL of the smallest copy at least width pixels wide: a variant, or
+        the full image when none is wide enough. Prefetch 'variants' when
+        calling this for many assets.
+        """
+        if self.is_cloudinary:
+            return self.cloudinary_url(width)
+        for variant in self.variants.all():
+            if variant.width >= width:
+                return variant.url
         return self.secure_url
     
+    @property
+    def thumb_url(self):
+        """Thumbnail URL: a resized variant, or a Cloudinary transform for legacy assets"""
+        return self.variant_url(self.THUMB_WIDTH)
+    
+    @property
+    def srcset(self):
+        """srcset attribute value listing the variants and the full image ('' when there's only one size)"""
+        if self.is_cloudinary:
+            return ', '.join(f'{self.cloudinary_url(width)} {width}w' for width in self.CLOUDINARY_WIDTHS)
+        candidates = [(variant.url, variant.width) for variant in self.variants.all()]
+        if not candidates:
+            return ''
+        if self.width:
+            candidates.append((self.secure_url, self.width))
+        return ', '.join(f'{url} {width}w' for url, width in candidates)
+    
     def __str__(self):
         return self.filename or self.public_id
 
+
+# Resized WebP copy of a MediaAsset, uploaded next to it
+class MediaAssetVariant(models.Model):
+    asset = models.ForeignKey(MediaAsset, on_delete=models.CASCADE, related_name='variants')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    url = models.URLField(max_length=500)
+    public_id = models.CharField(max_length=500)
+    bytes = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['width']
+        constraints = [
+            models.UniqueConstraint(fields=['asset', 'width'], name='mediaassetvariant_asset_width_unique'),
+        ]
+    
+    def __str__(self):
+        return f'{self.asset} ({self.width}w)'
+
+# Where queued uploads keep the raw file until a worker processes it.
+# The field builds its storage once, so the location is looked up on every
+# use (tests point UPLOAD_QUEUE_ROOT at a temporary directory).
+class UploadQueueStorage(FileSystemStorage):
+    @property
+    def base_location(self):
+        return settings.UPLOAD_QUEUE_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def upload_queue_storage():
+    return UploadQueueStorage()
+
+
+# Queued gallery upload, processed in the background (see upload_queue.py)
+class UploadJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    file = models.FileField(upload_to='%Y/%m/', storage=upload_queue_storage, max_length=300, blank=True,
+                            help_text="Raw upload, removed once processed")
+    filename = models.CharField(max_length=200, blank=True, help_text="Original filename")
+    folder = models.CharField(max_length=200, default='garden_gate', help_text="Iceberg folder")
+    alt_text = models.CharField(max_length=200, blank=True, help_text="Alt text")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    media_asset = models.ForeignKey(MediaAsset, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        # Workers poll for the oldest queued jobs
+        indexes = [models.Index(fields=['status', 'created_at'], name='uploadjob_status')]
+        verbose_name = "Upload Job"
+        verbose_name_plural = "Upload Jobs"
+
+    def __str__(self):
+        return f'{self.filename or self.pk} ({self.status})'
+
 # Model to store services section content
 class ServiceCard(models.Model):
     card_number = models.IntegerField(unique=True, help_text="Card number (1, 2, or 3)")
@@ -69,7 +235,7 @@ class ServiceCard(models.Model):
         return [f.strip() for f in self.features.split('\n') if f.strip()]
 
 # Model to store services section header
-class ServicesSection(models.Model):
+class ServicesSection(SingletonModel):
     title = models.CharField(max_length=200, default="Management That Fits Your Goals.")
     description = models.TextField(default="Every landlord is different. Some want complete freedom. Others prefer involvement. We tailor our service to fit you.")
     cta_text = models.CharField(max_length=100, default="Find Your Fit")
@@ -82,20 +248,9 @@ class ServicesSection(models.Model):
     
     def __str__(self):
         return "Services Section"
-    
-    def save(self, *args, **kwargs):
-        # Ensure only one instance exists
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        """Get or create the single instance"""
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Hero section content
-class HeroSection(models.Model):
+class HeroSection(SingletonModel):
     title = models.CharField(max_length=300, default="Stop Losing Money to Property Managers Who Don't Care.")
     subtitle = models.CharField(max_length=200, default="Your Investment Deserves an Owner's Standard.")
     description = models.TextField(default="Most property management firms treat you like another number. At Garden Gate, you work directly with me – Mahrukh Tariq. I manage your property with the same standards I apply to my own 90-unit portfolio: honest pricing, rigorous tenant screening, and personal attention that corporations can't replicate.")
@@ -109,18 +264,9 @@ class HeroSection(models.Model):
     
     def __str__(self):
         return "Hero Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Credibility section content
-class CredibilitySection(models.Model):
+class CredibilitySection(SingletonModel):
     title = models.CharField(max_length=300, default="Proven Experience. Personal Commitment.<br>Real Results.")
     description = models.TextField(default="Garden Gate is not a franchise or volume-driven agency. It's a boutique property management firm built on 13 years of hands-on real estate experience — backed by a personal portfolio that proves its systems deliver results.")
     subtitle = models.CharField(max_length=200, default="Why Landlords Choose Garden Gate")
@@ -133,15 +279,6 @@ class CredibilitySection(models.Model):
     
     def __str__(self):
         return "Credibility Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Credibility cards
 class CredibilityCard(models.Model):
@@ -159,7 +296,7 @@ class CredibilityCard(models.Model):
         return f"Credibility Card {self.card_number}: {self.title}"
 
 # Model to store Testimonials section header
-class TestimonialsSection(models.Model):
+class TestimonialsSection(SingletonModel):
     title = models.CharField(max_length=200, default="Why Landlords Stop Looking After Finding Us")
     cta_text = models.CharField(max_length=100, default="Find Out If We're the Right Fit")
     cta_link = models.CharField(max_length=200, default="#consultation")
@@ -171,15 +308,6 @@ class TestimonialsSection(models.Model):
     
     def __str__(self):
         return "Testimonials Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store individual testimonials
 class Testimonial(models.Model):
@@ -201,7 +329,7 @@ class Testimonial(models.Model):
         return f"Testimonial {self.testimonial_number}: {self.author_name}"
 
 # Model to store Statistics section content
-class StatisticsSection(models.Model):
+class StatisticsSection(SingletonModel):
     title = models.CharField(max_length=200, default="Why Quality Management Matters")
     subtitle = models.CharField(max_length=200, default="The Cost of Poor Management:")
     point_1 = models.CharField(max_length=300, default="Long vacancies that cost thousands in lost rent.")
@@ -215,18 +343,9 @@ class StatisticsSection(models.Model):
     
     def __str__(self):
         return "Statistics Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Pain Points section content
-class PainPointsSection(models.Model):
+class PainPointsSection(SingletonModel):
     title = models.CharField(max_length=200, default="Common Problems.<br>Clear Solutions.")
     description = models.TextField(default="Owning rental property shouldn't mean chasing managers or worrying about surprise bills. But too often, landlords deal with:")
     pain_point_1 = models.CharField(max_length=200, default="Managers who disappear when you need answers.")
@@ -249,18 +368,9 @@ class PainPointsSection(models.Model):
     
     def __str__(self):
         return "Pain Points Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Methodology section content
-class MethodologySection(models.Model):
+class MethodologySection(SingletonModel):
     title = models.CharField(max_length=200, default="The Garden Gate Framework")
     description = models.TextField(default="Most companies chase volume. We build relationships. Every property receives personalized attention, open communication, and proactive care.")
     cta_text = models.CharField(max_length=100, default="See the Framework in Action")
@@ -273,15 +383,6 @@ class MethodologySection(models.Model):
     
     def __str__(self):
         return "Methodology Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Methodology steps
 class MethodologyStep(models.Model):
@@ -300,7 +401,7 @@ class MethodologyStep(models.Model):
         return f"Step {self.step_number}: {self.title}"
 
 # Model to store About section content
-class AboutSection(models.Model):
+class AboutSection(SingletonModel):
     title = models.CharField(max_length=200, default="I Built This Because I Was You")
     content = models.TextField(help_text="Main content paragraphs (one per line)")
     quote_text = models.CharField(max_length=300, default="I don't lock clients in. I earn their trust, one transparent decision at a time.")
@@ -316,21 +417,12 @@ class AboutSection(models.Model):
     def __str__(self):
         return "About Section"
     
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
-    
     def get_content_paragraphs(self):
         """Return content as a list of paragraphs"""
         return [p.strip() for p in self.content.split('\n') if p.strip()]
 
 # Model to store Mission/Vision section content
-class MissionVisionSection(models.Model):
+class MissionVisionSection(SingletonModel):
     mission_title = models.CharField(max_length=200, default="Our Mission")
     mission_subtitle = models.CharField(max_length=200, default="Deliver What Corporate Management Can't.")
     mission_description = models.TextField(default="We exist because landlords deserve better — direct access, transparent pricing, and genuine partnership. Garden Gate gives you clarity, control, and confidence in your investment.")
@@ -347,18 +439,9 @@ class MissionVisionSection(models.Model):
     
     def __str__(self):
         return "Mission/Vision Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Lead Magnet section content
-class LeadMagnetSection(models.Model):
+class LeadMagnetSection(SingletonModel):
     title = models.CharField(max_length=200, default="Free 15 Minute Property<br>Assessment")
     subtitle = models.CharField(max_length=200, default="No sales pitch. Just straight answers to:")
     bullet_1 = models.CharField(max_length=200, default="What your property should actually rent for")
@@ -375,18 +458,9 @@ class LeadMagnetSection(models.Model):
     
     def __str__(self):
         return "Lead Magnet Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Final CTA section content
-class FinalCTASection(models.Model):
+class FinalCTASection(SingletonModel):
     title = models.CharField(max_length=200, default="Stop Settling. Start Succeeding.")
     description = models.TextField(default="While others chase unresponsive managers and inflated repair bills, you can work with someone who treats your property like her own.")
     cta_text = models.CharField(max_length=100, default="Show Me How This Actually Works")
@@ -399,18 +473,9 @@ class FinalCTASection(models.Model):
     
     def __str__(self):
         return "Final CTA Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Blog section header
-class BlogSection(models.Model):
+class BlogSection(SingletonModel):
     title = models.CharField(max_length=200, default="Insights & Expertise")
     subtitle = models.CharField(max_length=300, default="Learn from our experience managing properties and building successful landlord relationships.")
     cta_text = models.CharField(max_length=100, default="View All Posts")
@@ -423,15 +488,6 @@ class BlogSection(models.Model):
     
     def __str__(self):
         return "Blog Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Blog Posts
 class BlogPost(models.Model):
@@ -450,42 +506,101 @@ class BlogPost(models.Model):
     order = models.IntegerField(default=0, help_text="Display order (lower numbers first)")
     meta_title = models.CharField(max_length=70, blank=True, help_text="SEO title for search engines (leave blank to use post title)")
     meta_description = models.CharField(max_length=160, blank=True, help_text="SEO description for search engines (leave blank to use excerpt)")
+    # Derived from the fields above on save (see blog_content.py)
+    content_html = models.TextField(blank=True, editable=False, help_text="Sanitized HTML of the content")
+    excerpt_text = models.TextField(blank=True, editable=False, help_text="Plain-text excerpt of the content")
+    meta_description_text = models.TextField(blank=True, editable=False, help_text="Resolved meta description")
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_minutes = models.PositiveSmallIntegerField(default=0, editable=False)
+    toc = models.JSONField(default=list, blank=True, editable=False, help_text="Table of contents (h2/h3 headings)")
+    related_terms = models.JSONField(null=True, blank=True, editable=False,
+                                     help_text="Term counts the related posts are scored on (see related_posts.py)")
     
     class Meta:
         ordering = ['-published_date', 'order']
+        # Keyset pagination of the blog archive and the dashboard list (see pagination.py)
+        indexes = [
+            models.Index(fields=['is_published', '-published_date', '-id'], name='blogpost_published_archive'),
+            models.Index(fields=['-published_date', '-id'], name='blogpost_archive'),
+        ]
         verbose_name = "Blog Post"
         verbose_name_plural = "Blog Posts"
     
     def __str__(self):
         return self.title
     
+    # Fields the derived fields are computed from
+    SOURCE_FIELDS = frozenset({'excerpt', 'content', 'meta_description'})
+    DERIVED_FIELDS = ('content_html', 'excerpt_text', 'meta_description_text', 'word_count', 'reading_minutes', 'toc')
+
+    # Columns a post card renders; listings load only these
+    CARD_FIELDS = ('id', 'slug', 'title', 'excerpt', 'excerpt_text', 'featured_image_url', 'featured_image_alt',
+                   'author_name', 'published_date')
+
+    @classmethod
+    def cards(cls, *extra_fields):
+        """Queryset of posts loading only the columns a post card renders"""
+        return cls.objects.only(*cls.CARD_FIELDS, *extra_fields)
+
+    def compile(self):
+        """Recompute the derived fields from the content"""
+        from .blog_content import compile_post
+        for field, value in compile_post(self.content, self.excerpt, self.meta_description).items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.compile()
+        elif self.SOURCE_FIELDS.intersection(update_fields):
+            self.compile()
+            kwargs['update_fields'] = {*update_fields, *self.DERIVED_FIELDS}
+        super().save(*args, **kwargs)
+
     def get_excerpt(self):
         """Return excerpt or first 200 chars of content (tags stripped)"""
-        if self.excerpt:
-            return self.excerpt
-        from django.utils.html import strip_tags
-        text = strip_tags(self.content)
-        return text[:200] + "..." if len(text) > 200 else text
-
-    @property
-    def content_is_html(self):
-        """True when content was written with the rich text editor (stored as HTML)"""
-        return self.content.lstrip().startswith('<')
+        return self.excerpt or self.excerpt_text
 
     def get_meta_title(self):
         return self.meta_title.strip() or self.title
 
     def get_meta_description(self):
-        if self.meta_description.strip():
-            return self.meta_description.strip()
-        if self.excerpt.strip():
-            return self.excerpt.strip()
-        from django.utils.html import strip_tags
-        text = strip_tags(self.content)
-        return text[:160] + "..." if len(text) > 160 else text
+        return self.meta_description_text
+
+# Precomputed "related posts" of a blog post (rebuilt by related_posts.py)
+class BlogPostRelation(models.Model):
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='relations')
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField(help_text="Position in the post's related list (0 first)")
+    score = models.FloatField(default=0, help_text="Content similarity (0 when padded with recent posts)")
+
+    class Meta:
+        ordering = ['post', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'rank'], name='blogpostrelation_post_rank_unique'),
+        ]
+        verbose_name = "Related Blog Post"
+        verbose_name_plural = "Related Blog Posts"
+
+    def __str__(self):
+        return f"{self.post_id} -> {self.related_id} ({self.score:.3f})"
+
+# When rows of a content table were last deleted. A delete leaves no newer
+# timestamp behind, so the fingerprints (site_content.Fingerprint) include
+# these for Last-Modified to never go backwards.
+class ContentDeletion(models.Model):
+    table = models.CharField(max_length=100, unique=True, help_text="Model label, e.g. myapp.blogpost")
+    deleted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.table} ({self.deleted_at})"
+
+    @classmethod
+    def record(cls, model):
+        cls.objects.update_or_create(table=model._meta.label_lower)
 
 # Model to store Pricing section content
-class PricingSection(models.Model):
+class PricingSection(SingletonModel):
     title = models.CharField(max_length=200, default="Our Packages & Rates")
     subtitle = models.CharField(max_length=300, default="NO HIDDEN FEES, CLEAR PRICING, EXCEPTIONAL SERVICE.")
     disclaimer = models.CharField(max_length=300, default="No hidden fees. Professional management you can count on.")
@@ -499,15 +614,6 @@ class PricingSection(models.Model):
     
     def __str__(self):
         return "Pricing Section"
-    
-    def save(self, *args, **kwargs):
-        self.pk = 1
-        super().save(*args, **kwargs)
-    
-    @classmethod
-    def get_instance(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
 
 # Model to store Pricing Packages
 class PricingPackage(models.Model):
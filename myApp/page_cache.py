@@ -0,0 +1,93 @@
+"""
+Rendered-HTML cache for public pages, keyed by the page's ETag.
+
+The ETag is the content fingerprint conditional_page computes for every
+request anyway (see conditional.py), read from the database, so every
+worker process agrees on it: after an edit is committed the next hit
+misses and renders the new content, and the stale copy is never served
+under the new validator. Only anonymous GET/HEAD requests are served from
+or stored in the cache.
+
+The content version is a cheaper, per-cache counter bumped after every
+committed content change (see signals.py), for memos that can tolerate
+another process' edit showing up late (SingletonModel.get_instance).
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+CONTENT_VERSION_KEY = 'content-version'
+
+
+def _new_version():
+    # Time based, so a version key evicted from a shared cache never comes
+    # back with a number older pages were cached under
+    return int(time.time() * 1000)
+
+
+def content_version():
+    """Return the current content version, initialising it if needed."""
+    version = cache.get(CONTENT_VERSION_KEY)
+    if version is None:
+        cache.add(CONTENT_VERSION_KEY, _new_version(), None)
+        version = cache.get(CONTENT_VERSION_KEY)
+    return version
+
+
+def bump_content_version():
+    """Invalidate every cached page (called after any content change)."""
+    try:
+        return cache.incr(CONTENT_VERSION_KEY)
+    except ValueError:
+        version = _new_version()
+        cache.set(CONTENT_VERSION_KEY, version, None)
+        return version
+
+
+def page_cache_key(name, etag):
+    return 'page:{}:{}'.format(name, etag.strip('"'))
+
+
+def cache_public_page(view_func):
+    """
+    Serve anonymous GET/HEAD hits of a view from the page cache.
+    The page is cached per view, URL arguments and ETag (the query string
+    and host are ignored), so only use this on views whose output doesn't
+    otherwise depend on the request. Goes under @conditional_page, which
+    sets request.etag; without one nothing is cached.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        etag = getattr(request, 'etag', None)
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated or etag is None:
+            return view_func(request, *args, **kwargs)
+
+        name = ':'.join([view_func.__name__, *map(str, args), *map(str, kwargs.values())])
+        key = page_cache_key(name, etag)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200:
+            if response.streaming:
+                response.streaming_content = _cache_when_complete(
+                    response.streaming_content, key, response['Content-Type'])
+            else:
+                cache.set(key, (response.content, response['Content-Type']), settings.PAGE_CACHE_TIMEOUT)
+        return response
+    return wrapper
+
+
+def _cache_when_complete(chunks, key, content_type):
+    # Pass a streamed page through unchanged and cache it once it was sent in
+    # full (an aborted stream is never cached)
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(key, (b''.join(body), content_type), settings.PAGE_CACHE_TIMEOUT)
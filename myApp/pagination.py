@@ -0,0 +1,68 @@
+"""
+Keyset (cursor) pagination for blog post listings.
+
+Posts are listed newest first by (published_date, id). A page is fetched with
+"WHERE (published_date, id) < cursor ORDER BY ... LIMIT n" instead of an
+OFFSET, so page 500 costs the same as page 1: the database seeks straight to
+the cursor through the (published_date, id) indexes on BlogPost.
+
+Cursors are opaque strings: the published_date and id of the row a page
+starts or ends at.
+"""
+import base64
+from collections import namedtuple
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'previous_cursor'])
+
+
+def encode_cursor(post):
+    raw = f'{post.published_date.isoformat()}|{post.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (published_date, id), or None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, pk = raw.split('|')
+        published_date = parse_datetime(date)
+        return (published_date, int(pk)) if published_date else None
+    except ValueError:
+        return None
+
+
+def keyset_paginate(queryset, per_page, after=None, before=None):
+    """
+    Return a KeysetPage of queryset, newest first. `after` gives the page of
+    older posts following that cursor, `before` the newer ones preceding it,
+    neither the first page. next_cursor/previous_cursor are None at the ends.
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+    if before:
+        date, pk = before
+        rows = list(
+            queryset.filter(Q(published_date__gt=date) | Q(published_date=date, pk__gt=pk))
+            .order_by('published_date', 'id')[:per_page + 1]
+        )
+        has_newer, has_older = len(rows) > per_page, True
+        items = rows[:per_page][::-1]
+    else:
+        if after:
+            date, pk = after
+            queryset = queryset.filter(Q(published_date__lt=date) | Q(published_date=date, pk__lt=pk))
+        rows = list(queryset.order_by('-published_date', '-id')[:per_page + 1])
+        has_newer, has_older = after is not None, len(rows) > per_page
+        items = rows[:per_page]
+
+    if not items:
+        return KeysetPage(items, None, None)
+    return KeysetPage(
+        items,
+        encode_cursor(items[-1]) if has_older else None,
+        encode_cursor(items[0]) if has_newer else None,
+    )
@@ -0,0 +1,244 @@
+"""
+Related-posts index for the blog detail page.
+
+Every published post is a TF-IDF vector over its title (weighted up), excerpt
+and content; the posts most similar to it (cosine similarity) are stored in
+BlogPostRelation, padded with the latest posts when fewer than
+RELATED_POSTS_COUNT share any terms. The detail page then reads its related
+posts with one indexed query instead of ordering the blog on every view.
+
+Each post's term counts are stored with it (BlogPost.related_terms) and the
+vectors are sparse ({term: weight}), so scoring costs the number of distinct
+terms per post rather than posts x vocabulary.
+
+A save or delete (signals.py) schedules update_related_posts() for that
+post on a background thread, after the response (RELATED_POSTS_IN_BACKGROUND).
+The update is incremental: it rescores the saved post's own list, the lists
+that include it and the lists it now scores into; the others are left as
+they are, so their scores drift slightly as the document frequencies move.
+`manage.py rebuild_related_posts` rescores everything (after bulk imports,
+or if a process died with updates pending).
+"""
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.html import strip_tags
+
+from .blog_content import html_text
+from .models import BlogPost, BlogPostRelation
+
+logger = logging.getLogger(__name__)
+
+RELATED_POSTS_COUNT = 3
+
+# Title words count this many times
+TITLE_WEIGHT = 3
+
+WORD_RE = re.compile(r"[a-z][a-z0-9']+")
+
+STOP_WORDS = frozenset('''
+    a about above after again against all am an and any are as at be because been before being
+    below between both but by can could did do does doing down during each few for from further
+    had has have having he her here hers herself him himself his how i if in into is it its itself
+    just me more most my myself no nor not now of off on once only or other our ours ourselves out
+    over own same she should so some such than that the their theirs them themselves then there
+    these they this those through to too under until up very was we were what when where which
+    while who whom why will with would you your yours yourself yourselves also get one can't don't
+    it's let's may might much must need us via well
+'''.split())
+
+
+def tokenize(text):
+    return [word for word in WORD_RE.findall(strip_tags(text).lower()) if word not in STOP_WORDS]
+
+
+def post_terms(title, excerpt, content, content_html):
+    """Return the {term: count} document a post is scored on."""
+    # The stored HTML is cheaper to reduce to text than the raw content
+    body = WORD_RE.findall(html_text(content_html).lower()) if content_html else tokenize(content)
+    return dict(Counter(tokenize(title) * TITLE_WEIGHT + tokenize(excerpt)
+                        + [word for word in body if word not in STOP_WORDS]))
+
+
+def refresh_terms(post_ids=None):
+    """Recompute the stored term counts of post_ids (default: every post)."""
+    posts = BlogPost.objects.only('title', 'excerpt', 'content', 'content_html', 'related_terms')
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    posts = list(posts)
+    for post in posts:
+        post.related_terms = post_terms(post.title, post.excerpt, post.content, post.content_html)
+    # bulk_update: no save() signals, so this doesn't schedule itself again
+    BlogPost.objects.bulk_update(posts, ['related_terms'], batch_size=200)
+
+
+def _documents():
+    """Return {post id: term counts} of the published posts, latest first."""
+    documents = dict(
+        BlogPost.objects.filter(is_published=True)
+        .order_by('-published_date', 'order')
+        .values_list('pk', 'related_terms')
+    )
+    # Posts saved before term counts were stored
+    missing = [pk for pk, terms in documents.items() if terms is None]
+    if missing:
+        refresh_terms(missing)
+        documents.update(BlogPost.objects.filter(pk__in=missing).values_list('pk', 'related_terms'))
+    return documents
+
+
+def tfidf_vectors(documents):
+    """Return the L2-normalised sparse TF-IDF vectors ({term: weight}) of {key: term counts}."""
+    document_frequency = Counter(term for terms in documents.values() for term in terms)
+    total = len(documents)
+    vectors = {}
+    for key, terms in documents.items():
+        # Sublinear term frequency, so long posts don't drown short ones
+        vector = {
+            term: (1 + math.log(count)) * (math.log((1 + total) / (1 + document_frequency[term])) + 1)
+            for term, count in terms.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1
+        vectors[key] = {term: weight / norm for term, weight in vector.items()}
+    return vectors
+
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+
+def _rank(pk, vectors, count):
+    """Return [(related post id, score), ...] for one post."""
+    vector = vectors[pk]
+    scores = [(other, cosine(vector, other_vector)) for other, other_vector in vectors.items() if other != pk]
+    # Stable sort: ties (and the zero-score padding) go to the latest posts
+    scores.sort(key=lambda item: -item[1])
+    chosen = [(other, round(score, 4)) for other, score in scores[:count] if score > 0]
+    chosen_ids = {other for other, _ in chosen}
+    for other, _ in scores:
+        if len(chosen) >= count:
+            break
+        if other not in chosen_ids:
+            chosen.append((other, 0.0))
+    return chosen
+
+
+def compute_related_posts(count=RELATED_POSTS_COUNT):
+    """Return {post id: [(related post id, score), ...]} for every published post."""
+    vectors = tfidf_vectors(_documents())
+    return {pk: _rank(pk, vectors, count) for pk in vectors}
+
+
+def _affected(post_ids, vectors, current, count):
+    """The published posts whose list may change when post_ids changed."""
+    affected = {pk for pk in post_ids if pk in vectors}
+    changed_vectors = [vectors[pk] for pk in affected]
+    for pk in vectors:
+        chosen = current.get(pk, [])
+        if pk in affected:
+            continue
+        if len(chosen) < count or any(related_id in post_ids for related_id, _ in chosen):
+            # No list yet, a shortened one (a related post was deleted) or one including a changed post
+            affected.add(pk)
+        elif changed_vectors:
+            # A changed post may now beat the weakest entry
+            weakest = min(score for _, score in chosen)
+            if any(cosine(vectors[pk], vector) > weakest for vector in changed_vectors):
+                affected.add(pk)
+    return affected
+
+
+def update_related_posts(post_ids=None, count=RELATED_POSTS_COUNT):
+    """
+    Bring BlogPostRelation up to date after post_ids were saved or deleted,
+    or rescore every post when post_ids is None. Only posts whose list of
+    related posts changed are rewritten. Returns the number of posts updated.
+    """
+    if post_ids is None:
+        refresh_terms()
+    else:
+        post_ids = set(post_ids)
+        refresh_terms(post_ids)
+    vectors = tfidf_vectors(_documents())
+
+    current = {}
+    for post_id, related_id, score in (BlogPostRelation.objects.order_by('post', 'rank')
+                                       .values_list('post', 'related', 'score')):
+        current.setdefault(post_id, []).append((related_id, score))
+
+    targets = vectors if post_ids is None else _affected(post_ids, vectors, current, count)
+    related = {pk: _rank(pk, vectors, count) for pk in targets}
+    changed = [
+        pk for pk, chosen in related.items()
+        if [related_id for related_id, _ in current.get(pk, [])] != [related_id for related_id, _ in chosen]
+    ]
+    # Posts that were unpublished or deleted lose their list
+    stale = [pk for pk in current if pk not in vectors]
+
+    with transaction.atomic():
+        BlogPostRelation.objects.filter(post__in=changed + stale).delete()
+        BlogPostRelation.objects.bulk_create([
+            BlogPostRelation(post_id=pk, related_id=related_id, rank=rank, score=score)
+            for pk in changed
+            for rank, (related_id, score) in enumerate(related[pk])
+        ])
+    return len(changed) + len(stale)
+
+
+_pending = set()
+_pending_lock = threading.Lock()
+_executor = None
+
+
+def _run_pending():
+    with _pending_lock:
+        post_ids = set(_pending)
+        _pending.clear()
+    try:
+        update_related_posts(post_ids)
+    except Exception:
+        logger.exception('Could not update the related posts of posts %s', sorted(post_ids))
+    finally:
+        connections.close_all()
+
+
+def schedule_update(post_id):
+    """
+    Update the related posts after post_id was saved or deleted: on the
+    background thread (saves made while it runs are handled together in its
+    next run), or right away without RELATED_POSTS_IN_BACKGROUND.
+    """
+    global _executor
+    if not settings.RELATED_POSTS_IN_BACKGROUND:
+        update_related_posts([post_id])
+        return
+    with _pending_lock:
+        idle = not _pending
+        _pending.add(post_id)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='related-posts')
+    if idle:
+        _executor.submit(_run_pending)
+
+
+def get_related_posts(post, count=RELATED_POSTS_COUNT):
+    """
+    Return the related posts of post: one query on the index, or the latest
+    posts when the index has no entry for it yet.
+    """
+    related = [
+        relation.related for relation in
+        BlogPostRelation.objects.filter(post=post, related__is_published=True)
+        .select_related('related').order_by('rank')[:count]
+    ]
+    if related:
+        return related
+    return list(BlogPost.objects.filter(is_published=True).exclude(pk=post.pk).order_by('-published_date')[:count])
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import BlogPost, ContentDeletion
+from .page_cache import bump_content_version
+from .related_posts import schedule_update
+from .search import index_post, unindex_post
+from .site_content import CONTENT_TABLES
+
+# Models whose changes show up on public pages
+CONTENT_MODELS = frozenset(model for model, _ in CONTENT_TABLES)
+
+# Saves that only touch these fields don't change what the pages render
+IGNORED_UPDATE_FIELDS = frozenset({'view_count'})
+
+
+@receiver([post_save, post_delete])
+def bump_version_on_content_change(sender, **kwargs):
+    if sender not in CONTENT_MODELS or kwargs.get('raw'):
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= IGNORED_UPDATE_FIELDS:
+        return
+    if kwargs['signal'] is post_delete:
+        ContentDeletion.record(sender)
+    # After the commit: a render running alongside the save would otherwise
+    # remember pre-commit rows under the new version
+    transaction.on_commit(bump_content_version)
+
+
+@receiver([post_save, post_delete], sender=BlogPost)
+def update_related_posts_on_change(sender, instance, **kwargs):
+    # Fixture loads (loaddata) save raw rows; whoever loads them rebuilds
+    # the related posts and search index once at the end
+    if kwargs.get('raw'):
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= IGNORED_UPDATE_FIELDS:
+        return
+    post_id = instance.pk
+    transaction.on_commit(lambda: schedule_update(post_id))
+
+
+@receiver(post_save, sender=BlogPost)
+def index_post_on_save(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= IGNORED_UPDATE_FIELDS:
+        return
+    index_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def unindex_post_on_delete(sender, instance, **kwargs):
+    unindex_post(instance.pk)
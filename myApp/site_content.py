@@ -0,0 +1,278 @@
+"""
+Read-only snapshot of everything the public home page renders.
+
+Loading the home page section by section costs ~20 queries per hit, and every
+get_instance() call is a get_or_create (a potential write on a read path).
+Instead:
+
+  1. a single UNION ALL query fingerprints every content table
+     (row count + latest updated_at per table),
+  2. the snapshot is rebuilt only when that fingerprint changes, using plain
+     SELECTs - a missing singleton row falls back to an unsaved default
+     instance, nothing is ever written,
+  3. the result is memoized per process and handed out as an immutable
+     SiteContent object.
+
+A steady-state home page hit therefore costs one query.
+"""
+import datetime
+import hashlib
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import CharField, Count, Max, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import SimpleLazyObject
+
+from .image_helpers import LazySectionImages, section_images_from_rows
+from .models import (
+    ServiceCard, ServicesSection, HeroSection, CredibilitySection, CredibilityCard,
+    TestimonialsSection, Testimonial, StatisticsSection, PainPointsSection,
+    MethodologySection, MethodologyStep, AboutSection, MissionVisionSection,
+    LeadMagnetSection, FinalCTASection, BlogSection, BlogPost,
+    PricingSection, PricingPackage, SectionImage, ContentDeletion
+)
+
+# Number of published posts shown in the home page blog section
+HOME_BLOG_POST_LIMIT = 6
+
+# Context name -> singleton section model
+SINGLETON_SECTIONS = (
+    ('hero_section', HeroSection),
+    ('credibility_section', CredibilitySection),
+    ('testimonials_section', TestimonialsSection),
+    ('statistics_section', StatisticsSection),
+    ('pain_points_section', PainPointsSection),
+    ('services_section', ServicesSection),
+    ('methodology_section', MethodologySection),
+    ('about_section', AboutSection),
+    ('mission_vision_section', MissionVisionSection),
+    ('lead_magnet_section', LeadMagnetSection),
+    ('final_cta_section', FinalCTASection),
+    ('blog_section', BlogSection),
+    ('pricing_section', PricingSection),
+)
+
+# Context name -> (card model, ordering field)
+CARD_LISTS = (
+    ('credibility_cards', CredibilityCard, 'card_number'),
+    ('testimonials', Testimonial, 'testimonial_number'),
+    ('service_cards', ServiceCard, 'card_number'),
+    ('methodology_steps', MethodologyStep, 'step_number'),
+    ('pricing_packages', PricingPackage, 'package_number'),
+)
+
+# The partials home.html is built from, in page order:
+# (fragment name, context names it renders, section images it renders).
+# Each one is cached on its own, keyed by the updated_at of exactly these rows,
+# so an edit only re-renders the partials that show the edited rows.
+HOME_PARTIALS = (
+    ('header', (), ('header_logo',)),
+    ('hero', ('hero_section',), ('hero_background', 'hero_image')),
+    ('video_section', (), ()),
+    ('statistics', (), ()),
+    ('credibility', ('credibility_section', 'credibility_cards'), ()),
+    ('core_differentiators', (), ()),
+    ('testimonials', ('testimonials_section', 'testimonials'), ()),
+    ('pain_points', ('pain_points_section',), ()),
+    ('services', ('services_section', 'service_cards'), ()),
+    ('pricing', ('pricing_section', 'pricing_packages'), ()),
+    ('methodology', ('methodology_section', 'methodology_steps'),
+     tuple(f'methodology_icon_{i}' for i in range(1, 6))),
+    ('about', ('about_section',), ('about_background', 'about_image')),
+    ('mission_vision', ('mission_vision_section',), ()),
+    ('blog', ('blog_section', 'blog_posts'), ()),
+    ('lead_magnet', ('lead_magnet_section',), ('lead_magnet_tablet',)),
+    ('final_cta', ('final_cta_section',), ('final_cta_background',)),
+    ('footer', (), ()),
+    ('contact_form_modal', (), ()),
+    ('scripts', (), ()),
+)
+
+HOME_PARTIAL_NAMES = frozenset(name for name, _, _ in HOME_PARTIALS)
+
+# Sections most visitors never scroll to. With DEFER_BELOW_FOLD_SECTIONS on,
+# the home page ships a placeholder for each (carrying the section's anchor
+# id, so in-page links still land) and fetches it from /sections/<name>/.
+BELOW_FOLD_SECTIONS = {
+    'testimonials': 'testimonials',
+    'methodology': 'method',
+    'mission_vision': '',
+    'blog': 'blog',
+    'lead_magnet': '',
+    'final_cta': 'consultation',
+}
+
+HomeFragment = namedtuple('HomeFragment', ['name', 'template', 'stamp', 'below_fold', 'anchor'])
+
+# Every table the home page reads, with its "last modified" column
+CONTENT_TABLES = (
+    [(model, 'updated_at') for _, model in SINGLETON_SECTIONS]
+    + [(model, 'updated_at') for _, model, _ in CARD_LISTS]
+    + [(SectionImage, 'updated_at'), (BlogPost, 'updated_date')]
+)
+
+
+class SiteContent:
+    """Immutable home page context. Read values as attributes or keys."""
+    __slots__ = ('version', '_values')
+
+    def __init__(self, version, values):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, '_values', MappingProxyType(dict(values)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('SiteContent is read-only')
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def as_context(self):
+        """Return a fresh template context dict (safe to extend per request)."""
+        return dict(self._values)
+
+
+def _as_datetime(value):
+    # Raw SQLite results return timestamps as text
+    if isinstance(value, str):
+        value = parse_datetime(value)
+        if settings.USE_TZ and timezone.is_naive(value):
+            value = timezone.make_aware(value, datetime.timezone.utc)
+    return value
+
+
+class Fingerprint:
+    """
+    A prepared fingerprint query. Calling it returns
+    ((label, latest stamp, row count), ...) for each (label, queryset, stamp
+    column) source returned by get_sources(), from one UNION ALL query.
+    Any save, insert or delete in a source changes the result.
+
+    The SQL is compiled once per database: building the ORM union costs
+    several times more than running it.
+    """
+    def __init__(self, get_sources):
+        self.get_sources = get_sources
+        self._compiled = {}
+
+    def _compile(self, using):
+        queries = [
+            queryset.order_by()
+            .annotate(label=Value(label, output_field=CharField()))
+            .values('label')
+            .annotate(stamp=Max(column), rows=Count('pk'))
+            for label, queryset, column in self.get_sources()
+        ]
+        union = queries[0].union(*queries[1:], all=True)
+        return union.query.get_compiler(using).as_sql()
+
+    def __call__(self, using=DEFAULT_DB_ALIAS):
+        if using not in self._compiled:
+            self._compiled[using] = self._compile(using)
+        sql, params = self._compiled[using]
+        with connections[using].cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        return tuple(sorted((label, _as_datetime(stamp), count) for label, stamp, count in rows))
+
+
+def deletions(*models):
+    """A fingerprint source for the last delete from any of models (see ContentDeletion)."""
+    tables = [model._meta.label_lower for model in models]
+    return ('deletions', ContentDeletion.objects.filter(table__in=tables), 'deleted_at')
+
+
+# Fingerprint of every table the home page reads
+content_fingerprint = Fingerprint(lambda: [
+    (model._meta.label_lower, model.objects.all(), column)
+    for model, column in CONTENT_TABLES
+] + [deletions(*(model for model, _ in CONTENT_TABLES))])
+
+
+def _freeze_section_images(images):
+    return MappingProxyType({name: MappingProxyType(urls) for name, urls in images.items()})
+
+
+def _row_stamp(obj):
+    return (obj.pk, getattr(obj, 'updated_at', None) or getattr(obj, 'updated_date', None))
+
+
+def _fragment_stamp(values, names, image_stamps, image_names):
+    parts = []
+    for name in names:
+        value = values[name]
+        rows = value if isinstance(value, tuple) else (value,)
+        parts.append([_row_stamp(obj) for obj in rows])
+    parts.append([image_stamps.get(name) for name in image_names])
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def load_site_content(version=None):
+    """Build a new SiteContent with plain reads (never writes to the database)."""
+    images = list(SectionImage.objects.all())
+    values = {'section_images': _freeze_section_images(section_images_from_rows(images))}
+    for name, model in SINGLETON_SECTIONS:
+        # Unsaved defaults stand in for rows that haven't been created yet
+        values[name] = model.objects.filter(pk=1).first() or model(pk=1)
+    for name, model, order_field in CARD_LISTS:
+        values[name] = tuple(model.objects.order_by(order_field))
+    values['blog_posts'] = tuple(
+        BlogPost.objects.filter(is_published=True).order_by('-published_date')[:HOME_BLOG_POST_LIMIT]
+    )
+
+    image_stamps = {image.section_name: _row_stamp(image) for image in images}
+    values['home_fragments'] = tuple(
+        HomeFragment(name, f'myApp/partials/{name}.html',
+                     _fragment_stamp(values, names, image_stamps, image_names),
+                     name in BELOW_FOLD_SECTIONS, BELOW_FOLD_SECTIONS.get(name, ''))
+        for name, names, image_names in HOME_PARTIALS
+    )
+    values['fragment_cache_timeout'] = settings.FRAGMENT_CACHE_TIMEOUT
+    return SiteContent(version, values)
+
+
+_lock = threading.Lock()
+_current = None
+
+
+def get_site_content():
+    """Return the memoized SiteContent, rebuilding it when the content changed."""
+    global _current
+    version = content_fingerprint()
+    content = _current
+    if content is not None and content.version == version:
+        return content
+    with _lock:
+        if _current is None or _current.version != version:
+            _current = load_site_content(version)
+        return _current
+
+
+def lazy_site_context():
+    """
+    Template context with the same names as SiteContent, resolved on first use:
+    sections load through get_instance() when a template first touches them,
+    card lists are unevaluated querysets and section images load per name.
+    For pages that share base.html/header/footer but render only a few
+    sections; the home page renders everything and uses get_site_content().
+    """
+    context = {'section_images': LazySectionImages()}
+    for name, model in SINGLETON_SECTIONS:
+        context[name] = SimpleLazyObject(model.get_instance)
+    for name, model, order_field in CARD_LISTS:
+        context[name] = model.objects.order_by(order_field)
+    context['blog_posts'] = BlogPost.objects.filter(is_published=True).order_by('-published_date')[:HOME_BLOG_POST_LIMIT]
+    return context
@@ -0,0 +1,106 @@
+"""
+Unique blog post slugs.
+
+A taken slug gets the next free "-2", "-3", ... suffix. All the slugs that
+could clash with a base ("base" and "base-*") are fetched in one query,
+whether for one post or for a whole import batch (a few hundred bases per
+query), instead of probing one candidate per query.
+
+Between picking a slug and saving it another request can take it, so
+save_with_unique_slug() relies on the unique constraint and retries with a
+fresh slug.
+
+RESERVED_SLUGS are never handed out: /blog/<slug>/ would be shadowed by
+another route.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .models import BlogPost
+
+SLUG_MAX_LENGTH = BlogPost._meta.get_field('slug').max_length
+SAVE_ATTEMPTS = 5
+TAKEN_QUERY_BASES = 400
+
+# Paths under /blog/ that belong to other views (see myProject/urls.py)
+RESERVED_SLUGS = frozenset({'search'})
+
+
+def clean_slug(text, fallback='post'):
+    return slugify(text)[:SLUG_MAX_LENGTH].strip('-') or fallback
+
+
+def _taken_slugs(bases, exclude_pk=None):
+    """Return every existing slug equal to one of bases or starting with "<base>-"."""
+    bases = sorted(bases)
+    taken = set()
+    # One query per TAKEN_QUERY_BASES bases: SQLite caps the depth of an OR chain
+    for start in range(0, len(bases), TAKEN_QUERY_BASES):
+        chunk = bases[start:start + TAKEN_QUERY_BASES]
+        prefixes = [
+            # Near the length limit, suffixed slugs cut the base short
+            base[:SLUG_MAX_LENGTH - 8] if len(base) > SLUG_MAX_LENGTH - 8 else f'{base}-'
+            for base in chunk
+        ]
+        query = Q(slug__in=chunk)
+        for prefix in prefixes:
+            query |= Q(slug__startswith=prefix)
+        posts = BlogPost.objects.filter(query)
+        if exclude_pk is not None:
+            posts = posts.exclude(pk=exclude_pk)
+        taken.update(posts.values_list('slug', flat=True))
+    return taken
+
+
+def _with_suffix(base, number):
+    suffix = f'-{number}'
+    return base[:SLUG_MAX_LENGTH - len(suffix)].rstrip('-') + suffix
+
+
+def _next_free(base, taken):
+    number = 2
+    slug = base
+    while slug in taken:
+        slug = _with_suffix(base, number)
+        number += 1
+    return slug
+
+
+def allocate_slug(text, exclude_pk=None):
+    """Return a slug for text that no other post uses (one query)."""
+    base = clean_slug(text)
+    return _next_free(base, _taken_slugs([base], exclude_pk) | RESERVED_SLUGS)
+
+
+def allocate_slugs(texts, reserved=()):
+    """
+    Return one unused slug per text, unique among themselves too
+    (one query for the whole batch). Slugs in reserved (and RESERVED_SLUGS)
+    count as taken.
+    """
+    bases = [clean_slug(text) for text in texts]
+    taken = (_taken_slugs(set(bases)) if bases else set()) | set(reserved) | RESERVED_SLUGS
+    slugs = []
+    for base in bases:
+        slug = _next_free(base, taken)
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def save_with_unique_slug(post, text):
+    """
+    Save post under a unique slug derived from text, retrying with a new
+    slug if a concurrent save takes it first.
+    """
+    for attempt in range(SAVE_ATTEMPTS):
+        post.slug = allocate_slug(text, exclude_pk=post.pk)
+        try:
+            with transaction.atomic():
+                post.save()
+            return post
+        except IntegrityError:
+            slug_taken = BlogPost.objects.filter(slug=post.slug).exclude(pk=post.pk).exists()
+            if not slug_taken or attempt == SAVE_ATTEMPTS - 1:
+                raise
@@ -0,0 +1,82 @@
+"""
+Streaming render mode for public pages.
+
+A page extending base.html is sent in three parts:
+  1. everything before the content block (<head> with the Tailwind, Font
+     Awesome and Google Fonts tags, and the opening <body>) - flushed before
+     any section data is loaded, so the browser starts fetching assets at once,
+  2. the content block, one chunk per included partial, rendered as its data
+     arrives,
+  3. the rest of base.html.
+
+The markup is the same render() would produce; only the timing changes.
+Enabled with the STREAM_PUBLIC_PAGES setting.
+"""
+from django.http import StreamingHttpResponse
+from django.template import engines
+from django.template.context import make_context
+from django.template.loader import get_template
+from django.template.loader_tags import BlockNode, IncludeNode
+
+CONTENT_MARKER = '<!--stream:content-->'
+
+# Renders a page with its content block replaced by CONTENT_MARKER, which
+# gives the page's <head> and closing markup without touching section data
+_SHELL_SOURCE = ('{% extends stream_page %}{% block content %}' + CONTENT_MARKER + '{% endblock %}')
+_shell = None
+
+
+def _get_shell():
+    global _shell
+    if _shell is None:
+        _shell = engines['django'].from_string(_SHELL_SOURCE)
+    return _shell
+
+
+def _content_nodes(template):
+    for node in template.template.nodelist.get_nodes_by_type(BlockNode):
+        if node.name == 'content':
+            return node.nodelist
+    raise ValueError(f'{template.origin.template_name} has no content block to stream')
+
+
+def render_content_block(template, context, request=None):
+    """Yield the page's own content block, one chunk per included partial."""
+    nodes = _content_nodes(template)
+    engine_template = template.template
+    ctx = make_context(context, request, autoescape=engine_template.engine.autoescape)
+    with ctx.render_context.push_state(engine_template):
+        with ctx.bind_template(engine_template):
+            chunk = []
+            for node in nodes:
+                chunk.append(node.render_annotated(ctx))
+                if isinstance(node, IncludeNode):
+                    yield ''.join(chunk)
+                    chunk = []
+            if chunk:
+                yield ''.join(chunk)
+
+
+def stream_page(request, template_name, context, body=None):
+    """
+    Return a StreamingHttpResponse for template_name.
+
+    `context` only has to hold what the <head> needs (title/meta blocks);
+    other values may be lazy and are resolved while the body streams.
+    `body` is an optional callable returning the content block as an
+    iterable of HTML chunks; by default the page's own content block is
+    rendered with `context`.
+    """
+    template = get_template(template_name)
+
+    def chunks():
+        shell = _get_shell().render({**context, 'stream_page': template}, request)
+        head, tail = shell.split(CONTENT_MARKER, 1)
+        yield head
+        if body is None:
+            yield from render_content_block(template, context, request)
+        else:
+            yield from body()
+        yield tail
+
+    return StreamingHttpResponse(chunks(), content_type='text/html; charset=utf-8')
@@ -0,0 +1,9 @@
+"""Celery tasks (used when UPLOAD_QUEUE_BACKEND is 'celery')."""
+from myProject.celery import app
+
+from .upload_queue import process_job
+
+
+@app.task(name='myApp.process_upload_job', ignore_result=True)
+def process_upload_job(job_id):
+    process_job(job_id)
@@ -1,3 +1,773 @@
-from django.test import TestCase
+import datetime
+import gzip
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.core.management import call_command
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+import requests
+from PIL import Image, PngImagePlugin
+
+from .batch_upload import upload_batch
+from .blog_content import compile_post, sanitize_html
+from .blog_io import EXPORT_FIELDS, clean_record, import_batch
+from .conditional import home_validators
+from .image_helpers import LazySectionImages
+from .models import BlogPost, BlogPostRelation, HeroSection, MediaAsset, MediaAssetVariant, SectionImage, UploadJob
+from .pagination import keyset_paginate
+from .related_posts import compute_related_posts, update_related_posts
+from .slugs import allocate_slug, allocate_slugs, save_with_unique_slug
+from .upload_queue import MAX_ATTEMPTS, STALE_AFTER, process_batch, process_job, recover_jobs, requeue_stale_jobs
+from .utils.iceberg_utils import CircuitBreaker, CircuitOpenError, IcebergClient
+from .utils.image_compression import open_image
+from .utils.memory import memory_status, peak_rss, reset_peak_rss
+from .view_counter import flush_view_counts, pending_views, record_view
+
+
+def make_post(title, **fields):
+    fields.setdefault('slug', slugify(title))
+    fields.setdefault('excerpt', f'About {title}')
+    fields.setdefault('content', f'<p>{title}</p>')
+    return BlogPost.objects.create(title=title, **fields)
+
+
+class LastModifiedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_does_not_go_backwards_after_a_delete(self):
+        older = make_post('Older')
+        newest = make_post('Newest')
+        BlogPost.objects.filter(pk=older.pk).update(updated_date=timezone.now() - datetime.timedelta(days=2))
+        etag, last_modified = home_validators(None)
+
+        newest.delete()
+        new_etag, new_last_modified = home_validators(None)
+        self.assertNotEqual(new_etag, etag)
+        self.assertGreaterEqual(new_last_modified, last_modified)
+
+    def test_is_the_same_in_every_process(self):
+        post = make_post('Post')
+        edited = timezone.now() - datetime.timedelta(days=2)
+        BlogPost.objects.filter(pk=post.pk).update(updated_date=edited)
+        validators = home_validators(None)
+        self.assertEqual(validators[1], int(edited.timestamp()))
+
+        # A restarted worker, or one with its own cache, knows nothing more
+        cache.clear()
+        self.assertEqual(home_validators(None), validators)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_an_edit_shows_on_the_next_anonymous_hit(self):
+        HeroSection.objects.create(title='Before the edit')
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Before the edit')
+
+        # Saved by another worker: its version bump never reaches this process
+        hero = HeroSection.get_instance(cached=False)
+        hero.title = 'After the edit'
+        with mock.patch('myApp.signals.bump_content_version'):
+            hero.save()
+        edited = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(edited, 'After the edit')
+        self.assertNotEqual(edited['ETag'], response['ETag'])
+        # And it is the cached copy from now on
+        self.assertContains(self.client.get(reverse('home')), 'After the edit')
+
+
+class StaticExportTests(TestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+
+    def export(self):
+        out = StringIO()
+        call_command('export_static_site', output=self.output, stdout=out)
+        return sorted(line.split()[1] for line in out.getvalue().splitlines() if line.startswith('Rendered: blog/'))
+
+    def test_only_pages_showing_an_edited_post_are_rendered_again(self):
+        posts = [make_post(title) for title in ('Rent', 'Repairs', 'Screening', 'Leases')]
+        for post, related in zip(posts, [posts[1], posts[0], posts[3], posts[2]]):
+            BlogPostRelation.objects.create(post=post, related=related, rank=0)
+        self.assertEqual(len(self.export()), 4)
+        self.assertEqual(self.export(), [])
+
+        posts[0].title = 'Rent, edited'
+        posts[0].save()
+        # Its own page and the page listing it as related
+        self.assertEqual(self.export(), ['blog/rent/index.html', 'blog/repairs/index.html'])
+
+
+SITEMAP = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.posts = [make_post(f'Post {i}', is_published=True) for i in range(3)]
+        make_post('Draft', is_published=False)
+
+    def locations(self, url):
+        return [loc.text for loc in ElementTree.fromstring(self.client.get(url).content).iter(f'{SITEMAP}loc')]
+
+    def test_feeds_list_the_published_posts(self):
+        rss = ElementTree.fromstring(self.client.get(reverse('blog_feed_rss')).content)
+        self.assertEqual(sorted(item.findtext('title') for item in rss.iter('item')), ['Post 0', 'Post 1', 'Post 2'])
+        atom = ElementTree.fromstring(self.client.get(reverse('blog_feed_atom')).content)
+        self.assertEqual(len(atom.findall('{http://www.w3.org/2005/Atom}entry')), 3)
+
+    def test_sitemap_lists_the_pages_and_published_posts(self):
+        locations = self.locations(reverse('sitemap'))
+        self.assertEqual(len(locations), 5)
+        self.assertTrue(locations[2].endswith(reverse('blog_post_detail', args=['post-0'])))
+        self.assertFalse(any(location.endswith('/draft/') for location in locations))
+
+    @mock.patch('myApp.feeds.SITEMAP_PAGE_SIZE', 2)
+    def test_a_large_sitemap_is_split(self):
+        self.assertEqual([location.rsplit('/', 1)[1] for location in self.locations(reverse('sitemap'))],
+                         ['sitemap-1.xml', 'sitemap-2.xml'])
+        self.assertEqual(len(self.locations(reverse('sitemap_page', args=[1]))), 4)
+        self.assertEqual(len(self.locations(reverse('sitemap_page', args=[2]))), 1)
+        self.assertEqual(self.client.get(reverse('sitemap_page', args=[3])).status_code, 404)
+
+    def test_revalidation_and_gzip(self):
+        for name in ('sitemap', 'blog_feed_rss', 'blog_feed_atom'):
+            response = self.client.get(reverse(name))
+            self.assertTrue(response['ETag'].startswith('W/'))
+            self.assertEqual(self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+            gzipped = self.client.get(reverse(name), HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(gzipped.content), response.content)
+            self.assertIn('Accept-Encoding', gzipped['Vary'])
+
+        # An edit changes the ETag
+        etag = self.client.get(reverse('blog_feed_rss'))['ETag']
+        self.posts[0].title = 'Post 0, edited'
+        self.posts[0].save()
+        response = self.client.get(reverse('blog_feed_rss'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Post 0, edited')
+
+
+class BlogImportExportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        make_post('Rent in spring', is_featured=True, order=2, meta_title='Spring rents',
+                  published_date=timezone.now() - datetime.timedelta(days=30))
+        make_post('Draft: "quotes" and --- dashes', is_published=False, featured_image_url=None,
+                  content='<p>First</p>\n---\n<p>Second</p>\n')
+
+    def posts(self):
+        return list(BlogPost.objects.order_by('slug').values(*EXPORT_FIELDS))
+
+    def run_command(self, name, *args, **options):
+        out, err = StringIO(), StringIO()
+        call_command(name, *args, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_export_then_import_restores_the_posts(self):
+        for format, path in (('jsonl', os.path.join(self.directory, 'posts.jsonl')),
+                             ('markdown', os.path.join(self.directory, 'posts'))):
+            with self.subTest(format=format):
+                before = self.posts()
+                self.run_command('export_blog', path, format=format)
+                BlogPost.objects.all().delete()
+                out, _ = self.run_command('import_blog', path)
+                self.assertIn('2 created, 0 updated, 0 unchanged, 0 skipped', out)
+                self.assertEqual(self.posts(), before)
+
+    def test_importing_the_same_file_again_changes_nothing(self):
+        path = os.path.join(self.directory, 'posts.jsonl')
+        self.run_command('export_blog', path)
+        stamps = list(BlogPost.objects.order_by('pk').values_list('updated_date', flat=True))
+        out, _ = self.run_command('import_blog', path)
+        self.assertIn('0 created, 0 updated, 2 unchanged', out)
+        self.assertEqual(list(BlogPost.objects.order_by('pk').values_list('updated_date', flat=True)), stamps)
+
+    def test_malformed_records_are_skipped(self):
+        path = os.path.join(self.directory, 'posts.jsonl')
+        with open(path, 'w') as f:
+            f.write('{"title": "Good one", "slug": "good-one"}\n')
+            f.write('{"title": "Cut off\n')
+            f.write('{"slug": "no-title"}\n')
+            f.write('{"title": "Bad order", "order": "first"}\n')
+            f.write('["not", "an", "object"]\n')
+        out, err = self.run_command('import_blog', path)
+        self.assertIn('1 created, 0 updated, 0 unchanged, 4 skipped', out)
+        for line in (2, 3, 4, 5):
+            self.assertIn(f'Skipping record {line}:', err)
+        self.assertEqual(list(BlogPost.objects.filter(slug='good-one').values_list('title', flat=True)), ['Good one'])
+
+
+class LazySectionImagesTests(TestCase):
+    def test_misses_are_looked_up_once(self):
+        SectionImage.objects.create(section_name='hero_image', image_url='https://example.com/hero.jpg')
+        images = LazySectionImages()
+        with self.assertNumQueries(3):
+            for _ in range(3):
+                self.assertEqual(images['hero_image']['image_url'], 'https://example.com/hero.jpg')
+                self.assertEqual(images['about_image']['image_url'], '')
+                self.assertNotIn('no_such_section', images)
+
+
+@override_settings(VIEW_COUNT_BATCH_SIZE=1000, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        caches['view_counts'].clear()
+        self.first = make_post('First')
+        self.second = make_post('Second')
+        self.unviewed = make_post('Unviewed')
+
+    def view_counts(self):
+        return dict(BlogPost.objects.values_list('pk', 'view_count'))
+
+    def test_flush_writes_the_logged_posts(self):
+        for _ in range(3):
+            record_view(self.first)
+        record_view(self.second)
+        self.assertEqual(flush_view_counts(), 4)
+        self.assertEqual(self.view_counts(), {self.first.pk: 3, self.second.pk: 1, self.unviewed.pk: 0})
+        self.assertEqual(pending_views([self.first.pk, self.second.pk]), {})
+        # Nothing left in the log
+        self.assertEqual(flush_view_counts(), 0)
+
+        record_view(self.second)
+        self.assertEqual(flush_view_counts(), 1)
+        self.assertEqual(self.view_counts()[self.second.pk], 2)
+
+    def test_views_counted_during_a_flush_stay_logged(self):
+        record_view(self.first)
+        original_update = BlogPost.objects.filter(pk=self.first.pk).update
+
+        def count_during_flush(**kwargs):
+            # Not the first pending view, so this one isn't logged by record_view
+            record_view(self.first)
+            return original_update(**kwargs)
+
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=count_during_flush):
+            self.assertEqual(flush_view_counts(), 1)
+        self.assertEqual(flush_view_counts(), 1)
+        self.assertEqual(self.view_counts()[self.first.pk], 2)
+
+    def test_flush_errors_do_not_fail_the_view(self):
+        with override_settings(VIEW_COUNT_BATCH_SIZE=2), \
+                mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError('locked')), \
+                self.assertLogs('myApp.view_counter', 'ERROR'):
+            record_view(self.first)
+            self.assertEqual(record_view(self.first), 2)
+        self.assertEqual(flush_view_counts(), 2)
+        self.assertEqual(self.view_counts()[self.first.pk], 2)
+
+
+@override_settings(RELATED_POSTS_IN_BACKGROUND=False)
+class RelatedPostsTests(TestCase):
+    TOPICS = {
+        'Tenant screening basics': 'tenant screening credit background references',
+        'Screening tenants with pets': 'tenant screening pets deposit references',
+        'Rent pricing in spring': 'rent pricing market comparables vacancy',
+        'Raising the rent': 'rent pricing increase notice market',
+        'Fixing a leaking roof': 'roof repair contractor leak insurance',
+    }
+
+    def setUp(self):
+        self.posts = {title: make_post(title, content=f'<p>{words}</p>') for title, words in self.TOPICS.items()}
+        update_related_posts()
+
+    def stored(self):
+        lists = {}
+        for post_id, related_id in BlogPostRelation.objects.order_by('post', 'rank').values_list('post', 'related'):
+            lists.setdefault(post_id, []).append(related_id)
+        return lists
+
+    def expected(self):
+        return {pk: [related_id for related_id, _ in chosen] for pk, chosen in compute_related_posts().items()}
+
+    def test_similar_posts_are_related(self):
+        screening = self.posts['Tenant screening basics']
+        self.assertEqual(self.stored()[screening.pk][0], self.posts['Screening tenants with pets'].pk)
+        self.assertEqual(self.stored(), self.expected())
+
+    def test_save_updates_the_affected_lists(self):
+        roof = self.posts['Fixing a leaking roof']
+        roof.title = 'Roof repairs before raising the rent'
+        roof.content = '<p>rent pricing increase roof repair market</p>'
+        with self.captureOnCommitCallbacks(execute=True):
+            roof.save()
+        self.assertEqual(self.stored(), self.expected())
+
+    def test_delete_fills_the_lists_that_lost_a_post(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts['Raising the rent'].delete()
+        self.assertEqual(self.stored(), self.expected())
+        self.assertTrue(all(len(related) == 3 for related in self.stored().values()))
+
+    def test_fixture_loads_schedule_nothing(self):
+        fixture = serializers.serialize('json', [make_post('Loaded from a fixture')])
+        BlogPost.objects.filter(slug='loaded-from-a-fixture').delete()
+        with mock.patch('myApp.signals.schedule_update') as schedule, \
+                mock.patch('myApp.signals.index_post') as index, self.captureOnCommitCallbacks(execute=True):
+            for obj in serializers.deserialize('json', fixture):
+                obj.save()
+        schedule.assert_not_called()
+        index.assert_not_called()
+
+
+class BlogSearchTests(TestCase):
+    def setUp(self):
+        make_post('Tenant screening basics')
+
+    def test_pages_past_the_end_are_not_found(self):
+        url = reverse('blog_search')
+        self.assertContains(self.client.get(url, {'q': 'tenant'}), 'Tenant screening basics')
+        self.assertEqual(self.client.get(url, {'q': 'tenant', 'page': 2}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'q': 'tenant', 'page': 10 ** 30}).status_code, 404)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        for i in range(7):
+            post = make_post(f'Post {i}', is_published=i % 3 != 0)
+            # Two posts per timestamp, so the id breaks ties
+            BlogPost.objects.filter(pk=post.pk).update(published_date=now - datetime.timedelta(days=i // 2))
+        self.newest_first = list(BlogPost.objects.order_by('-published_date', '-id').values_list('pk', flat=True))
+
+    def test_pages_walk_every_post_once_both_ways(self):
+        pages, cursor = [], None
+        while True:
+            page = keyset_paginate(BlogPost.objects.all(), 3, after=cursor)
+            pages.append(page)
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+        self.assertEqual([post.pk for page in pages for post in page.items], self.newest_first)
+        self.assertIsNone(pages[0].previous_cursor)
+
+        back = keyset_paginate(BlogPost.objects.all(), 3, before=pages[-1].previous_cursor)
+        self.assertEqual(back.items, pages[-2].items)
+
+    def test_malformed_cursor_gives_the_first_page(self):
+        page = keyset_paginate(BlogPost.objects.all(), 3, after='not a cursor')
+        self.assertEqual([post.pk for post in page.items], self.newest_first[:3])
+
+    def test_dashboard_filters_every_page(self):
+        self.client.force_login(get_user_model().objects.create_user('editor', password='editor'))
+        drafts = [pk for pk in self.newest_first if not BlogPost.objects.get(pk=pk).is_published]
+        seen, url = [], f"{reverse('dashboard:blog_edit')}?status=draft&q=post"
+        with mock.patch('myApp.dashboard_views.DASHBOARD_POSTS_PER_PAGE', 1):
+            while url:
+                response = self.client.get(url)
+                seen += [post.pk for post in response.context['blog_posts']]
+                next_cursor = response.context['next_cursor']
+                url = next_cursor and f"{reverse('dashboard:blog_edit')}?after={next_cursor}&{response.context['filter_params']}"
+        self.assertEqual(seen, drafts)
+        response = self.client.get(reverse('dashboard:blog_edit'), {'q': 'Post 4'})
+        self.assertEqual([post.title for post in response.context['blog_posts']], ['Post 4'])
+
+
+class SanitizerTests(TestCase):
+    def test_unclosed_dropped_element_at_the_end(self):
+        self.assertEqual(compile_post('<p>intro<iframe src="x">')['content_html'], '<p>intro</p>')
+        self.assertEqual(sanitize_html('<div><p>a<script>alert(1)</p>')[0], '<div><p>a</p></div>')
+
+    def test_dangerous_markup_is_removed(self):
+        content_html, text, _ = sanitize_html(
+            '<p onclick="steal()">Hi <a href="javascript:alert(1)">there</a>'
+            '<style>p {}</style><blink>!</blink></p><img src="/a.png" onerror="x()">'
+        )
+        self.assertNotIn('onclick', content_html)
+        self.assertNotIn('javascript:', content_html)
+        self.assertNotIn('p {}', content_html)
+        self.assertNotIn('onerror', content_html)
+        self.assertNotIn('<blink>', content_html)
+        self.assertEqual(text, 'Hi there!')
+
+    def test_video_embeds_are_kept(self):
+        youtube = ('<iframe src="https://www.youtube.com/embed/abc" width="560" allowfullscreen onload="x()">'
+                   'Your browser <b>cannot</b> play this</iframe><p>After</p>')
+        self.assertEqual(sanitize_html(youtube)[0],
+                         '<iframe src="https://www.youtube.com/embed/abc" width="560" allowfullscreen loading="lazy">'
+                         '</iframe><p>After</p>')
+        self.assertIn('player.vimeo.com', sanitize_html('<iframe src="https://player.vimeo.com/video/1"/>')[0])
+        for src in ('https://evil.example.com/embed', 'http://www.youtube.com/embed/abc',
+                    'javascript:alert(1)', 'https://www.youtube.com.evil.example/embed'):
+            self.assertEqual(sanitize_html(f'<iframe src="{src}"></iframe><p>After</p>')[0], '<p>After</p>')
+
+    def test_recompiling_reports_and_dates_changed_posts(self):
+        video = make_post('Video', content='<iframe src="https://www.youtube.com/embed/abc"></iframe><p>Tour</p>')
+        make_post('Text')
+        # As compiled before embeds were kept
+        BlogPost.objects.filter(pk=video.pk).update(content_html='<p>Tour</p>')
+        before = BlogPost.objects.get(pk=video.pk).updated_date
+
+        out = StringIO()
+        call_command('compile_blog_posts', all=True, stdout=out)
+        self.assertIn('Changed: video\n', out.getvalue())
+        self.assertIn('2 blog post(s) compiled, 1 changed.', out.getvalue())
+        video.refresh_from_db()
+        self.assertIn('<iframe', video.content_html)
+        self.assertGreater(video.updated_date, before)
+
+    def test_headings_make_the_table_of_contents(self):
+        compiled = compile_post('<h2>Screening tenants</h2><p>Text</p><h3>Credit checks</h3>')
+        self.assertEqual([(entry['level'], entry['title']) for entry in compiled['toc']],
+                         [(2, 'Screening tenants'), (3, 'Credit checks')])
+        self.assertIn(f'id="{compiled["toc"][0]["id"]}"', compiled['content_html'])
+
+    def test_plain_text_posts_get_paragraphs(self):
+        compiled = compile_post('First line\n\nSecond <b>para</b>')
+        self.assertEqual(compiled['content_html'].count('<p>'), 2)
+        self.assertEqual(compiled['word_count'], 4)
+
+
+class SlugTests(TestCase):
+    def test_taken_slugs_get_the_next_free_suffix(self):
+        make_post('Rent', slug='rent')
+        make_post('Rent 3', slug='rent-3')
+        make_post('Rental tips', slug='rental-tips')
+        self.assertEqual(allocate_slug('Rent'), 'rent-2')
+        self.assertEqual(allocate_slug('Rental tips!'), 'rental-tips-2')
+        self.assertEqual(allocate_slug('New title'), 'new-title')
+        self.assertEqual(allocate_slug('!!!'), 'post')
+
+    def test_a_post_keeps_its_own_slug(self):
+        post = make_post('Rent', slug='rent')
+        self.assertEqual(allocate_slug('Rent', exclude_pk=post.pk), 'rent')
+
+    def test_batches_are_unique_among_themselves(self):
+        make_post('Rent', slug='rent')
+        self.assertEqual(allocate_slugs(['Rent', 'Rent', 'Repairs'], reserved={'repairs'}),
+                         ['rent-2', 'rent-3', 'repairs-2'])
+
+    def test_long_titles_stay_within_the_column(self):
+        title = 'word ' * 100
+        make_post('Long', slug=allocate_slug(title))
+        slug = allocate_slug(title)
+        self.assertTrue(slug.endswith('-2'))
+        self.assertLessEqual(len(slug), BlogPost._meta.get_field('slug').max_length)
+
+    def test_save_retries_when_the_slug_was_taken_meanwhile(self):
+        make_post('Rent', slug='rent')
+        post = BlogPost(title='Rent', excerpt='x', content='<p>x</p>')
+        # The first pick is stale, as if another request saved "rent-2" after it
+        with mock.patch('myApp.slugs.allocate_slug', side_effect=['rent', 'rent-2']):
+            save_with_unique_slug(post, 'Rent')
+        self.assertEqual(post.slug, 'rent-2')
+
+    def test_reserved_slugs_are_never_handed_out(self):
+        self.assertEqual(allocate_slug('Search'), 'search-2')
+        self.assertEqual(allocate_slugs(['Search', 'Search']), ['search-2', 'search-3'])
+        post = save_with_unique_slug(BlogPost(title='Search', excerpt='x', content='<p>x</p>'), 'Search')
+        self.assertEqual(post.slug, 'search-2')
+        self.assertEqual(self.client.get(reverse('blog_post_detail', args=[post.slug])).status_code, 200)
+
+        created, _, _ = import_batch([clean_record({'slug': 'search', 'title': 'Search'})])
+        self.assertEqual([post.slug for post in created], ['search-3'])
+
+
+class UploadQueueRootMixin:
+    """Keeps queued files in a temporary UPLOAD_QUEUE_ROOT, removed after the class."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(shutil.rmtree, settings.UPLOAD_QUEUE_ROOT, ignore_errors=True)
+
+
+def make_asset(name, **fields):
+    url = f'https://cdn.example.com/{name}.webp'
+    fields.setdefault('folder', 'garden_gate')
+    return MediaAsset.objects.create(url=url, secure_url=url, public_id=f'{name}.webp', filename=f'{name}.jpg', **fields)
+
+
+class MediaVariantTests(TestCase):
+    def test_iceberg_assets_use_their_variants(self):
+        asset = make_asset('photo', width=1600, height=1200)
+        self.assertEqual((asset.thumb_url, asset.srcset), (asset.secure_url, ''))
+
+        for width in (1280, 320, 640):
+            MediaAssetVariant.objects.create(asset=asset, width=width, height=width * 3 // 4,
+                                             url=f'https://cdn.example.com/photo-{width}w.webp',
+                                             public_id=f'photo-{width}w.webp')
+        asset = MediaAsset.objects.prefetch_related('variants').get(pk=asset.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(asset.thumb_url, 'https://cdn.example.com/photo-640w.webp')
+            self.assertEqual(asset.variant_url(1000), 'https://cdn.example.com/photo-1280w.webp')
+            self.assertEqual(asset.variant_url(1920), asset.secure_url)
+            self.assertEqual(asset.srcset, ', '.join([
+                'https://cdn.example.com/photo-320w.webp 320w', 'https://cdn.example.com/photo-640w.webp 640w',
+                'https://cdn.example.com/photo-1280w.webp 1280w', f'{asset.secure_url} 1600w',
+            ]))
+
+    def test_cloudinary_assets_are_resized_by_cloudinary(self):
+        url = 'https://res.cloudinary.com/demo/image/upload/v1/garden/photo.jpg'
+        asset = MediaAsset.objects.create(url=url, secure_url=url, public_id='garden/photo')
+        transformed = 'https://res.cloudinary.com/demo/image/upload/f_webp,q_80,w_{}/v1/garden/photo.jpg'
+        self.assertEqual(asset.thumb_url, transformed.format(400))
+        self.assertEqual(asset.srcset, ', '.join(f'{transformed.format(width)} {width}w'
+                                                 for width in MediaAsset.CLOUDINARY_WIDTHS))
+
+    @mock.patch('myApp.management.commands.generate_media_variants.is_configured', lambda: True)
+    def test_variants_are_only_generated_where_they_can_exist(self):
+        pending = make_asset('pending')
+        make_asset('narrow', width=300, height=200)
+        done = make_asset('done', width=1600, height=1200)
+        MediaAssetVariant.objects.create(asset=done, width=320, height=240, url=done.url, public_id='done-320w')
+        url = 'https://res.cloudinary.com/demo/image/upload/v1/legacy.jpg'
+        MediaAsset.objects.create(url=url, secure_url=url, public_id='legacy')
+
+        with mock.patch('myApp.management.commands.generate_media_variants.add_variants', return_value=3) as add:
+            call_command('generate_media_variants', stdout=StringIO())
+        self.assertEqual([call.args[0].pk for call in add.call_args_list], [pending.pk])
+
+
+@override_settings(UPLOAD_QUEUE_ROOT=tempfile.mkdtemp())
+class UploadQueueTests(UploadQueueRootMixin, TestCase):
+    def make_job(self, **fields):
+        job = UploadJob(filename='photo.jpg', **fields)
+        job.file.save('photo.jpg', ContentFile(b'raw bytes'), save=False)
+        job.save()
+        return job
+
+    def test_a_job_is_claimed_once(self):
+        job = self.make_job()
+        asset = make_asset('photo')
+        with mock.patch('myApp.upload_queue.upload_unless_duplicate', return_value=(asset, True)) as upload:
+            done = process_job(job.pk)
+            self.assertIsNone(process_job(job.pk))
+        self.assertEqual(upload.call_count, 1)
+        self.assertEqual((done.status, done.media_asset, done.attempts), (UploadJob.DONE, asset, 1))
+        # The raw file is gone once the job is done
+        self.assertFalse(done.file)
+
+    def test_failures_are_recorded(self):
+        job = self.make_job()
+        with mock.patch('myApp.upload_queue.upload_unless_duplicate', side_effect=OSError('R2 is down')), \
+                self.assertLogs('myApp.upload_queue', 'ERROR'):
+            failed = process_job(job.pk)
+        self.assertEqual((failed.status, failed.error), (UploadJob.FAILED, 'OSError: R2 is down'))
+        self.assertTrue(failed.file)
+
+    def test_stale_jobs_are_requeued_until_they_run_out_of_attempts(self):
+        long_ago = timezone.now() - STALE_AFTER - datetime.timedelta(minutes=1)
+        stale = self.make_job(status=UploadJob.RUNNING, started_at=long_ago, attempts=1)
+        exhausted = self.make_job(status=UploadJob.RUNNING, started_at=long_ago, attempts=MAX_ATTEMPTS)
+        running = self.make_job(status=UploadJob.RUNNING, started_at=timezone.now(), attempts=1)
+        self.assertEqual(requeue_stale_jobs(STALE_AFTER), 1)
+        statuses = dict(UploadJob.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {stale.pk: UploadJob.QUEUED, exhausted.pk: UploadJob.FAILED,
+                                    running.pk: UploadJob.RUNNING})
+
+    def test_recovery_dispatches_interrupted_and_queued_jobs(self):
+        long_ago = timezone.now() - STALE_AFTER - datetime.timedelta(minutes=1)
+        interrupted = self.make_job(status=UploadJob.RUNNING, started_at=long_ago, attempts=1)
+        queued = self.make_job()
+        with mock.patch('myApp.upload_queue.dispatch') as dispatch:
+            self.assertEqual(recover_jobs(), (1, 2))
+        self.assertEqual(sorted(call.args[0] for call in dispatch.call_args_list), sorted([interrupted.pk, queued.pk]))
+
+
+class FlakyIcebergHandler(BaseHTTPRequestHandler):
+    """Stands in for Iceberg: answers with the next of the server's scripted replies."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        reply = self.server.replies.pop(0)
+        if reply == 'broken-chunks':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write(b'zz\r\nnot a chunk\r\n')
+            self.close_connection = True
+            return
+        body = b'{}'
+        self.send_response(reply)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyIcebergHandler)
+        self.server.replies = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        self.client = IcebergClient('token', api_base=f'http://127.0.0.1:{self.server.server_address[1]}',
+                                    max_attempts=1, breaker=self.breaker)
+
+    def call(self):
+        return self.client._request('init-upload', 'POST', f'{self.client.api_base}/assets/init-upload',
+                                    idempotent=False, json={})
+
+    def open_breaker(self):
+        self.server.replies += [500, 500]
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                self.call()
+        with self.assertRaises(CircuitOpenError):
+            self.call()
+        # Skip the wait: the next call is the half-open trial
+        self.breaker.opened_at -= self.breaker.reset_timeout
+
+    def test_opens_and_closes_after_a_good_trial(self):
+        self.open_breaker()
+        self.server.replies.append(200)
+        self.assertEqual(self.call().status_code, 200)
+        self.assertIsNone(self.breaker.opened_at)
+
+    def test_a_broken_trial_reopens_it(self):
+        self.open_breaker()
+        self.server.replies.append('broken-chunks')
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            self.call()
+        self.assertFalse(self.breaker.trial_running)
+        with self.assertRaises(CircuitOpenError):
+            self.call()
+
+    def test_an_interrupted_trial_lets_the_next_one_through(self):
+        self.open_breaker()
+        with mock.patch.object(requests.Session, 'request', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.call()
+        self.server.replies.append(200)
+        self.assertEqual(self.call().status_code, 200)
+
+
+def photo(name, color):
+    data = BytesIO()
+    Image.new('RGB', (64, 48), color).save(data, 'JPEG')
+    return SimpleUploadedFile(name, data.getvalue(), 'image/jpeg')
+
+
+_uploads = itertools.count()
+
+
+def fake_upload_with_variants(body, variants, filename, folder):
+    """Stands in for the Iceberg round trips of upload_with_variants()."""
+    key = f'{folder}/{next(_uploads)}-{filename}'
+    result = {'url': f'https://cdn.example.com/{key}', 'secure_url': f'https://cdn.example.com/{key}',
+              'public_id': key, 'bytes': len(body.getbuffer())}
+    return result, [(width, height, {'secure_url': f'{result["secure_url"]}?w={width}', 'public_id': f'{key}-{width}',
+                                     'bytes': len(data.getbuffer())}) for width, height, data in variants]
+
+
+@override_settings(UPLOAD_QUEUE_BACKEND='sync', UPLOAD_QUEUE_ROOT=tempfile.mkdtemp())
+@mock.patch('myApp.batch_upload.upload_with_variants', fake_upload_with_variants)
+@mock.patch('myApp.dashboard_views.iceberg_configured', lambda: True)
+class BatchUploadTests(UploadQueueRootMixin, TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('editor', password='editor'))
+
+    def upload(self, files, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('dashboard:upload_images'), {'images': files, **data})
+        return response
+
+    def test_files_are_queued_and_processed_as_one_batch(self):
+        with self.assertLogs('myApp.batch_upload', 'WARNING'):
+            response = self.upload([photo('red.jpg', 'red'), photo('blue.jpg', 'blue'), photo('again.jpg', 'red'),
+                                    SimpleUploadedFile('broken.jpg', b'not an image', 'image/jpeg')])
+        self.assertEqual(response.status_code, 202)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], [UploadJob.QUEUED] * 4)
+
+        jobs = [UploadJob.objects.get(pk=result['job_id']) for result in results]
+        self.assertEqual([job.status for job in jobs], [UploadJob.DONE] * 3 + [UploadJob.FAILED])
+        # The repeated photo got the asset of its first copy
+        self.assertEqual(jobs[2].media_asset, jobs[0].media_asset)
+        self.assertEqual(MediaAsset.objects.count(), 2)
+
+        # Uploaded again: answered right away, nothing queued
+        response = self.upload([photo('red.jpg', 'red')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['id'], jobs[0].media_asset.pk)
+        self.assertTrue(response.json()['results'][0]['duplicate'])
+
+    def test_duplicates_are_only_reused_within_a_folder(self):
+        self.upload([photo('red.jpg', 'red')], folder='garden', alt_text='A red wall')
+        response = self.upload([photo('red.jpg', 'red')], folder='events')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(sorted(MediaAsset.objects.values_list('folder', flat=True)), ['events', 'garden'])
+
+        result = self.upload([photo('red.jpg', 'red')], folder='garden', alt_text='Something else').json()['results'][0]
+        self.assertTrue(result['duplicate'])
+        self.assertEqual(result['alt_text'], 'A red wall')
+
+    def test_same_pixels_in_another_file_reuse_the_asset(self):
+        def png(name, **text):
+            info = PngImagePlugin.PngInfo()
+            for key, value in text.items():
+                info.add_text(key, value)
+            data = BytesIO()
+            Image.new('RGB', (64, 48), 'green').save(data, 'PNG', pnginfo=info)
+            return SimpleUploadedFile(name, data.getvalue(), 'image/png')
+
+        first, again, edited = upload_batch([png('a.png'), png('b.png'), png('c.png', Comment='edited')], folder='garden')
+        self.assertFalse(first['duplicate'])
+        self.assertEqual((again['asset'], again['duplicate']), (first['asset'], True))
+        self.assertEqual((edited['asset'], edited['duplicate']), (first['asset'], True))
+        self.assertEqual(MediaAsset.objects.count(), 1)
+
+        # A later batch finds it by its compressed bytes
+        with mock.patch('myApp.batch_upload.upload_with_variants') as upload:
+            result, = upload_batch([png('d.png', Comment='again')], folder='garden')
+        upload.assert_not_called()
+        self.assertEqual(result['asset'], first['asset'])
+        self.assertTrue(result['duplicate'])
+
+    def test_a_failing_batch_fails_its_jobs(self):
+        with mock.patch('myApp.upload_queue.upload_batch', side_effect=RuntimeError('pool gone')), \
+                self.assertLogs('myApp.upload_queue', 'ERROR'):
+            results = self.upload([photo('red.jpg', 'red')]).json()['results']
+        job = UploadJob.objects.get(pk=results[0]['job_id'])
+        self.assertEqual((job.status, job.error), (UploadJob.FAILED, 'RuntimeError: pool gone'))
+        # Claimed jobs are not processed twice
+        self.assertEqual(process_batch([job.pk]), [])
+
+
+class OpenImageMemoryTests(SimpleTestCase):
+    def test_a_large_photo_is_never_decoded_at_full_size(self):
+        if memory_status('VmHWM') is None:
+            self.skipTest('needs /proc/self/status')
+        width, height = 6000, 4000
+        data = BytesIO()
+        Image.linear_gradient('L').resize((width, height)).convert('RGB').save(data, 'JPEG', quality=90)
+
+        reset_peak_rss()
+        before = memory_status('VmRSS')
+        img = open_image(BytesIO(data.getvalue()), max_pixels=1_000_000)
+        grown = peak_rss() - before
+
+        self.assertLessEqual(img.width * img.height, 1_000_000)
+        self.assertEqual(img.mode, 'RGB')
+        # A full decode alone would take width * height * 3 bytes (72MB)
+        self.assertLess(grown, width * height * 3 / 4)
@@ -0,0 +1,301 @@
+"""
+Background processing of gallery uploads.
+
+upload_image and upload_images only store the raw files as UploadJobs and
+return the jobs; the WebP compression and the Iceberg round trips
+(init-upload, PUT, complete) run in a worker, and the dashboard polls
+upload_job_status until the jobs are done or failed. The jobs of one
+upload_images request are processed together (process_batch), encoding in
+parallel through batch_upload.py. Where the work runs is the
+UPLOAD_QUEUE_BACKEND setting:
+
+  - thread: a small thread pool in the web process (the default),
+  - database: nothing is dispatched, `manage.py process_upload_jobs` polls
+    the table,
+  - celery: a Celery task (tasks.py),
+  - sync: inline, before the response (tests, local debugging).
+
+Workers claim a job with a conditional UPDATE, so it runs once even when a
+thread and process_upload_jobs both see it. Jobs left queued or running by
+a web process that died are picked up by process_upload_jobs, and with the
+thread backend by every web process itself: wsgi.py/asgi.py call
+start_recovery(), which requeues and dispatches them at startup and every
+RECOVERY_INTERVAL seconds after.
+"""
+import datetime
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .batch_upload import upload_batch
+from .media_dedup import upload_unless_duplicate
+from .models import UploadJob
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('thread', 'database', 'celery', 'sync')
+# A job that keeps getting interrupted (e.g. crashing its worker) stops being retried
+MAX_ATTEMPTS = 3
+# Running this long means the worker died (an upload takes seconds to minutes)
+STALE_AFTER = datetime.timedelta(minutes=15)
+# Seconds between two recover_jobs() runs of a web process (thread backend)
+RECOVERY_INTERVAL = 5 * 60
+
+_pool = None
+_pool_lock = threading.Lock()
+_recovery_thread = None
+
+
+def _thread_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.UPLOAD_QUEUE_WORKERS, thread_name_prefix='upload-job')
+    return _pool
+
+
+def _process_in_thread(job_id):
+    try:
+        process_job(job_id)
+    finally:
+        # Pool threads outlive the job; don't leave their connections open
+        connections.close_all()
+
+
+def _process_batch_in_thread(job_ids):
+    try:
+        process_batch(job_ids)
+    except Exception:
+        logger.exception('Upload batch %s failed', job_ids)
+    finally:
+        connections.close_all()
+
+
+def dispatch(job_id):
+    """Hand a queued job to the configured backend."""
+    backend = settings.UPLOAD_QUEUE_BACKEND
+    if backend == 'thread':
+        _thread_pool().submit(_process_in_thread, job_id)
+    elif backend == 'celery':
+        from .tasks import process_upload_job
+        process_upload_job.delay(job_id)
+    elif backend == 'sync':
+        process_job(job_id)
+    elif backend != 'database':
+        raise ImproperlyConfigured(f'UPLOAD_QUEUE_BACKEND must be one of {", ".join(BACKENDS)}, not {backend!r}')
+
+
+def dispatch_batch(job_ids):
+    """Hand queued jobs to the configured backend, to be processed together where it can."""
+    backend = settings.UPLOAD_QUEUE_BACKEND
+    if backend == 'thread':
+        _thread_pool().submit(_process_batch_in_thread, job_ids)
+    elif backend == 'sync':
+        process_batch(job_ids)
+    else:
+        for job_id in job_ids:
+            dispatch(job_id)
+
+
+def _store(image_file, folder, alt_text):
+    job = UploadJob(filename=image_file.name[:200], folder=folder, alt_text=alt_text[:200])
+    job.file.save(image_file.name, image_file, save=False)
+    job.save()
+    return job
+
+
+def enqueue_upload(image_file, folder='garden_gate', alt_text=''):
+    """Store an uploaded file as a queued UploadJob and dispatch it once committed."""
+    job = _store(image_file, folder, alt_text)
+    transaction.on_commit(lambda: dispatch(job.pk))
+    return job
+
+
+def enqueue_uploads(files, folder='garden_gate', alt_text=''):
+    """Store uploaded files as queued UploadJobs, dispatched together once committed."""
+    jobs = [_store(image_file, folder, alt_text) for image_file in files]
+    job_ids = [job.pk for job in jobs]
+    transaction.on_commit(lambda: dispatch_batch(job_ids))
+    return jobs
+
+
+def _claim(job_id):
+    return UploadJob.objects.filter(pk=job_id, status=UploadJob.QUEUED).update(
+        status=UploadJob.RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1,
+    )
+
+
+def _fail(job, error):
+    job.status = UploadJob.FAILED
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+
+
+def _finish(job, asset):
+    # The raw file is only kept for retrying failures
+    job.file.delete(save=False)
+    job.status = UploadJob.DONE
+    job.error = ''
+    job.media_asset = asset
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'error', 'media_asset', 'finished_at'])
+
+
+def process_job(job_id):
+    """
+    Compress and upload a queued job, creating its MediaAsset (or pointing
+    it at the existing asset for the same image). Returns the job, or None
+    when it wasn't queued (another worker has it, or it's done).
+    """
+    if not _claim(job_id):
+        return None
+    job = UploadJob.objects.get(pk=job_id)
+
+    try:
+        with _open(job) as image_file:
+            asset, _ = upload_unless_duplicate(image_file, folder=job.folder, alt_text=job.alt_text)
+    except Exception as e:
+        logger.exception('Upload job %s failed', job.pk)
+        _fail(job, f'{type(e).__name__}: {e}')
+        return job
+    _finish(job, asset)
+    return job
+
+
+def _open(job):
+    image_file = job.file.storage.open(job.file.name, 'rb')
+    # The uploaded object is named after the file
+    image_file.name = job.filename or job.file.name
+    return image_file
+
+
+def process_batch(job_ids):
+    """
+    Claim the queued jobs among job_ids and compress and upload them
+    together (upload_batch: parallel encodes). A batch that fails as a whole
+    fails its jobs, not the caller. Returns the jobs claimed.
+    """
+    jobs = list(UploadJob.objects.filter(pk__in=[job_id for job_id in job_ids if _claim(job_id)]).order_by('pk'))
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job.folder, job.alt_text), []).append(job)
+    for (folder, alt_text), group in groups.items():
+        try:
+            with ExitStack() as files:
+                results = upload_batch([files.enter_context(_open(job)) for job in group],
+                                       folder=folder, alt_text=alt_text)
+        except Exception as e:
+            logger.exception('Upload batch %s failed', [job.pk for job in group])
+            results = [{'asset': None, 'error': f'{type(e).__name__}: {e}'}] * len(group)
+        for job, result in zip(group, results):
+            if result['asset'] is None:
+                _fail(job, result['error'])
+            else:
+                _finish(job, result['asset'])
+    return jobs
+
+
+def requeue_stale_jobs(older_than):
+    """
+    Put jobs stuck running for longer than older_than (a timedelta) back in
+    the queue, or fail them after MAX_ATTEMPTS. Returns how many were requeued.
+    """
+    stale = UploadJob.objects.filter(status=UploadJob.RUNNING, started_at__lt=timezone.now() - older_than)
+    stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=UploadJob.FAILED, error='Interrupted too many times', finished_at=timezone.now(),
+    )
+    return stale.update(status=UploadJob.QUEUED)
+
+
+def retry_failed_jobs():
+    """Requeue failed jobs that still have their file. Returns how many."""
+    return UploadJob.objects.filter(status=UploadJob.FAILED).exclude(file='').update(
+        status=UploadJob.QUEUED, error='', attempts=0, finished_at=None,
+    )
+
+
+def job_status(job):
+    """JSON-ready state of a job, with the asset's URLs once it is done."""
+    data = {
+        'job_id': job.pk,
+        'status': job.status,
+        'success': job.status == UploadJob.DONE,
+        'filename': job.filename,
+    }
+    if job.status == UploadJob.FAILED:
+        data['error'] = job.error
+    asset = job.media_asset
+    if job.status == UploadJob.DONE and asset is not None:
+        data.update(asset_result(asset))
+    return data
+
+
+def asset_result(asset):
+    """The URLs and alt text of an uploaded asset, as returned by the upload endpoints."""
+    return {
+        'id': asset.id,
+        'alt_text': asset.alt_text,
+        'url': asset.secure_url,
+        'web_url': asset.secure_url,
+        'thumb_url': asset.thumb_url,
+        'srcset': asset.srcset,
+        'public_id': asset.public_id,
+    }
+
+
+def queued_job_ids(limit):
+    return list(
+        UploadJob.objects.filter(status=UploadJob.QUEUED).order_by('created_at').values_list('pk', flat=True)[:limit]
+    )
+
+
+def recover_jobs():
+    """
+    Requeue jobs stuck running (see requeue_stale_jobs) and dispatch every
+    queued job. Jobs another worker already has are skipped by its claim.
+    Returns (requeued, dispatched).
+    """
+    requeued = requeue_stale_jobs(STALE_AFTER)
+    job_ids = queued_job_ids(limit=None)
+    for job_id in job_ids:
+        dispatch(job_id)
+    return requeued, len(job_ids)
+
+
+def _recover_periodically():
+    while True:
+        try:
+            requeued, dispatched = recover_jobs()
+            if requeued or dispatched:
+                logger.info('Upload jobs: %s interrupted requeued, %s queued dispatched', requeued, dispatched)
+        except Exception:
+            logger.exception('Could not recover upload jobs')
+        finally:
+            connections.close_all()
+        time.sleep(RECOVERY_INTERVAL)
+
+
+def start_recovery():
+    """
+    With the thread backend, run recover_jobs() in a daemon thread now and
+    every RECOVERY_INTERVAL seconds, so jobs interrupted by a restart or a
+    crash finish without a separate worker. Called by the WSGI/ASGI entry
+    points only, not by management commands.
+    """
+    global _recovery_thread
+    if settings.UPLOAD_QUEUE_BACKEND != 'thread':
+        return
+    with _pool_lock:
+        if _recovery_thread is not None:
+            return
+        _recovery_thread = threading.Thread(target=_recover_periodically, name='upload-job-recovery', daemon=True)
+    _recovery_thread.start()
@@ -1,90 +1,10 @@
 import cloudinary
 import cloudinary.uploader
-from io import BytesIO
 from PIL import Image
 import os
 
-# Smart compression function - converts to WebP
-def smart_compress_to_bytes(image_file, max_bytes=10 * 1024 * 1024, target_bytes=None):
-    """
-    Compress image to target size while maintaining quality.
-    Converts image to WebP format before upload.
-    Returns BytesIO object with compressed WebP image.
-    """
-    if target_bytes is None:
-        target_bytes = int(max_bytes * 0.93)  # 93% of max
-    
-    # Open image
-    img = Image.open(image_file)
-    
-    # Preserve transparency - convert to RGBA if image has transparency
-    # WebP supports transparency, so we keep RGBA mode
-    if img.mode == 'P':
-        # Palette mode - check if it has transparency
-        if 'transparency' in img.info:
-            img = img.convert('RGBA')
-        else:
-            img = img.convert('RGB')
-    elif img.mode == 'LA':
-        # Grayscale with alpha
-        img = img.convert('RGBA')
-    elif img.mode not in ('RGB', 'RGBA'):
-        # For other modes, try to preserve transparency if possible
-        if hasattr(img, 'mode') and 'A' in img.mode or img.mode in ('RGBA', 'LA'):
-            img = img.convert('RGBA')
-        else:
-            img = img.convert('RGB')
-    
-    # Get current size with WebP
-    output = BytesIO()
-    # Save as WebP with high quality first, preserving transparency
-    save_kwargs = {'format': 'WEBP', 'quality': 95, 'method': 6}
-    if img.mode == 'RGBA':
-        # Ensure lossless transparency is preserved
-        save_kwargs['lossless'] = False  # Use lossy but preserve alpha
-    img.save(output, **save_kwargs)
-    current_size = output.tell()
-    
-    # If already under target, return
-    if current_size <= target_bytes:
-        output.seek(0)
-        return output
-    
-    # Binary search for quality
-    min_quality = 10
-    max_quality = 95
-    best_output = None
-    
-    while min_quality <= max_quality:
-        quality = (min_quality + max_quality) // 2
-        output = BytesIO()
-        save_kwargs = {'format': 'WEBP', 'quality': quality, 'method': 6}
-        if img.mode == 'RGBA':
-            save_kwargs['lossless'] = False  # Preserve alpha channel
-        img.save(output, **save_kwargs)
-        size = output.tell()
-        
-        if size <= target_bytes:
-            best_output = output
-            min_quality = quality + 1
-        else:
-            max_quality = quality - 1
-    
-    if best_output:
-        best_output.seek(0)
-        return best_output
-    
-    # If still too large, resize
-    output = BytesIO()
-    scale = (target_bytes / current_size) ** 0.5
-    new_size = (int(img.width * scale), int(img.height * scale))
-    img_resized = img.resize(new_size, Image.Resampling.LANCZOS)
-    save_kwargs = {'format': 'WEBP', 'quality': 85, 'method': 6}
-    if img_resized.mode == 'RGBA':
-        save_kwargs['lossless'] = False  # Preserve alpha channel
-    img_resized.save(output, **save_kwargs)
-    output.seek(0)
-    return output
+from .image_compression import smart_compress_to_bytes
+
 
 def upload_to_cloudinary(image_file, folder='garden_gate', public_id=None):
     """
@@ -12,77 +12,234 @@ Configuration (.env):
   ICEBERG_CDN_BASE   - optional fallback used to build the public URL when the
                        API response doesn't include one,
                        e.g. https://cdn.katalyst-crm.com/t1
+
+The calls go through one IcebergClient per process (get_client()): its
+sessions keep connections to the API and to R2 alive between uploads, each
+step has its own connect/read timeouts, transient failures are retried
+with jittered backoff where repeating the step is safe, and a circuit
+breaker fails uploads fast while Iceberg is down instead of letting each
+one wait out its timeouts.
 """
 import os
+import random
+import threading
+import time
 import uuid
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from PIL import Image
+from requests.adapters import HTTPAdapter
+
+from .image_compression import smart_compress_to_bytes
 
 DEFAULT_API_BASE = 'https://dashboard.katalyst-crm.com'
 DEFAULT_CDN_BASE = 'https://cdn.katalyst-crm.com'
 
+CONNECT_TIMEOUT = 5
+# Seconds to wait for each step's response (the PUT carries the image)
+READ_TIMEOUTS = {'init-upload': 30, 'put': 120, 'complete': 30}
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+# Worth retrying: overloaded, or a gateway/transient server error
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# ...and of those, the ones that mean the request wasn't processed
+NOT_PROCESSED_STATUSES = frozenset({429, 503})
+POOL_SIZE = 10
+
+
+class CircuitOpenError(RuntimeError):
+    pass
 
-# Smart compression function - converts to WebP
-def smart_compress_to_bytes(image_file, max_bytes=10 * 1024 * 1024, target_bytes=None):
+
+class CircuitBreaker:
     """
-    Compress image to target size while maintaining quality.
-    Converts image to WebP format before upload.
-    Returns BytesIO object with compressed WebP image.
+    Opens after failure_threshold consecutive failures: calls then fail
+    immediately for reset_timeout seconds, after which a single trial call
+    is let through (half-open) and its outcome closes or re-opens it.
     """
-    if target_bytes is None:
-        target_bytes = int(max_bytes * 0.93)  # 93% of max
 
-    img = Image.open(image_file)
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
 
-    # Preserve transparency - WebP supports alpha, so keep RGBA where present
-    if img.mode == 'P':
-        if 'transparency' in img.info:
-            img = img.convert('RGBA')
-        else:
-            img = img.convert('RGB')
-    elif img.mode == 'LA':
-        img = img.convert('RGBA')
-    elif img.mode not in ('RGB', 'RGBA'):
-        if 'A' in img.mode:
-            img = img.convert('RGBA')
-        else:
-            img = img.convert('RGB')
-
-    output = BytesIO()
-    save_kwargs = {'format': 'WEBP', 'quality': 95, 'method': 6}
-    img.save(output, **save_kwargs)
-    current_size = output.tell()
-
-    if current_size <= target_bytes:
-        output.seek(0)
-        return output
-
-    # Binary search for quality
-    min_quality, max_quality = 10, 95
-    best_output = None
-    while min_quality <= max_quality:
-        quality = (min_quality + max_quality) // 2
-        output = BytesIO()
-        img.save(output, format='WEBP', quality=quality, method=6)
-        if output.tell() <= target_bytes:
-            best_output = output
-            min_quality = quality + 1
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self.trial_running:
+                raise CircuitOpenError(
+                    f'Iceberg is unavailable after {self.failures} failed calls; '
+                    f'retrying in {max(remaining, 0):.0f}s'
+                )
+            self.trial_running = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def record_aborted(self):
+        """A call ended without an answer either way (e.g. interrupted): let the next trial through."""
+        with self.lock:
+            self.trial_running = False
+
+
+class IcebergClient:
+    """
+    Client for the three-step upload. Safe to share between threads: each
+    thread gets its own keep-alive session, the circuit breaker is shared.
+    """
+
+    def __init__(self, token, api_base=DEFAULT_API_BASE, cdn_base=DEFAULT_CDN_BASE, tenant_segment='',
+                 connect_timeout=CONNECT_TIMEOUT, read_timeouts=None, max_attempts=MAX_ATTEMPTS,
+                 breaker=None):
+        self.token = token
+        self.api_base = api_base.rstrip('/')
+        self.cdn_base = cdn_base.rstrip('/')
+        self.tenant_segment = tenant_segment
+        self.connect_timeout = connect_timeout
+        self.read_timeouts = {**READ_TIMEOUTS, **(read_timeouts or {})}
+        self.max_attempts = max_attempts
+        self.breaker = breaker or CircuitBreaker()
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            # Retries are handled in _request, with the breaker in the loop
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._local.session = session
+        return session
+
+    def _backoff(self, attempt, response=None):
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(int(retry_after), BACKOFF_MAX))
+        time.sleep(delay)
+
+    def _request(self, step, method, url, idempotent, **kwargs):
+        """
+        Send one step. Idempotent steps are retried on any transient error;
+        the others only when the request can't have been processed: the
+        connection failed, or the server answered 429/503.
+        """
+        timeout = (self.connect_timeout, self.read_timeouts[step])
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            if hasattr(kwargs.get('data'), 'seek'):
+                # A file body is read as it's sent: rewind it for every attempt
+                kwargs['data'].seek(0)
+            last_attempt = attempt == self.max_attempts - 1
+            # Every way out of the call records its outcome, or a half-open
+            # breaker would wait forever for the trial to finish
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.breaker.record_failure()
+                # ConnectTimeout is a ConnectionError; only a read timeout may have reached the server
+                not_sent = isinstance(e, requests.ConnectionError)
+                if last_attempt or not (idempotent or not_sent):
+                    raise
+                self._backoff(attempt)
+                continue
+            except requests.RequestException:
+                # e.g. a broken chunked response: Iceberg misbehaved, not worth a retry
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                self.breaker.record_aborted()
+                raise
+            if response.status_code >= 500 or response.status_code == 429:
+                self.breaker.record_failure()
+                retryable = response.status_code in (RETRY_STATUSES if idempotent else NOT_PROCESSED_STATUSES)
+                if retryable and not last_attempt:
+                    self._backoff(attempt, response)
+                    continue
+            else:
+                # 4xx are our mistakes, not Iceberg being down
+                self.breaker.record_success()
+            response.raise_for_status()
+            return response
+
+    def upload(self, body, key, content_type):
+        """
+        Upload body (bytes, or a binary file object such as the BytesIO
+        from smart_compress_to_bytes, which is streamed to R2 rather than
+        copied) under key. Returns a dict shaped like the old Cloudinary
+        result: url / secure_url / public_id / web_url / thumb_url / bytes.
+        """
+        if isinstance(body, (bytes, bytearray)):
+            size = len(body)
         else:
-            max_quality = quality - 1
+            size = body.seek(0, os.SEEK_END)
+        headers = {'Authorization': f'Bearer {self.token}', 'Content-Type': 'application/json'}
+
+        # 1. Init upload -> presigned R2 URL
+        resp = self._request(
+            'init-upload', 'POST', f'{self.api_base}/assets/init-upload', idempotent=False,
+            headers=headers, json={'key': key, 'content_type': content_type},
+        )
+        init_data = resp.json()
+        upload_url = _pick(init_data, 'upload_url', 'uploadUrl', 'presigned_url', 'presignedUrl', 'put_url', 'url')
+        if not upload_url:
+            raise RuntimeError(f'init-upload response did not contain an upload URL: {init_data}')
 
-    if best_output:
-        best_output.seek(0)
-        return best_output
+        # 2. PUT the bytes directly to R2 (same bytes, same key: safe to repeat)
+        self._request('put', 'PUT', upload_url, idempotent=True, data=body, headers={'Content-Type': content_type})
 
-    # Still too large: resize
-    output = BytesIO()
-    scale = (target_bytes / current_size) ** 0.5
-    new_size = (int(img.width * scale), int(img.height * scale))
-    img.resize(new_size, Image.Resampling.LANCZOS).save(output, format='WEBP', quality=85, method=6)
-    output.seek(0)
-    return output
+        # 3. Mark ready (Iceberg just checks the object exists: safe to repeat)
+        resp = self._request(
+            'complete', 'POST', f'{self.api_base}/assets/complete', idempotent=True,
+            headers=headers, json={'key': key},
+        )
+        complete_data = {}
+        try:
+            complete_data = resp.json()
+        except ValueError:
+            pass
+
+        # Public URL: prefer one from the API; otherwise build it as
+        # {CDN base}/{tenant id}/{key} — the tenant id comes back from both
+        # init-upload (tenant_id) and complete (TenantID).
+        public_url = (
+            _pick(complete_data, 'public_url', 'publicUrl', 'cdn_url', 'cdnUrl', 'url')
+            or _pick(init_data, 'public_url', 'publicUrl', 'cdn_url', 'cdnUrl')
+        )
+        if not public_url:
+            tenant = (
+                _pick(complete_data, 'TenantID', 'tenant_id', 'tenantId')
+                or _pick(init_data, 'tenant_id', 'TenantID', 'tenantId')
+                or self.tenant_segment
+            ).strip('/')
+            public_url = '/'.join(p for p in [self.cdn_base, tenant, key] if p)
+
+        return {
+            'url': public_url,
+            'secure_url': public_url,
+            'public_id': key,
+            'web_url': public_url,
+            'thumb_url': public_url,
+            'bytes': size,
+        }
 
 
 def _get_token():
@@ -109,78 +266,81 @@ def _pick(data, *names):
     return None
 
 
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide IcebergClient for the current .env settings."""
+    global _client
+    settings = (
+        _get_token(),
+        os.getenv('ICEBERG_API_BASE', DEFAULT_API_BASE),
+        os.getenv('ICEBERG_CDN_BASE', DEFAULT_CDN_BASE),
+        os.getenv('ICEBERG_TENANT_SEGMENT', ''),
+    )
+    with _client_lock:
+        if _client is None or _client.settings != settings:
+            _client = IcebergClient(*settings)
+            _client.settings = settings
+        return _client
+
+
+def object_key(filename, folder='garden_gate'):
+    """Unique object key so uploads never overwrite each other."""
+    name = os.path.splitext(os.path.basename(filename))[0]
+    safe_name = ''.join(c if c.isalnum() or c in '-_' else '-' for c in name).strip('-') or 'image'
+    return f"{folder.strip('/')}/{safe_name}-{uuid.uuid4().hex[:8]}.webp"
+
+
+def upload_bytes(body, filename, folder='garden_gate'):
+    """Upload an already compressed WebP (bytes or file) under a fresh key named after filename."""
+    if not _get_token():
+        raise RuntimeError('ICEBERG_API_TOKEN is not set. Mint an API token in the '
+                           'Katalyst dashboard and add it to your .env file.')
+    return get_client().upload(body, object_key(filename, folder), 'image/webp')
+
+
+def variant_key(key, width):
+    """Object key of a width variant, next to the full image's key."""
+    return f"{key.removesuffix('.webp')}-{width}w.webp"
+
+
+_upload_pool = None
+
+
+def upload_with_variants(body, variants, filename, folder='garden_gate'):
+    """
+    Upload body like upload_bytes, and its (width, height, body) variants
+    next to it, all at the same time. Returns (result, [(width, height, result)]).
+    """
+    global _upload_pool
+    if not _get_token():
+        raise RuntimeError('ICEBERG_API_TOKEN is not set. Mint an API token in the '
+                           'Katalyst dashboard and add it to your .env file.')
+    with _client_lock:
+        if _upload_pool is None:
+            _upload_pool = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='iceberg-upload')
+    client = get_client()
+    key = object_key(filename, folder)
+    full = _upload_pool.submit(client.upload, body, key, 'image/webp')
+    uploads = [
+        (width, height, _upload_pool.submit(client.upload, data, variant_key(key, width), 'image/webp'))
+        for width, height, data in variants
+    ]
+    return full.result(), [(width, height, upload.result()) for width, height, upload in uploads]
+
+
 def upload_to_iceberg(image_file, folder='garden_gate'):
     """
     Compress to WebP and upload via the Iceberg presigned three-step flow.
     Returns a dict shaped like the old Cloudinary result:
     url / secure_url / public_id / web_url / thumb_url.
     """
-    token = _get_token()
-    if not token:
+    if not _get_token():
         raise RuntimeError('ICEBERG_API_TOKEN is not set. Mint an API token in the '
                            'Katalyst dashboard and add it to your .env file.')
 
-    api_base = os.getenv('ICEBERG_API_BASE', DEFAULT_API_BASE).rstrip('/')
-    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
-
     # Compress to WebP
-    compressed = smart_compress_to_bytes(image_file)
-    body = compressed.read()
-
-    # Unique object key so uploads never overwrite each other
-    filename = getattr(image_file, 'name', 'image.jpg')
-    name = os.path.splitext(os.path.basename(filename))[0]
-    safe_name = ''.join(c if c.isalnum() or c in '-_' else '-' for c in name).strip('-') or 'image'
-    key = f"{folder.strip('/')}/{safe_name}-{uuid.uuid4().hex[:8]}.webp"
-    content_type = 'image/webp'
-
-    # 1. Init upload -> presigned R2 URL
-    resp = requests.post(
-        f'{api_base}/assets/init-upload',
-        headers=headers,
-        json={'key': key, 'content_type': content_type},
-        timeout=30,
-    )
-    resp.raise_for_status()
-    init_data = resp.json()
-    upload_url = _pick(init_data, 'upload_url', 'uploadUrl', 'presigned_url', 'presignedUrl', 'put_url', 'url')
-    if not upload_url:
-        raise RuntimeError(f'init-upload response did not contain an upload URL: {init_data}')
-
-    # 2. PUT the bytes directly to R2
-    put_resp = requests.put(upload_url, data=body, headers={'Content-Type': content_type}, timeout=120)
-    put_resp.raise_for_status()
-
-    # 3. Mark ready
-    resp = requests.post(f'{api_base}/assets/complete', headers=headers, json={'key': key}, timeout=30)
-    resp.raise_for_status()
-    complete_data = {}
-    try:
-        complete_data = resp.json()
-    except ValueError:
-        pass
-
-    # Public URL: prefer one from the API; otherwise build it as
-    # {CDN base}/{tenant id}/{key} — the tenant id comes back from both
-    # init-upload (tenant_id) and complete (TenantID).
-    public_url = (
-        _pick(complete_data, 'public_url', 'publicUrl', 'cdn_url', 'cdnUrl', 'url')
-        or _pick(init_data, 'public_url', 'publicUrl', 'cdn_url', 'cdnUrl')
-    )
-    if not public_url:
-        tenant = (
-            _pick(complete_data, 'TenantID', 'tenant_id', 'tenantId')
-            or _pick(init_data, 'tenant_id', 'TenantID', 'tenantId')
-            or os.getenv('ICEBERG_TENANT_SEGMENT', '')
-        ).strip('/')
-        cdn_base = os.getenv('ICEBERG_CDN_BASE', DEFAULT_CDN_BASE).rstrip('/')
-        public_url = '/'.join(p for p in [cdn_base, tenant, key] if p)
-
-    return {
-        'url': public_url,
-        'secure_url': public_url,
-        'public_id': key,
-        'web_url': public_url,
-        'thumb_url': public_url,
-        'bytes': len(body),
-    }
+    body = smart_compress_to_bytes(image_file)
+    return upload_bytes(body, getattr(image_file, 'name', 'image.jpg'), folder)
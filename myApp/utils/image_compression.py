@@ -0,0 +1,289 @@
+"""
+WebP compression to a size budget, shared by the Iceberg and Cloudinary
+uploaders.
+
+Finding the highest quality that fits used to take a binary search of full
+resolution method=6 encodes: up to eight on a large photo, seconds each.
+Now the binary search runs on a small sample of the image (see _sample),
+whose encoded sizes predict the full image's through a size model (see
+_SizeModel), and only the predicted qualities are encoded at full
+resolution. Every full encode refines the model, so the search usually
+settles after one or two of them.
+
+The guarantee is unchanged: the result fits target_bytes whenever some
+quality from 10 to 95 does. The chosen quality can land a few points under
+the exact optimum (the search stops once a fit reaches GOOD_ENOUGH of the
+target).
+
+Memory is bounded by MAX_PIXELS: larger images are scaled down as they
+are decoded (see open_image), so a 50 MP photo costs about what a 12 MP
+one does. The encoded output stays in its BytesIO, which the Iceberg
+client streams to R2 as is.
+"""
+from io import BytesIO
+
+from PIL import Image
+
+MAX_QUALITY = 95
+MIN_QUALITY = 10
+WEBP_METHOD = 6
+# Probes encode a mosaic of this many x this many tiles of this many pixels square
+SAMPLE_GRID = 5
+SAMPLE_TILE = 128
+# Predictions aim this far under the budget, so the final encode rarely misses
+PREDICTION_MARGIN = 0.97
+# Full quality is tried first when predicted up to this far over the budget:
+# before any anchor the prediction can be off by ~10%, and a fit there
+# ends the search with one encode
+FULL_QUALITY_SLACK = 1.1
+# Full resolution encodes spent searching before settling for the best fit
+FINAL_ATTEMPTS = 4
+# A fit this close to the budget ends the search
+GOOD_ENOUGH = 0.9
+RESIZE_ATTEMPTS = 4
+RESIZE_QUALITY = 85
+# Responsive copies made next to every upload (see encode_variants); small
+# enough that a fixed quality and a faster method are fine
+VARIANT_WIDTHS = (320, 640, 1280, 1920)
+VARIANT_QUALITY = 80
+VARIANT_METHOD = 4
+# Larger images are scaled down while decoding (see open_image): a 12 MP
+# RGB image is 36 MB, a 50 MP one 150 MB before any encoder buffers
+MAX_PIXELS = 12_000_000
+
+
+def normalize_mode(img):
+    """Convert img to RGB, or RGBA where it has transparency (WebP keeps alpha)."""
+    if img.mode == 'P':
+        return img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    if img.mode == 'LA':
+        return img.convert('RGBA')
+    if img.mode not in ('RGB', 'RGBA'):
+        return img.convert('RGBA' if 'A' in img.mode else 'RGB')
+    return img
+
+
+def open_image(image_file, max_pixels=MAX_PIXELS):
+    """
+    Decode image_file, normalized, at no more than max_pixels. JPEGs are
+    decoded at a reduced DCT scale (draft) when that still leaves at least
+    max_pixels, whatever remains above is scaled down, and the mode
+    conversion comes last, so a huge photo is never held in memory at
+    full resolution more than once.
+    """
+    img = Image.open(image_file)
+    pixels = img.width * img.height
+    if pixels > max_pixels:
+        scale = (max_pixels / pixels) ** 0.5
+        size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        img.draft(None, size)
+        img.load()
+        if img.width * img.height > max_pixels:
+            # reducing_gap: box-reduce by an integer factor first, then resample what's left
+            img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return normalize_mode(img)
+
+
+def encode_webp(img, quality, method=WEBP_METHOD):
+    output = BytesIO()
+    img.save(output, format='WEBP', quality=quality, method=method)
+    return output
+
+
+def _sample(img):
+    """
+    Return a mosaic of SAMPLE_GRID x SAMPLE_GRID tiles cut from across img
+    at full resolution (img itself when it is no bigger than that). Unlike a
+    downscaled copy, the tiles keep the image's detail per pixel, so their
+    encoded size scales with the pixel count at every quality.
+    """
+    size = SAMPLE_GRID * SAMPLE_TILE
+    if img.width * img.height <= size * size or min(img.size) < SAMPLE_TILE:
+        return img
+    sample = Image.new(img.mode, (size, size))
+    for column in range(SAMPLE_GRID):
+        for row in range(SAMPLE_GRID):
+            x = int((img.width - SAMPLE_TILE) * (column + 0.5) / SAMPLE_GRID)
+            y = int((img.height - SAMPLE_TILE) * (row + 0.5) / SAMPLE_GRID)
+            tile = img.crop((x, y, x + SAMPLE_TILE, y + SAMPLE_TILE))
+            sample.paste(tile, (column * SAMPLE_TILE, row * SAMPLE_TILE))
+    return sample
+
+
+class _SizeModel:
+    """
+    Predicts the full resolution size at a quality from the sample's size at
+    that quality times a full/sample ratio. The ratio starts as the pixel
+    ratio and is then interpolated between the real encodes made so far
+    ("anchors"), so each one makes the next prediction closer.
+    """
+
+    def __init__(self, img):
+        self.img = img
+        self.sample = _sample(img)
+        self.sample_sizes = {}
+        self.anchors = {}
+        self.pixel_ratio = img.width * img.height / (self.sample.width * self.sample.height)
+
+    def sample_size(self, quality):
+        if quality not in self.sample_sizes:
+            self.sample_sizes[quality] = encode_webp(self.sample, quality).tell()
+        return self.sample_sizes[quality]
+
+    def add_anchor(self, quality, full_size):
+        self.anchors[quality] = full_size / self.sample_size(quality)
+
+    def ratio(self, quality):
+        if not self.anchors:
+            return self.pixel_ratio
+        below = max((q for q in self.anchors if q <= quality), default=None)
+        above = min((q for q in self.anchors if q >= quality), default=None)
+        if below is None or above is None or below == above:
+            return self.anchors[above if below is None else below]
+        weight = (quality - below) / (above - below)
+        return self.anchors[below] + (self.anchors[above] - self.anchors[below]) * weight
+
+    def predict(self, quality):
+        return self.sample_size(quality) * self.ratio(quality)
+
+    def best_quality(self, budget, low, high):
+        """Highest quality in [low, high] predicted to fit budget, or None."""
+        best = None
+        while low <= high:
+            quality = (low + high) // 2
+            if self.predict(quality) <= budget:
+                best, low = quality, quality + 1
+            else:
+                high = quality - 1
+        return best
+
+
+def _resize_to_fit(img, estimated_size, target_bytes):
+    """Last resort: shrink img until it fits at RESIZE_QUALITY."""
+    scale, size = 1.0, estimated_size
+    for attempt in range(RESIZE_ATTEMPTS):
+        # Smaller images cost more bytes per pixel, so later passes shrink harder
+        scale *= (target_bytes * PREDICTION_MARGIN / size) ** (0.5 if attempt == 0 else 1)
+        resized = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))),
+                             Image.Resampling.LANCZOS)
+        output = encode_webp(resized, RESIZE_QUALITY)
+        size = output.tell()
+        if size <= target_bytes:
+            break
+    output.seek(0)
+    return output
+
+
+def _exact_search(img, low, high, target_bytes):
+    """Binary search of full resolution encodes: the highest quality that fits, or None."""
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        output = encode_webp(img, quality)
+        if output.tell() <= target_bytes:
+            best, low = output, quality + 1
+        else:
+            high = quality - 1
+    return best
+
+
+def smart_compress_to_bytes(image_file, max_bytes=10 * 1024 * 1024, target_bytes=None):
+    """
+    Compress image to target size while maintaining quality.
+    Converts image to WebP format before upload.
+    Returns BytesIO object with compressed WebP image.
+    """
+    return compress_image(open_image(image_file), max_bytes, target_bytes)
+
+
+def compress_image(img, max_bytes=10 * 1024 * 1024, target_bytes=None):
+    """smart_compress_to_bytes for an already decoded (and normalized) image."""
+    if target_bytes is None:
+        target_bytes = int(max_bytes * 0.93)  # 93% of max
+
+    model = _SizeModel(img)
+    if model.sample is img:
+        # Small image: probing would cost about as much as encoding it
+        output = encode_webp(img, MAX_QUALITY)
+        if output.tell() <= target_bytes:
+            output.seek(0)
+            return output
+        best = _exact_search(img, MIN_QUALITY, MAX_QUALITY - 1, target_bytes)
+        if best:
+            best.seek(0)
+            return best
+        return _resize_to_fit(img, output.tell(), target_bytes)
+
+    budget = target_bytes * PREDICTION_MARGIN
+    highest = MAX_QUALITY
+    # Predicted to (nearly) fit at full quality: one encode, like before
+    if model.predict(MAX_QUALITY) <= target_bytes * FULL_QUALITY_SLACK:
+        output = encode_webp(img, MAX_QUALITY)
+        if output.tell() <= target_bytes:
+            output.seek(0)
+            return output
+        model.add_anchor(MAX_QUALITY, output.tell())
+        highest = MAX_QUALITY - 1
+
+    # Each encode brackets the answer and refines the model: stop at a fit
+    # close enough to the budget, or when the bracket closes
+    best, best_quality = None, MIN_QUALITY - 1
+    for _ in range(FINAL_ATTEMPTS):
+        quality = model.best_quality(budget, best_quality + 1, highest)
+        if quality is None:
+            break
+        output = encode_webp(img, quality)
+        model.add_anchor(quality, output.tell())
+        if output.tell() <= target_bytes:
+            best, best_quality = output, quality
+            if output.tell() >= target_bytes * GOOD_ENOUGH or quality == highest:
+                break
+        else:
+            highest = quality - 1
+    if best:
+        best.seek(0)
+        return best
+
+    # The model found nothing: real encodes for the qualities left, lowest
+    # first since it usually means none of them fits
+    lowest = encode_webp(img, MIN_QUALITY)
+    if lowest.tell() <= target_bytes:
+        best = _exact_search(img, MIN_QUALITY + 1, highest, target_bytes) or lowest
+        best.seek(0)
+        return best
+
+    # Still too large: resize
+    return _resize_to_fit(img, model.predict(MAX_QUALITY), target_bytes)
+
+
+
+def encode_variants(img, widths=VARIANT_WIDTHS):
+    """
+    WebP copies of img at each of widths narrower than it, as a list of
+    (width, height, BytesIO). Each is resized from img itself, so the
+    variants share its single decode.
+    """
+    variants = []
+    for width in sorted(widths):
+        if width >= img.width:
+            break
+        height = max(1, round(img.height * width / img.width))
+        resized = img.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        output = encode_webp(resized, VARIANT_QUALITY, VARIANT_METHOD)
+        output.seek(0)
+        variants.append((width, height, output))
+    return variants
+
+
+def compress_with_variants(source, widths=VARIANT_WIDTHS, max_bytes=10 * 1024 * 1024):
+    """
+    Compress an image (bytes or a file) to a size budgeted WebP plus its
+    width variants, decoding it once. Returns (BytesIO, (width, height),
+    variants); everything pickles, so it can run in a process pool.
+    """
+    img = open_image(BytesIO(source) if isinstance(source, bytes) else source)
+    body = compress_image(img, max_bytes)
+    # Usually img.size, unless compress_image had to shrink it (only the header is read)
+    size = Image.open(body).size
+    body.seek(0)
+    return body, size, encode_variants(img, [width for width in widths if width < size[0]])
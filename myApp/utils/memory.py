@@ -0,0 +1,40 @@
+"""
+Process memory figures, for the memory benchmarks and tests.
+
+Linux reports them in /proc/self/status; elsewhere only the peak is
+known, from the POSIX resource module (imported when needed: it doesn't
+exist on Windows).
+"""
+
+
+def memory_status(field):
+    """A /proc/self/status memory figure (VmRSS, VmHWM) in bytes, or None off Linux."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Restart the peak RSS count (Linux); ru_maxrss can't be reset, and a child inherits its parent's."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Peak RSS in bytes, or None where neither /proc nor the resource module exist."""
+    peak = memory_status('VmHWM')
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,197 @@
+"""
+Write-behind blog post view counter.
+
+Counting a view used to be a read-modify-write save() on every hit: racing
+requests lost increments, and every hit on a popular post took a write lock
+(the whole database, on SQLite). Instead:
+
+  1. a hit only increments a per-post counter in the view_counts cache
+     (cache.incr is atomic in both the local memory and the Redis backends).
+     The first pending view of a post also appends its id to a dirty log,
+  2. once VIEW_COUNT_BATCH_SIZE views were counted by a process, or
+     VIEW_COUNT_FLUSH_INTERVAL seconds passed, the counters of the posts in
+     the dirty log are written in one transaction with
+     UPDATE ... SET view_count = view_count + n (one statement per distinct
+     n, not per post),
+  3. flushed amounts are decremented from the counters, so views counted
+     while a flush runs are never lost.
+
+The view_counts cache never evicts and keeps its key prefix across deploys
+(see settings.CACHES). Views still pending when a process dies are lost: at
+most BATCH_SIZE views or FLUSH_INTERVAL seconds' worth per process with the
+local memory cache. With REDIS_URL set the counters outlive worker restarts
+and deploys. Pending views are also flushed at exit and by the
+flush_view_counts command. A failed flush is logged and never fails the
+page view that triggered it; its views stay pending for the next one.
+
+The dirty log is a sequence of numbered slots ("view-count:dirty:<n>")
+whose last allocated number is a counter: appending is one incr plus one
+set, so it works with plain cache operations on every backend.
+"""
+import atexit
+import logging
+import threading
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from .models import BlogPost
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'view-count:{}'
+FLUSH_LOCK_KEY = 'view-count:flush-lock'
+# Dirty log: slot numbers allocated so far, read up to, and a slot found
+# unwritten by the last flush (its writer died between the incr and the set)
+DIRTY_SLOT_KEY = 'view-count:dirty:{}'
+DIRTY_HEAD_KEY = 'view-count:dirty-head'
+DIRTY_TAIL_KEY = 'view-count:dirty-tail'
+DIRTY_GAP_KEY = 'view-count:dirty-gap'
+
+# Posts per UPDATE statement, and keys per cache read
+UPDATE_CHUNK_SIZE = 500
+
+_lock = threading.Lock()
+_counted = 0
+_last_flush = time.monotonic()
+
+
+def _pending_key(post_id):
+    return PENDING_KEY.format(post_id)
+
+
+def _counts():
+    return caches['view_counts']
+
+
+def _increment(key):
+    counts = _counts()
+    try:
+        return counts.incr(key)
+    except ValueError:
+        if counts.add(key, 1, None):
+            return 1
+        return counts.incr(key)
+
+
+def _mark_dirty(post_id):
+    slot = _increment(DIRTY_HEAD_KEY)
+    _counts().set(DIRTY_SLOT_KEY.format(slot), post_id, None)
+
+
+def _get_many(keys):
+    found = {}
+    keys = iter(keys)
+    while chunk := list(islice(keys, UPDATE_CHUNK_SIZE)):
+        found.update(_counts().get_many(chunk))
+    return found
+
+
+def _read_dirty_log():
+    """
+    Return (ids of the posts logged since the last flush, slot to mark as
+    read once they are written, unwritten slot to skip if still unwritten
+    at the next flush).
+    """
+    counts = _counts()
+    head = counts.get(DIRTY_HEAD_KEY, 0)
+    tail = counts.get(DIRTY_TAIL_KEY, 0)
+    last_gap = counts.get(DIRTY_GAP_KEY)
+    logged = _get_many(DIRTY_SLOT_KEY.format(slot) for slot in range(tail + 1, head + 1))
+    post_ids, gap = set(), None
+    for slot in range(tail + 1, head + 1):
+        key = DIRTY_SLOT_KEY.format(slot)
+        if key in logged:
+            post_ids.add(logged[key])
+        elif gap is None and slot != last_gap:
+            # Probably being written right now: read it again next time
+            gap = slot
+    return post_ids, (gap - 1 if gap else head), gap
+
+
+def record_view(post):
+    """
+    Count one view of post and return how many of its views are not in
+    post.view_count yet. Flushes the pending counts when it's time to.
+    """
+    global _counted
+    if settings.VIEW_COUNT_BATCH_SIZE <= 1:
+        # Buffering disabled: write straight through (still race free)
+        BlogPost.objects.filter(pk=post.pk).update(view_count=F('view_count') + 1)
+        return 1
+
+    pending = _increment(_pending_key(post.pk))
+    if pending == 1:
+        _mark_dirty(post.pk)
+    with _lock:
+        _counted += 1
+        due = (_counted >= settings.VIEW_COUNT_BATCH_SIZE
+               or time.monotonic() - _last_flush >= settings.VIEW_COUNT_FLUSH_INTERVAL)
+    if due:
+        try:
+            flush_view_counts()
+        except Exception:
+            # The views stay pending; the visitor still gets the page
+            logger.exception('Could not flush blog post view counts')
+    return pending
+
+
+def pending_views(post_ids):
+    """Return {post id: views not yet written} for the posts with pending views."""
+    keys = {_pending_key(pk): pk for pk in post_ids}
+    return {keys[key]: count for key, count in _get_many(keys).items() if count}
+
+
+def flush_view_counts():
+    """
+    Write every pending view count to the database. Returns the number of
+    views written, or None if another process is flushing right now.
+    """
+    global _counted, _last_flush
+    with _lock:
+        _counted = 0
+        _last_flush = time.monotonic()
+    counts = _counts()
+    # Only one process flushes at a time; the lock expires in case it dies
+    if not counts.add(FLUSH_LOCK_KEY, 1, 60):
+        return None
+    try:
+        post_ids, read_to, gap = _read_dirty_log()
+        pending = pending_views(post_ids)
+        by_increment = {}
+        for pk, count in pending.items():
+            by_increment.setdefault(count, []).append(pk)
+
+        with transaction.atomic():
+            for count, post_ids in by_increment.items():
+                post_ids = iter(post_ids)
+                while chunk := list(islice(post_ids, UPDATE_CHUNK_SIZE)):
+                    BlogPost.objects.filter(pk__in=chunk).update(view_count=F('view_count') + count)
+
+        # Only subtract what was written; views counted meanwhile stay
+        # pending and go back in the log (their incr didn't log them)
+        for pk, count in pending.items():
+            try:
+                if counts.decr(_pending_key(pk), count) > 0:
+                    _mark_dirty(pk)
+            except ValueError:
+                pass
+        tail = counts.get(DIRTY_TAIL_KEY, 0)
+        counts.delete_many([DIRTY_SLOT_KEY.format(slot) for slot in range(tail + 1, read_to + 1)])
+        counts.set_many({DIRTY_TAIL_KEY: read_to, DIRTY_GAP_KEY: gap}, None)
+        return sum(pending.values())
+    finally:
+        counts.delete(FLUSH_LOCK_KEY)
+
+
+@atexit.register
+def _flush_at_exit():
+    if _counted:
+        try:
+            flush_view_counts()
+        except Exception:
+            pass
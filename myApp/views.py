@@ -1,79 +1,151 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, get_object_or_404
-from .image_helpers import get_all_section_images
-from .models import (
-    ServiceCard, ServicesSection, HeroSection, CredibilitySection, CredibilityCard,
-    TestimonialsSection, Testimonial, StatisticsSection, PainPointsSection,
-    MethodologySection, MethodologyStep, AboutSection, MissionVisionSection,
-    LeadMagnetSection, FinalCTASection, BlogSection, BlogPost,
-    PricingSection, PricingPackage
+from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+from . import feeds
+from .image_helpers import LazySectionImages
+from .conditional import (
+    blog_post_validators, conditional_page, home_validators, not_modified_response, set_validators
 )
+from .models import BlogPost
+from .page_cache import cache_public_page
+from .pagination import keyset_paginate
+from .related_posts import get_related_posts
+from .search import search_posts
+from .site_content import HOME_PARTIAL_NAMES, get_site_content, lazy_site_context
+from .streaming import stream_page
+from .view_counter import record_view
 
+@conditional_page(home_validators)
+@cache_public_page
 def home(request):
-    # Get all section images from database
-    section_images = get_all_section_images()
-    
-    # Get all content sections from database
-    hero_section = HeroSection.get_instance()
-    credibility_section = CredibilitySection.get_instance()
-    credibility_cards = CredibilityCard.objects.all().order_by('card_number')
-    testimonials_section = TestimonialsSection.get_instance()
-    testimonials = Testimonial.objects.all().order_by('testimonial_number')
-    statistics_section = StatisticsSection.get_instance()
-    pain_points_section = PainPointsSection.get_instance()
-    services_section = ServicesSection.get_instance()
-    service_cards = ServiceCard.objects.all().order_by('card_number')
-    methodology_section = MethodologySection.get_instance()
-    methodology_steps = MethodologyStep.objects.all().order_by('step_number')
-    about_section = AboutSection.get_instance()
-    mission_vision_section = MissionVisionSection.get_instance()
-    lead_magnet_section = LeadMagnetSection.get_instance()
-    final_cta_section = FinalCTASection.get_instance()
-    blog_section = BlogSection.get_instance()
-    blog_posts = BlogPost.objects.filter(is_published=True).order_by('-published_date')[:6]
-    pricing_section = PricingSection.get_instance()
-    pricing_packages = PricingPackage.objects.all().order_by('package_number')
-    
-    context = {
-        'section_images': section_images,
-        'hero_section': hero_section,
-        'credibility_section': credibility_section,
-        'credibility_cards': credibility_cards,
-        'testimonials_section': testimonials_section,
-        'testimonials': testimonials,
-        'statistics_section': statistics_section,
-        'pain_points_section': pain_points_section,
-        'services_section': services_section,
-        'service_cards': service_cards,
-        'methodology_section': methodology_section,
-        'methodology_steps': methodology_steps,
-        'about_section': about_section,
-        'mission_vision_section': mission_vision_section,
-        'lead_magnet_section': lead_magnet_section,
-        'final_cta_section': final_cta_section,
-        'blog_section': blog_section,
-        'blog_posts': blog_posts,
-        'pricing_section': pricing_section,
-        'pricing_packages': pricing_packages,
-    }
+    if settings.STREAM_PUBLIC_PAGES:
+        # The <head> needs no section data: flush it, then load the content
+        return stream_page(request, 'myApp/home.html', {}, body=lambda: _home_fragments(request))
+
+    # All sections, card lists and section images come from one read-only,
+    # memoized snapshot (see site_content.py)
+    context = get_site_content().as_context()
+    context['defer_below_fold'] = settings.DEFER_BELOW_FOLD_SECTIONS
     return render(request, 'myApp/home.html', context)
 
+def _home_fragments(request):
+    """Yield the home page partials one at a time (streaming mode)"""
+    context = get_site_content().as_context()
+    context['defer_below_fold'] = settings.DEFER_BELOW_FOLD_SECTIONS
+    for fragment in context['home_fragments']:
+        yield render_to_string('myApp/partials/cached_fragment.html', {**context, 'fragment': fragment}, request)
+    if context['defer_below_fold']:
+        yield render_to_string('myApp/partials/deferred_sections_script.html', context, request)
+
+@conditional_page(home_validators)
+@cache_public_page
+def section_fragment(request, name):
+    """Render a single home page partial (lazy-loaded below-the-fold sections)"""
+    if name not in HOME_PARTIAL_NAMES:
+        raise Http404('Unknown section')
+    # Lazy context: the partial only loads the rows it renders
+    response = render(request, f'myApp/partials/{name}.html', lazy_site_context())
+    response['X-Robots-Tag'] = 'noindex'
+    return response
+
+ARCHIVE_POSTS_PER_PAGE = 12
+
+def blog_archive(request):
+    """All published posts, newest first, paginated by cursor (see pagination.py)"""
+    page = keyset_paginate(
+        BlogPost.cards().filter(is_published=True), ARCHIVE_POSTS_PER_PAGE,
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
+    return render(request, 'myApp/blog_archive.html', {
+        'posts': page.items,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        'section_images': LazySectionImages(),
+    })
+
+SEARCH_RESULTS_PER_PAGE = 10
+# Deeper pages are a 404 (a huge page number would overflow the SQL OFFSET)
+SEARCH_MAX_PAGES = 100
+
+def blog_search(request):
+    """Full-text search over published blog posts (see search.py)"""
+    query = request.GET.get('q', '').strip()[:200]
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    if page > SEARCH_MAX_PAGES:
+        raise Http404('No such page')
+    # One extra result tells whether there is a next page
+    results = search_posts(query, limit=SEARCH_RESULTS_PER_PAGE + 1, offset=(page - 1) * SEARCH_RESULTS_PER_PAGE) if query else []
+    if page > 1 and not results:
+        raise Http404('No such page')
+
+    response = render(request, 'myApp/blog_search.html', {
+        'query': query,
+        'results': results[:SEARCH_RESULTS_PER_PAGE],
+        'page': page,
+        'has_previous': page > 1,
+        'has_next': len(results) > SEARCH_RESULTS_PER_PAGE and page < SEARCH_MAX_PAGES,
+        'section_images': LazySectionImages(),
+    })
+    response['X-Robots-Tag'] = 'noindex'
+    return response
+
+def _document_response(request, document):
+    """Send a feeds.CachedDocument (gzipped when the client accepts it), or a 304"""
+    response = not_modified_response(request, document.etag, document.last_modified)
+    if response is None:
+        gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+        response = HttpResponse(document.gzipped if gzipped else document.body, content_type=document.content_type)
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return set_validators(request, response, document.etag, document.last_modified)
+
+def sitemap(request):
+    return _document_response(request, feeds.sitemap())
+
+def sitemap_page(request, page):
+    return _document_response(request, feeds.sitemap_page(page))
+
+def blog_feed_rss(request):
+    return _document_response(request, feeds.rss_feed())
+
+def blog_feed_atom(request):
+    return _document_response(request, feeds.atom_feed())
+
+def blog_post_context(post):
+    """Template context for a blog post page (shared with export_static_site)"""
+    return {
+        'post': post,
+        # Precomputed by content similarity (see related_posts.py), loaded on first use
+        'related_posts': SimpleLazyObject(lambda: get_related_posts(post)),
+        # Header/footer only need the logo, so images load on first use
+        'section_images': LazySectionImages(),
+    }
+
 def blog_post_detail(request, slug):
     """View individual blog post"""
     post = get_object_or_404(BlogPost, slug=slug, is_published=True)
     
-    # Increment view count
-    post.view_count += 1
-    post.save(update_fields=['view_count'])
-    
-    # Get related posts (exclude current post)
-    related_posts = BlogPost.objects.filter(is_published=True).exclude(id=post.id).order_by('-published_date')[:3]
-    
-    # Get all section images for header/footer
-    section_images = get_all_section_images()
+    # Count the view; the database is updated in batches (see view_counter.py)
+    post.view_count += record_view(post)
+
+    # Answer revalidations (If-None-Match / If-Modified-Since) without rendering
+    etag, last_modified = blog_post_validators(request, post)
+    response = not_modified_response(request, etag, last_modified)
+    if response is not None:
+        return set_validators(request, response, etag, last_modified)
     
-    context = {
-        'post': post,
-        'related_posts': related_posts,
-        'section_images': section_images,
-    }
-    return render(request, 'myApp/blog_post_detail.html', context)
\ No newline at end of file
+    context = blog_post_context(post)
+    if settings.STREAM_PUBLIC_PAGES:
+        # Related posts and images are lazy, so only the post itself is
+        # loaded before the <head> goes out
+        response = stream_page(request, 'myApp/blog_post_detail.html', context)
+    else:
+        response = render(request, 'myApp/blog_post_detail.html', context)
+    return set_validators(request, response, etag, last_modified)
\ No newline at end of file
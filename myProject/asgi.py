@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myProject.settings')
 
 application = get_asgi_application()
+
+# Resume gallery uploads interrupted by the last restart (thread backend)
+from myApp.upload_queue import start_recovery  # noqa: E402
+
+start_recovery()
@@ -0,0 +1,15 @@
+"""
+Celery app for background upload jobs (UPLOAD_QUEUE_BACKEND=celery).
+
+Run a worker with:  celery -A myProject worker
+Settings prefixed CELERY_ (e.g. CELERY_BROKER_URL) configure it.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myProject.settings')
+
+app = Celery('myProject')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -111,6 +111,112 @@ if os.getenv('DATABASE_URL'):
     )
 
 
+# Public address of the site, used when pages are rendered outside a request
+# (static export, sitemap, feeds)
+SITE_URL = os.getenv('SITE_URL', 'https://www.gardengatepropertymanagement.com').rstrip('/')
+
+# Identifies the running release; cached HTML and ETags are namespaced by it
+# so they never outlive a template change
+DEPLOY_ID = os.getenv('RAILWAY_GIT_COMMIT_SHA', '')[:12]
+
+# Cache
+# Rendered public pages and the content version live here. Set REDIS_URL when
+# running more than one worker process so every worker sees the same version;
+# without it each process keeps its own in-memory cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': DEPLOY_ID,
+        },
+        'view_counts': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': 'view-counts',
+            'TIMEOUT': None,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'garden-gate',
+        },
+        'view_counts': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'garden-gate-view-counts',
+            'TIMEOUT': None,
+            # A handful of keys per post with pending views; never culled
+            'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+        },
+    }
+# Pending blog post view counts (see myApp/view_counter.py) have their own
+# cache: its keys never expire or get culled, and its prefix stays the same
+# across deploys so the next release flushes what the last one counted. On
+# Redis, keep a maxmemory-policy that doesn't evict keys without a TTL
+# (noeviction or volatile-*).
+
+# Seconds a rendered public page may stay cached. Saves invalidate it
+# immediately through the content version; the timeout only bounds how long
+# other worker processes can lag behind when there is no shared cache.
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 60 * 60 * 24 if os.getenv('REDIS_URL') else 300))
+
+# Seconds a rendered home page partial stays cached. Fragment keys include the
+# updated_at of the rows they render, so they never go stale - this only
+# lets unused fragments expire.
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', 60 * 60 * 24 * 7))
+
+
+# Send public pages as a StreamingHttpResponse: the <head> is flushed before any
+# section data is loaded, then the partials follow as they render
+STREAM_PUBLIC_PAGES = os.getenv('STREAM_PUBLIC_PAGES', '').lower() in ('1', 'true', 'yes')
+
+
+# Ship placeholders for the below-the-fold home page sections (testimonials,
+# blog, ...) and load them from /sections/<name>/ as they scroll into view
+DEFER_BELOW_FOLD_SECTIONS = os.getenv('DEFER_BELOW_FOLD_SECTIONS', '').lower() in ('1', 'true', 'yes')
+
+
+# Update the related posts of a saved blog post on a background thread after
+# the response (see myApp/related_posts.py); off, the save's request does it
+RELATED_POSTS_IN_BACKGROUND = os.getenv('RELATED_POSTS_IN_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+
+
+# Blog post views are counted in the cache and written to the database in
+# batches: after VIEW_COUNT_BATCH_SIZE views per process or at most every
+# VIEW_COUNT_FLUSH_INTERVAL seconds. Together they bound how many views a
+# crashing worker can lose (pending counts survive restarts with REDIS_URL).
+# A batch size of 1 writes every view straight through.
+VIEW_COUNT_BATCH_SIZE = int(os.getenv('VIEW_COUNT_BATCH_SIZE', 100))
+VIEW_COUNT_FLUSH_INTERVAL = int(os.getenv('VIEW_COUNT_FLUSH_INTERVAL', 30))
+
+
+# Gallery uploads are queued and compressed/uploaded to Iceberg in the
+# background (see myApp/upload_queue.py). UPLOAD_QUEUE_BACKEND is one of:
+#   thread   - a pool of UPLOAD_QUEUE_WORKERS threads in each web process
+#   database - left in the database for `manage.py process_upload_jobs`
+#   celery   - sent to a Celery worker (broker: CELERY_BROKER_URL or REDIS_URL)
+#   sync     - processed inside the request (tests, local debugging)
+# With the thread backend each web process also requeues and resumes jobs
+# interrupted by a restart, at startup and every few minutes. The database
+# and celery backends need their worker deployed next to the web service:
+# `python manage.py process_upload_jobs` (database) or a Celery worker, e.g.
+# as a second Railway service from this repository.
+# Raw files wait in UPLOAD_QUEUE_ROOT, which every worker must be able to read.
+UPLOAD_QUEUE_BACKEND = os.getenv('UPLOAD_QUEUE_BACKEND', 'thread')
+UPLOAD_QUEUE_WORKERS = int(os.getenv('UPLOAD_QUEUE_WORKERS', 2))
+UPLOAD_QUEUE_ROOT = os.getenv('UPLOAD_QUEUE_ROOT', str(BASE_DIR / 'upload_queue'))
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', os.getenv('REDIS_URL', ''))
+
+# Batch uploads (myApp/batch_upload.py) encode in UPLOAD_BATCH_PROCESSES
+# processes (never more than the CPUs) and run UPLOAD_BATCH_CONCURRENCY
+# Iceberg uploads at a time. Each process can peak at ~150 MB on a large
+# photo, so raise it only on machines with the memory for it.
+UPLOAD_BATCH_PROCESSES = int(os.getenv('UPLOAD_BATCH_PROCESSES', 2))
+UPLOAD_BATCH_CONCURRENCY = int(os.getenv('UPLOAD_BATCH_CONCURRENCY', 8))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -5,6 +5,13 @@ from myApp import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('dashboard/', include('myApp.dashboard_urls')),
+    path('sitemap.xml', views.sitemap, name='sitemap'),
+    path('sitemap-<int:page>.xml', views.sitemap_page, name='sitemap_page'),
+    path('blog/feed/rss/', views.blog_feed_rss, name='blog_feed_rss'),
+    path('blog/feed/atom/', views.blog_feed_atom, name='blog_feed_atom'),
+    path('blog/', views.blog_archive, name='blog_archive'),
+    path('blog/search/', views.blog_search, name='blog_search'),
     path('blog/<slug:slug>/', views.blog_post_detail, name='blog_post_detail'),
+    path('sections/<str:name>/', views.section_fragment, name='section_fragment'),
     path('', views.home, name='home'),
 ]
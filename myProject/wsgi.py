@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myProject.settings')
 
 application = get_wsgi_application()
+
+# Resume gallery uploads interrupted by the last restart (thread backend)
+from myApp.upload_queue import start_recovery  # noqa: E402
+
+start_recovery()